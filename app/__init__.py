@@ -139,7 +139,9 @@ def create_app(
 
     class ContextTask(app.celery.Task):
         def __call__(self, *args, **kwargs):
-            with app.app_context():
+            from .extensions.logging import Logging
+
+            with app.app_context(), Logging.buffered():
                 return self.run(*args, **kwargs)
 
     app.celery.Task = ContextTask
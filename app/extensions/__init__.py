@@ -8,7 +8,9 @@ Extensions provide access to common resources of the application.
 
 Please, put new extension instantiations and initializations here.
 """
+import copy  # NOQA
 import datetime  # NOQA
+import hashlib  # NOQA
 import json  # NOQA
 import logging as logging_native  # NOQA
 import re  # NOQA
@@ -17,6 +19,11 @@ import uuid  # NOQA
 
 import tqdm  # NOQA
 
+try:
+    import orjson  # NOQA
+except ImportError:  # pragma: no cover
+    orjson = None
+
 from .logging import Logging  # NOQA
 
 logging = Logging()
@@ -26,10 +33,11 @@ import flask.json  # NOQA
 import sqlalchemy as sa  # NOQA
 from flask_caching import Cache  # NOQA
 from flask_executor import Executor  # NOQA
+from sqlalchemy.dialects import postgresql  # NOQA
 from sqlalchemy.dialects.postgresql import UUID  # NOQA
 from sqlalchemy.ext import mutable  # NOQA
 from sqlalchemy.sql import elements  # NOQA
-from sqlalchemy.types import CHAR, TypeDecorator  # NOQA
+from sqlalchemy.types import BINARY, CHAR, TypeDecorator  # NOQA
 from sqlalchemy_utils import types as column_types  # NOQA
 
 from .flask_sqlalchemy import SQLAlchemy  # NOQA
@@ -233,11 +241,12 @@ class JsonEncodedDict(db.TypeDecorator):
 SA_JSON = db.JSON
 
 
+HTTP_DATE_PATTERN = re.compile('^[A-Z][a-z][a-z], [0-9][0-9] [A-Z][a-z][a-z]')
+
+
 def custom_json_decoder(obj):
     for key, value in obj.items():
-        if isinstance(value, str) and re.match(
-            '^[A-Z][a-z][a-z], [0-9][0-9] [A-Z][a-z][a-z]', value
-        ):
+        if isinstance(value, str) and HTTP_DATE_PATTERN.match(value):
             try:
                 obj[key] = datetime.datetime.strptime(value, '%a, %d %b %Y %H:%M:%S %Z')
             except ValueError:
@@ -245,65 +254,178 @@ def custom_json_decoder(obj):
     return obj
 
 
+def _revive_datetimes(value):
+    # custom_json_decoder applied (in place) to every object, as an object_hook would
+    if isinstance(value, dict):
+        for val in value.values():
+            if isinstance(val, (dict, list)):
+                _revive_datetimes(val)
+        custom_json_decoder(value)
+    elif isinstance(value, list):
+        for val in value:
+            if isinstance(val, (dict, list)):
+                _revive_datetimes(val)
+    return value
+
+
+_flask_json_encoder = flask.json.JSONEncoder()
+
+
+def json_dumps(value):
+    """Encode value the way the JSON column types store it"""
+    if orjson is not None:
+        return orjson.dumps(
+            value,
+            default=_flask_json_encoder.default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+        ).decode('utf-8')
+    return json.dumps(value, cls=flask.json.JSONEncoder)
+
+
+def json_loads(encoded):
+    if orjson is not None:
+        return _revive_datetimes(orjson.loads(encoded))
+    return json.loads(encoded, object_hook=custom_json_decoder)
+
+
+def _json_digest(encoded):
+    return hashlib.blake2b(encoded.encode('utf-8'), digest_size=16).digest()
+
+
+class JSONDict(dict):
+    """dict loaded from a JSON column, with a digest of what the database holds
+
+    Copies are plain dicts, as the digest only describes this object's row.
+    """
+
+    __slots__ = ('json_snapshot',)
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict(self), memo)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+class JSONList(list):
+    """list loaded from a JSON column, with a digest of what the database holds"""
+
+    __slots__ = ('json_snapshot',)
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(list(self), memo)
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+
+def _json_loaded(value, encoded):
+    if isinstance(value, dict):
+        value = JSONDict(value)
+    elif isinstance(value, list):
+        value = JSONList(value)
+    else:
+        return value
+    value.json_snapshot = _json_digest(encoded)
+    return value
+
+
 class JSON(db.TypeDecorator):
     impl = SA_JSON
 
     def process_bind_param(self, value, dialect):
         # Adapted from sqlalchemy/sql/sqltypes.py JSON.bind_processor
-        def json_serializer(*args, **kwargs):
-            return json.dumps(*args, **kwargs, cls=flask.json.JSONEncoder)
-
-        def process(value):
-            if value is SA_JSON.NULL:
-                value = None
-            elif isinstance(value, elements.Null) or (
-                value is None and self.none_as_null
-            ):
-                return None
+        if value is SA_JSON.NULL:
+            value = None
+        elif isinstance(value, elements.Null) or (value is None and self.none_as_null):
+            return None
 
-            return json_serializer(value)
-
-        return process(value)
+        encoded = json_dumps(value)
+        if isinstance(value, (JSONDict, JSONList)):
+            # this is what the database will hold once flushed
+            value.json_snapshot = _json_digest(encoded)
+        return encoded
 
     def process_result_value(self, value, dialect):
         # Adapted from sqlalchemy/sql/sqltypes.py JSON.result_processor
-        def json_deserializer(*args, **kwargs):
-            return json.loads(*args, **kwargs, object_hook=custom_json_decoder)
-
-        def process(value):
-            if value is None:
-                return None
-            elif isinstance(value, dict):
-                return value
-            return json_deserializer(value)
-
-        return process(value)
+        if value is None:
+            return None
+        elif isinstance(value, dict):
+            return value
+        return _json_loaded(json_loads(value), value)
 
     def compare_values(self, x, y):
         # This method is used to determine whether a field has changed.
         #
-        # This is a problem for lists and dicts because if the user edits the
-        # list or dict in place, "x" and "y" are going to be the same and we
-        # can't determine whether the field has changed.
-        #
-        # For example, if self.jobs was {}, then we do:
+        # Lists and dicts are often edited in place, in which case "x" and "y"
+        # are the same object, e.g. if self.jobs was {}, then we do:
         # self.jobs['job_id'] = {'some': 'stuff'}
         #
-        # compare_values is going to get {'job_id': {'some': 'stuff'}} twice
-        # because sqlalchemy is unable to get back the previous value of
-        # self.jobs which was {}
-        #
-        # So we can't determine whether the field has actually changed.  If we
-        # return True here, the object does not get saved, so we're going to
-        # just always return False
-        return False
+        # compare_values gets {'job_id': {'some': 'stuff'}} twice, so instead
+        # values loaded from the database carry a digest of what was loaded (or
+        # last written) which the current value is compared against.  Without
+        # one there is no way to tell, so the field is always written.
+        snapshot = getattr(y, 'json_snapshot', None)
+        if snapshot is not None:
+            return x is not None and _json_digest(json_dumps(x)) == snapshot
+        if isinstance(x, (dict, list)) or isinstance(y, (dict, list)):
+            return False
+        return x == y
+
+
+def _json_native(value):
+    # values flask's JSONEncoder would have encoded (datetimes, UUIDs, ...) as strings
+    if isinstance(value, dict):
+        return {key: _json_native(val) for key, val in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_native(val) for val in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return _flask_json_encoder.default(value)
+
+
+class JSONB(JSON):
+    """JSON stored natively as PostgreSQL's JSONB.
+
+    Unlike JSON (which is stored as an encoded string) the contents can be
+    indexed (GIN) and queried with the JSONB operators, e.g. ``has_key()`` and
+    ``contains()``.  Other databases get plain JSON.
+    """
+
+    comparator_factory = postgresql.JSONB.Comparator
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(postgresql.JSONB())
+        else:
+            return dialect.type_descriptor(SA_JSON())
+
+    def process_bind_param(self, value, dialect):
+        if value is SA_JSON.NULL or isinstance(value, elements.Null):
+            return None
+        if isinstance(value, (JSONDict, JSONList)):
+            value.json_snapshot = _json_digest(json_dumps(value))
+        return _json_native(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        _revive_datetimes(value)
+        return _json_loaded(value, json_dumps(value))
 
 
 class GUID(db.TypeDecorator):
     """Platform-independent GUID type.
 
-    Uses PostgreSQL's UUID type, otherwise uses
-    CHAR(32), storing as stringified hex values.
+    Uses PostgreSQL's UUID type (handed to and from the driver as uuid.UUID
+    objects), otherwise uses BINARY(16), storing the raw bytes.  Databases
+    created before used CHAR(32) hex strings, see migration 2d8f6b1e9a47.
 
     """
 
@@ -311,29 +433,29 @@ class GUID(db.TypeDecorator):
 
     def load_dialect_impl(self, dialect):
         if dialect.name == 'postgresql':
-            return dialect.type_descriptor(UUID())
+            return dialect.type_descriptor(UUID(as_uuid=True))
         else:
-            return dialect.type_descriptor(CHAR(32))
+            return dialect.type_descriptor(BINARY(16))
 
     def process_bind_param(self, value, dialect):
         if value is None:
             return value
         elif dialect.name == 'postgresql':
-            return str(value)
+            return value if isinstance(value, uuid.UUID) else str(value)
         else:
             if not isinstance(value, uuid.UUID):
-                return '%.32x' % uuid.UUID(value).int
-            else:
-                # hexstring
-                return '%.32x' % value.int
+                if isinstance(value, bytes) and len(value) == 16:
+                    return value
+                value = uuid.UUID(value)
+            return value.bytes
 
     def process_result_value(self, value, dialect):
-        if value is None:
+        if value is None or isinstance(value, uuid.UUID):
             return value
+        elif isinstance(value, bytes) and len(value) == 16:
+            return uuid.UUID(bytes=value)
         else:
-            if not isinstance(value, uuid.UUID):
-                value = uuid.UUID(value)
-            return value
+            return uuid.UUID(value)
 
 
 class Timestamp(object):
@@ -662,6 +784,37 @@ class CustomFieldMixin(object):
 
     # TODO we probably want one to ADD values to a multiple=TRUE list-type
 
+    @classmethod
+    def custom_field_filter(cls, cfd_id, value=None):
+        """
+        SQL filter for objects having a value for cfd_id, or (when value is
+        passed) having that value, which for multiple=True definitions means
+        containing it.  Both are answered by the GIN index on custom_fields.
+        """
+        from app.modules.site_settings.helpers import SiteSettingCustomFields
+
+        if value is None:
+            return cls.custom_fields.has_key(str(cfd_id))  # NOQA
+        defn = SiteSettingCustomFields.get_definition(cls.__name__, cfd_id)
+        if not defn:
+            raise ValueError(f'invalid customField definition id {cfd_id}')
+        if defn.get('multiple', False) and not isinstance(value, list):
+            value = [value]
+        value = SiteSettingCustomFields.serialize_value(cls.__name__, cfd_id, value)
+        return cls.custom_fields.contains({str(cfd_id): value})
+
+    @classmethod
+    def query_custom_fields(cls, values):
+        """
+        Query for objects matching every { cfdId: value } in values, a value of
+        None matches any object that has a value for that cfdId
+        """
+        assert isinstance(values, dict), 'must pass dict'
+        filters = [
+            cls.custom_field_filter(cfd_id, value) for cfd_id, value in values.items()
+        ]
+        return cls.query.filter(*filters)
+
     def get_custom_fields_elasticsearch(self):
         from app.modules.site_settings.helpers import SiteSettingCustomFields
 
@@ -764,6 +917,15 @@ class ExportMixin(object):
             self.export_custom_fields(data)
         return data
 
+    @classmethod
+    def export_load_options(cls):
+        # loader options so that export_data does not lazy-load per object
+        return []
+
+    def export_related(self):
+        # other exportable objects that get added alongside this one (if permitted)
+        return []
+
 
 ##########################################################################################
 
@@ -772,6 +934,7 @@ mutable.MutableDict.associate_with(JsonEncodedDict)
 
 db.GUID = GUID
 db.JSON = JSON
+db.JSONB = JSONB
 
 
 ##########################################################################################
@@ -30,6 +30,9 @@ import app.extensions.git_store.tasks  # noqa
 if is_extension_enabled('elasticsearch'):
     import app.extensions.elasticsearch.tasks  # noqa
 
+if is_extension_enabled('export'):
+    import app.extensions.export.tasks  # noqa
+
 if is_extension_enabled('intelligent_agent'):
     import app.extensions.intelligent_agent.tasks  # noqa
 
@@ -47,11 +50,23 @@ if is_extension_enabled('prometheus'):
 if is_module_enabled('asset_groups'):
     import app.modules.asset_groups.tasks  # noqa
 
+if is_module_enabled('assets'):
+    import app.modules.assets.tasks  # noqa
+
+if is_module_enabled('audit_logs'):
+    import app.modules.audit_logs.tasks  # noqa
+
 if is_module_enabled('individuals'):
     import app.modules.individuals.tasks  # noqa
 
 if is_module_enabled('missions'):
     import app.modules.missions.tasks  # noqa
 
+if is_module_enabled('notifications'):
+    import app.modules.notifications.tasks  # noqa
+
 if is_module_enabled('sightings'):
     import app.modules.sightings.tasks  # noqa
+
+if is_module_enabled('social_groups'):
+    import app.modules.social_groups.tasks  # noqa
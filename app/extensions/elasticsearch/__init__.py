@@ -37,6 +37,9 @@ CELERY_ASYNC_PROMISES = []
 
 ELASTICSEARCH_SORTING_PREFIX = 'elasticsearch.'
 
+# deepest page (offset + limit) served with from/size, see index.max_result_window
+ELASTICSEARCH_MAX_RESULT_WINDOW = 10000
+
 MAX_UNICODE_CODE_POINT_CHAR = chr(int(hex(sys.maxunicode), 16))
 
 log = logging.getLogger('elasticsearch')  # pylint: disable=invalid-name
@@ -1362,6 +1365,32 @@ def es_search(index, body, app=None):
     return resp
 
 
+def es_search_page(index, body, offset=0, limit=100, app=None):
+    """
+    Run a search with Elasticsearch doing the pagination, returns the total number
+    of matches and the hits for the requested page only
+    """
+    from flask import current_app
+
+    if app is None:
+        app = current_app
+
+    if not es_index_exists(index, app=app):
+        return 0, []
+
+    body = dict(body)
+    body['from'] = offset
+    body['size'] = limit
+    body['track_total_hits'] = True
+    resp = app.es.search(index=index, body=body)
+
+    hits = resp['hits']
+    total = hits['total']
+    if isinstance(total, dict):
+        total = total['value']
+    return total, hits['hits']
+
+
 def es_delete(obj, app=None):
     cls = obj.__class__
     return es_delete_guid(cls, obj.guid, app=app)
@@ -1989,6 +2018,15 @@ def es_elasticsearch(
         return results
 
 
+class ProfiledTransport(elasticsearch.Transport):
+    # reports each Elasticsearch call to the request profiler (when enabled)
+    def perform_request(self, method, url, *args, **kwargs):
+        from app.extensions.prometheus.profiling import external_call
+
+        with external_call('ELASTICSEARCH', f'{method} {url}'):
+            return super().perform_request(method, url, *args, **kwargs)
+
+
 def init_app(app, **kwargs):
     # pylint: disable=unused-argument
     """
@@ -1999,6 +2037,7 @@ def init_app(app, **kwargs):
     app.elasticsearch = elasticsearch.Elasticsearch(
         hosts=app.config['ELASTICSEARCH_HOSTS'],
         http_auth=app.config['ELASTICSEARCH_HTTP_AUTH'],
+        transport_class=ProfiledTransport,
     )
     app.es = app.elasticsearch
 
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 # pylint: disable=no-self-use
+import contextlib
 import datetime
 import logging
 import re
@@ -89,6 +90,22 @@ def _validate_settings():
     return valid
 
 
+@contextlib.contextmanager
+def mail_connection():
+    """
+    Share one SMTP connection between every Email sent inside the block
+
+    Yields None if email is not configured, in which case Email.send_message()
+    falls back to its usual (logged) failure.
+    """
+    if not _validate_settings():
+        yield None
+        return
+    mail.init_app(current_app)
+    with mail.connect() as connection:
+        yield connection
+
+
 def _format_datetime(dt, verbose=False):
     """
     REF: https://stackoverflow.com/a/5891598
@@ -283,6 +300,17 @@ class Email(Message):
         final_html = minified_html.replace(WEBFONTS_PLACEHOLDER_CODE, webfonts_html)
         self.html = final_html
 
+    # renders a template with this email's values and language fallbacks, without making it the message body
+    def render_fragment(self, template_name, flavor='html', **kwargs):
+        self.set_language()
+        values = dict(self.template_kwargs, **kwargs)
+        for temp in self._templates_to_try(flavor, template_name=template_name):
+            try:
+                return render_template(temp, **values)
+            except TemplateNotFound:
+                pass
+        return None
+
     def attach(self, filepath, atatchment_name, attachment_type='image/png'):
         with current_app.open_resource(filepath) as asset:
             self.attach(atatchment_name, attachment_type, asset.read())
@@ -316,22 +344,26 @@ class Email(Message):
                 addresses.append(recipient)
         return addresses, users
 
-    def send_message(self, *args, **kwargs):
-        if _validate_settings():
+    # connection= is an open connection from mail_connection(), to send many emails over one session
+    def send_message(self, *args, connection=None, **kwargs):
+        if connection is not None or _validate_settings():
             if not self.body and not self.html:
                 raise ValueError(
                     f'No txt/html body content; not sending email ({self.subject}, {self.recipients})'
                 )
             if not self.recipients:
                 raise ValueError(f'No recipients; not sending email ({self.subject})')
-            mail.init_app(
-                current_app
-            )  # this initializes based on new MAIL_ values from _validate_settings
             log.debug(
                 f'Attempting to send email from {self.sender} to {self.recipients}: {self.subject} [{self._transaction_id}]'
             )
             try:
-                mail.send(self)
+                if connection is None:
+                    mail.init_app(
+                        current_app
+                    )  # this initializes based on new MAIL_ values from _validate_settings
+                    mail.send(self)
+                else:
+                    connection.send(self)
                 response = {
                     'status': self.status,
                     'success': True,
@@ -23,3 +23,10 @@ def init_app(app, **kwargs):
     # issue #932 removes export permission entirely
     # api_v1.add_oauth_scope('export:read', 'Provide access to Export API')
     # api_v1.add_oauth_scope('export:write', 'Provide write access to Export API')
+
+    from app.extensions.api import api_v1
+
+    # Touch underlying modules
+    from . import resources  # NOQA
+
+    api_v1.add_namespace(resources.api)
@@ -5,6 +5,7 @@ Export models
 """
 
 import logging
+import uuid
 
 from flask_login import current_user
 
@@ -16,6 +17,13 @@ from app.modules.site_settings.models import SiteSetting
 log = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
 
+# number of objects loaded from the database (and written out) at a time
+EXPORT_BATCH_SIZE = 500
+# larger exports should go through the background (Celery) export
+EXPORT_SYNCHRONOUS_LIMIT = 15000
+EXPORT_DEFAULT_DIRECTORY = '/tmp/export'
+
+
 class ExportException(Exception):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -25,13 +33,21 @@ class ExportException(Exception):
 class Export:
     """
     Export class
+
+    The workbook is opened in write-only mode, so rows are streamed out to a
+    temporary file as they are added rather than held in memory.
     """
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, user=None, directory=None, *args, **kwargs):
         from openpyxl import Workbook
         from openpyxl.packaging.custom import StringProperty
 
-        self.workbook = Workbook()
+        if user is None:
+            user = current_user
+        self.user = user if user and not user.is_anonymous else None
+        self.directory = directory or EXPORT_DEFAULT_DIRECTORY
+
+        self.workbook = Workbook(write_only=True)
         self.workbook.custom_doc_props.append(
             StringProperty(
                 name='Codex', value=SiteSetting.get_value('site.name', default='Unknown')
@@ -41,8 +57,8 @@ class Export:
             StringProperty(name='Codex GUID', value=SiteSetting.get_system_guid())
         )
         uname = (
-            f'{str(current_user.guid)} {current_user.full_name}'
-            if current_user
+            f'{str(self.user.guid)} {self.user.full_name}'
+            if self.user
             else 'Unknown User'
         )
         self.workbook.custom_doc_props.append(
@@ -50,8 +66,8 @@ class Export:
         )
         self.sheets = {}
         self.columns = {}
-        # self.active_class = None
-        # self.columns = None
+        # guids of every object written so far, so related objects are only added once
+        self.added = set()
         self.filename = self._generate_filename()
 
     # class of obj determines which sheet it gets added to
@@ -62,33 +78,116 @@ class Export:
             raise ValueError(f'{obj} is not an ExportMixin')
 
         cls = obj.__class__
+        exd = obj.export_data
         if cls not in self.sheets:
-            title = f'{obj.__class__.__name__} Results'
-            if not len(self.sheets):
-                self.sheets[cls] = self.workbook.active
-                self.sheets[cls].title = title
-            else:
-                self.sheets[cls] = self.workbook.create_sheet(title)
-            cols = Export._get_columns(obj)
+            self.sheets[cls] = self.workbook.create_sheet(f'{cls.__name__} Results')
+            cols = Export._get_columns(obj, exd)
             self.columns[cls] = cols
             # for now we set first row to be headers by default
             self.sheets[cls].append(cols)
-        self.sheets[cls].append(self.row(obj))
+        self.sheets[cls].append(self.row(obj, exd))
+        if obj.guid is not None:
+            self.added.add(obj.guid)
 
     @classmethod
-    def _get_columns(cls, obj):
-        exd = obj.export_data
+    def _get_columns(cls, obj, export_data=None):
+        exd = obj.export_data if export_data is None else export_data
         cols = list(exd.keys())
         cols.sort()
         return cols
 
-    def row(self, obj):
-        exd = obj.export_data
+    def row(self, obj, export_data=None):
+        exd = obj.export_data if export_data is None else export_data
         row = []
         for col in self.columns[obj.__class__]:
             row.append(exd.get(col))
         return row
 
+    @classmethod
+    def exportable_search(cls, search, user):
+        """
+        Restrict an Elasticsearch query to objects the user can export, using the
+        ``exporters`` field that is precomputed on each indexed document
+        """
+        exporters = {'match': {'exporters': str(user.guid)}}
+        filters = [search, exporters] if search else [exporters]
+        return {'bool': {'filter': filters}}
+
+    def exportable_guids(self, model_cls, search, limit=None):
+        if not self.user:
+            return []
+        search = Export.exportable_search(search, self.user)
+        return model_cls.elasticsearch(search, load=False, limit=limit)
+
+    @classmethod
+    def batches(cls, model_cls, guids, batch_size=EXPORT_BATCH_SIZE):
+        """
+        Yield the objects for ``guids`` in database batches, eager-loading whatever
+        the class needs to build its export_data
+        """
+        guids = list(guids)
+        options = model_cls.export_load_options()
+        for start in range(0, len(guids), batch_size):
+            query = model_cls.query.filter(
+                model_cls.guid.in_(guids[start : start + batch_size])
+            )
+            if options:
+                query = query.options(*options)
+            yield query.order_by(model_cls.guid).all()
+
+    def add_search(self, model_cls, search, limit=None, progress=None):
+        """
+        Stream every exportable ``model_cls`` matching ``search`` (along with its
+        exportable related objects) into the workbook
+
+        Returns the number of ``model_cls`` objects added.
+        """
+        guids = self.exportable_guids(model_cls, search, limit=limit)
+        total = len(guids)
+        count = 0
+        for batch in Export.batches(model_cls, guids):
+            related = {}
+            for obj in batch:
+                self.add(obj)
+                count += 1
+                for other in obj.export_related():
+                    if other.guid not in self.added:
+                        related.setdefault(other.__class__, {})[other.guid] = other
+            self._add_related(related)
+            if progress is not None and total:
+                progress.set(100.0 * count / total)
+        return count
+
+    def exportable_related_guids(self, model_cls, guids):
+        """
+        The subset of ``guids`` the user can export, for objects that are already
+        loaded from the database
+
+        Elasticsearch is asked directly, rather than through ``elasticsearch()``,
+        which cross-checks its hits against every guid in the table.
+        """
+        from app.extensions import elasticsearch as es
+
+        if not self.user or es is None:
+            return set()
+        index = es.es_index_name(model_cls)
+        if index is None:
+            return set()
+        search = {'terms': {'guid': [str(guid) for guid in guids]}}
+        body = {'query': Export.exportable_search(search, self.user), '_source': False}
+        hits = es.es_search(index, body) or []
+        return {uuid.UUID(hit['_id']) for hit in hits}
+
+    def _add_related(self, related):
+        for related_cls, objs in related.items():
+            guids = list(objs)
+            for start in range(0, len(guids), EXPORT_BATCH_SIZE):
+                chunk = guids[start : start + EXPORT_BATCH_SIZE]
+                exportable = self.exportable_related_guids(related_cls, chunk)
+                for guid in chunk:
+                    if guid in exportable and guid not in self.added:
+                        self.add(objs[guid])
+
     # since this is based on timestamp, we set at init but should not use this directly (later)
     def _generate_filename(self):
         import re
@@ -105,8 +204,8 @@ class Export:
     def filepath(self):
         import os
 
-        udir = str(current_user.guid) if current_user else 'unknown_user'
-        target_dir = os.path.join('/tmp', 'export', udir)
+        udir = str(self.user.guid) if self.user else 'unknown_user'
+        target_dir = os.path.join(self.directory, udir)
         if not os.path.exists(target_dir):
             os.makedirs(target_dir)
         return os.path.join(target_dir, self.filename)
@@ -115,3 +214,79 @@ class Export:
         log.info(f'{self} saving to {self.filepath}')
         self.workbook.save(self.filepath)
         return self.filename
+
+    @classmethod
+    def background_directory(cls, progress_guid):
+        import os
+
+        from flask import current_app
+
+        return os.path.join(
+            current_app.config['EXPORT_DATABASE_PATH'], str(progress_guid)
+        )
+
+    @classmethod
+    def start_background(cls, model_cls, search, user, foreground=None):
+        """
+        Kick off a Celery export job, returns the Progress that tracks it
+
+        The finished workbook is fetched with ``GET /api/v1/export/<progress_guid>``.
+        """
+        from flask import current_app
+
+        from app.extensions import db
+        from app.modules.progress.models import Progress
+
+        from .tasks import execute_export
+
+        if foreground is None:
+            foreground = current_app.testing
+
+        progress = Progress(description=f'{model_cls.__name__} export for {user.guid}')
+        with db.session.begin(subtransactions=True):
+            db.session.add(progress)
+        db.session.refresh(progress)
+
+        args = (
+            str(progress.guid),
+            str(user.guid),
+            model_cls.__module__,
+            model_cls.__name__,
+            search,
+        )
+        if foreground:
+            execute_export(*args)
+        else:
+            promise = execute_export.delay(*args)
+            with db.session.begin(subtransactions=True):
+                progress.celery_guid = promise.id
+                db.session.merge(progress)
+            db.session.refresh(progress)
+        return progress
+
+    @classmethod
+    def is_background_owner(cls, progress, user):
+        """
+        Whether ``progress`` tracks a background export started by ``user``, see
+        start_background() for the description it is given
+        """
+        if user is None or user.is_anonymous:
+            return False
+        return progress.description.endswith(f' export for {user.guid}')
+
+    @classmethod
+    def background_filepath(cls, progress, user):
+        """
+        Path of the finished artifact for a background export, or None if it is
+        not (yet) available to this user
+        """
+        import glob
+        import os
+
+        if not progress.complete:
+            return None
+        pattern = os.path.join(
+            Export.background_directory(progress.guid), str(user.guid), '*'
+        )
+        found = sorted(glob.glob(pattern))
+        return found[0] if found else None
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=bad-continuation
+"""
+RESTful API Export resources
+--------------------------
+"""
+
+import logging
+import os
+from http import HTTPStatus
+
+from flask import send_file
+from flask_login import current_user
+
+from app.extensions.api import Namespace, abort
+from app.modules.progress.models import Progress
+from flask_restx_patched import Resource
+
+from .models import Export
+
+log = logging.getLogger(__name__)  # pylint: disable=invalid-name
+api = Namespace('export', description='Export')  # pylint: disable=invalid-name
+
+
+@api.route('/<uuid:progress_guid>')
+@api.login_required(oauth_scopes=[])
+@api.response(
+    code=HTTPStatus.NOT_FOUND,
+    description='Export not found.',
+)
+@api.resolve_object_by_model(Progress, 'progress')
+class ExportByProgressID(Resource):
+    """
+    Download the workbook produced by a background export.
+    """
+
+    def get(self, progress):
+        # other users' exports (and their messages) are not revealed
+        if not Export.is_background_owner(progress, current_user):
+            abort(HTTPStatus.NOT_FOUND, 'Export not found')
+        if progress.active:
+            abort(HTTPStatus.CONFLICT, 'Export is still running')
+        filepath = Export.background_filepath(progress, current_user)
+        if filepath is None:
+            abort(HTTPStatus.NOT_FOUND, progress.message or 'Export not found')
+        return send_file(
+            filepath,
+            mimetype='application/vnd.ms-excel',
+            as_attachment=True,
+            attachment_filename=os.path.basename(filepath),
+        )
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import logging
+from importlib import import_module
+
+from app.extensions.celery import celery
+
+log = logging.getLogger(__name__)
+
+
+@celery.task
+def execute_export(progress_guid, user_guid, model_module, model_name, search):
+    from app.modules.progress.models import Progress
+    from app.modules.users.models import User
+
+    from .models import Export
+
+    progress = Progress.query.get(progress_guid)
+    user = User.query.get(user_guid)
+    if progress is None or user is None:
+        log.warning(
+            f'Export {progress_guid} for user {user_guid} has no progress or user, skipping'
+        )
+        return
+
+    model_cls = getattr(import_module(model_module), model_name)
+    try:
+        export = Export(user=user, directory=Export.background_directory(progress_guid))
+        count = export.add_search(model_cls, search, progress=progress)
+        if not count:
+            progress.fail('No results to export')
+            return
+        export.save()
+        progress.set(100)
+    except Exception as ex:
+        log.exception(f'Export {progress_guid} failed')
+        progress.fail(f'Export failed: {ex}')
@@ -4,6 +4,8 @@
 Local Git Store
 
 """
+import collections
+import contextlib
 import enum
 import json
 import keyword
@@ -11,6 +13,8 @@ import logging
 import os
 import pathlib
 import shutil
+import threading
+import time
 import uuid
 
 import git
@@ -31,9 +35,54 @@ from app.version import version
 
 KEYWORD_SET = set(keyword.kwlist)
 
+GIT_STORE_SYNC_FILENAME = 'houston_sync.json'
+
+# paths within a store that are committed, everything else is local only
+GIT_STORE_TRACKED_PATHS = ('_uploads', '_assets', '_metadata', 'metadata.json')
+
+# longest a commit or push may hold a store's lock (and wait to take it)
+GIT_STORE_LOCK_TIMEOUT = 60 * 30
+
+# used for the store locks when Redis is not available (single process only)
+_local_locks = collections.defaultdict(threading.Lock)
+_local_locks_lock = threading.Lock()
+
 log = logging.getLogger(__name__)
 
 
+def _get_redis_connection():
+    import redis
+
+    from app.utils import get_redis_connection
+
+    try:
+        conn = get_redis_connection()
+        conn.ping()
+    except (ValueError, redis.exceptions.ConnectionError):
+        return None
+    return conn
+
+
+@contextlib.contextmanager
+def git_store_lock(guid):
+    """
+    Serialize the commits and pushes of one store, across workers when Redis is
+    available
+    """
+    conn = _get_redis_connection()
+    if conn is not None:
+        lock = conn.lock(
+            f'git_store_lock:{guid}',
+            timeout=GIT_STORE_LOCK_TIMEOUT,
+            blocking_timeout=GIT_STORE_LOCK_TIMEOUT,
+        )
+    else:
+        with _local_locks_lock:
+            lock = _local_locks[str(guid)]
+    with lock:
+        yield
+
+
 def compute_xxhash64_digest_filepath(filepath):
     try:
         import os
@@ -210,8 +259,111 @@ class GitStore(db.Model, HoustonModel):
 
         return DetailedGitStoreSchema
 
-    def git_push_delay(self):
-        raise NotImplementedError()
+    def git_push_delay(self, message=None):
+        """
+        Queue a push of this store, first committing whatever changed if given a
+        commit ``message``
+
+        Calls within ``GIT_STORE_COMMIT_WINDOW`` seconds of each other share one
+        commit and push, tracked by the returned Progress.
+        """
+        from app.extensions.git_store.tasks import git_push
+        from app.modules.progress.models import Progress
+
+        window = 0
+        if not current_app.testing:
+            window = current_app.config.get('GIT_STORE_COMMIT_WINDOW', 0)
+
+        messages = [message] if message else []
+        progress_guid = uuid.uuid4()
+        conn = _get_redis_connection()
+        if conn is not None:
+            if messages:
+                conn.rpush(f'git_store_pending:{self.guid}', *messages)
+                messages = []
+            scheduled = conn.set(
+                f'git_store_scheduled:{self.guid}',
+                str(progress_guid),
+                nx=True,
+                ex=window + GIT_STORE_LOCK_TIMEOUT,
+            )
+            if not scheduled:
+                # Already queued, the pending push picks these changes up
+                scheduled_guid = conn.get(f'git_store_scheduled:{self.guid}')
+                if scheduled_guid is None:
+                    return None
+                return Progress.query.get(scheduled_guid.decode('utf-8'))
+
+        progress = Progress(
+            guid=progress_guid,
+            description=f'Git push for {self.__class__.__name__} {self.guid}',
+        )
+        with db.session.begin(subtransactions=True):
+            db.session.add(progress)
+        db.session.refresh(progress)
+
+        args = (str(self.guid),)
+        kwargs = {'progress_guid': str(progress.guid), 'messages': messages}
+        if window:
+            promise = git_push.apply_async(args, kwargs, countdown=window)
+        else:
+            promise = git_push.delay(*args, **kwargs)
+
+        if promise is not None and getattr(promise, 'id', None):
+            with db.session.begin(subtransactions=True):
+                progress.celery_guid = promise.id
+                db.session.merge(progress)
+            db.session.refresh(progress)
+        return progress
+
+    def git_pending_messages(self):
+        """
+        Take the commit messages queued by git_push_delay(), clearing the queue so
+        later changes schedule a new push
+        """
+        conn = _get_redis_connection()
+        if conn is None:
+            return []
+        pipeline = conn.pipeline()
+        pipeline.lrange(f'git_store_pending:{self.guid}', 0, -1)
+        pipeline.delete(f'git_store_pending:{self.guid}')
+        pipeline.delete(f'git_store_scheduled:{self.guid}')
+        pending = pipeline.execute()[0]
+        return [message.decode('utf-8') for message in pending]
+
+    def git_lock(self):
+        return git_store_lock(self.guid)
+
+    def git_stage_changes(self, repo):
+        """
+        Stage the tracked paths and return the ones that changed, ``git add`` only
+        rehashes files whose size or mtime moved
+        """
+        paths = [
+            path
+            for path in GIT_STORE_TRACKED_PATHS
+            if os.path.exists(os.path.join(repo.working_tree_dir, path))
+        ]
+        if paths:
+            repo.git.add('--all', '--', *paths)
+        changed = repo.git.diff('--cached', '--name-only', '-z')
+        return [path for path in changed.split('\0') if path]
+
+    def git_commit_changes(self, message, repo=None):
+        """
+        Commit the staged changes, callers should hold git_lock()
+        """
+        if repo is None:
+            repo = self.get_repository()
+        changed = self.git_stage_changes(repo)
+        if not changed and repo.head.is_valid():
+            log.debug(f'Nothing to commit for Git Store {self.guid}')
+            return None
+
+        new_commit = repo.index.commit(message)
+        log.info(f'Committed {len(changed)} changed paths to Git Store {self.guid}')
+        self.update_metadata_from_commit(new_commit)
+        return new_commit
 
     def delete_remote_delay(self):
         raise NotImplementedError()
@@ -416,21 +568,15 @@ class GitStore(db.Model, HoustonModel):
             self.progress_preparation.set(90)
 
         # Step 4
-        #   Description: Commit the files into the repo into the git repository, requires hashing all of the files
+        #   Description: Commit the changed files into the git repository, only those are rehashed.  Unless
+        #                asked to commit now, the commit is queued and coalesced with the push
         #   Delay: a meaningful overhead, but should still be relatively quick, unbounded seconds (Step 4 << Step 3)
         #   Percentage: 9% (90% -> 99%)
-        if commit in [True] or (
-            commit not in [False] and current_app.config['UPLOADS_GIT_COMMIT']
-        ):
-            # repo.index.add('.gitignore')
-            repo.index.add('_uploads/')
-            repo.index.add('_assets/')
-            repo.index.add('_metadata/')
-            repo.index.add('metadata.json')
-
-            new_commit = repo.index.commit(message)
-
-            self.update_metadata_from_commit(new_commit)
+        if commit in [True]:
+            with self.git_lock():
+                self.git_commit_changes(message, repo)
+        elif commit not in [False] and current_app.config['UPLOADS_GIT_COMMIT']:
+            self.git_push_delay(message)
 
         if self.progress_preparation and update:
             self.progress_preparation.set(99)
@@ -512,22 +658,97 @@ class GitStore(db.Model, HoustonModel):
         with open(local_store_metadata_path, 'w') as local_store_metadata_file:
             json.dump(local_store_metadata, local_store_metadata_file)
 
+    def get_sync_state_path(self):
+        return os.path.join(self.get_absolute_path(), '.git', GIT_STORE_SYNC_FILENAME)
+
+    def get_sync_state(self):
+        """
+        When the local clone was last synced with its remote (and the remote head
+        it was synced to), kept inside the clone's ``.git`` directory
+        """
+        try:
+            with open(self.get_sync_state_path(), 'r') as sync_file:
+                return json.load(sync_file)
+        except (OSError, ValueError):
+            return {}
+
+    def set_sync_state(self, **values):
+        state = self.get_sync_state()
+        state.update(values)
+        sync_path = self.get_sync_state_path()
+        tmp_path = f'{sync_path}.{os.getpid()}'
+        try:
+            with open(tmp_path, 'w') as sync_file:
+                json.dump(state, sync_file)
+            os.replace(tmp_path, sync_path)
+        except OSError:  # pragma: no cover
+            log.warning(f'Unable to record sync state for Git Store {self.guid}')
+        return state
+
+    def is_stale(self, ttl=None):
+        if ttl is None:
+            ttl = current_app.config.get('GIT_STORE_SYNC_TTL', 0)
+        synced = self.get_sync_state().get('synced')
+        return synced is None or time.time() - synced > ttl
+
+    def get_remote_head(self, repo=None):
+        """
+        Cheap check of the remote's current head commit (``git ls-remote``),
+        without fetching anything
+        """
+        if repo is None:
+            repo = self.get_repository()
+        if repo is None or 'origin' not in repo.remotes:
+            return None
+        try:
+            output = repo.git.ls_remote('origin', repo.head.ref.path)
+        except git.exc.GitCommandError as e:
+            log.info(f'git ls-remote failed for {self.guid}: {str(e)}')
+            return None
+        return output.split()[0] if output else None
+
     def git_pull(self):
         repo = self.get_repository()
         assert repo is not None
 
         log.info('Pulling from remote repository')
         try:
-            repo.git.pull(repo.remotes.origin, repo.head.ref)
+            with self.git_lock():
+                repo.git.pull(repo.remotes.origin, repo.head.ref)
         except git.exc.GitCommandError as e:
             log.info(f'git pull failed for {self.guid}: {str(e)}')
         else:
             log.info('...pulled')
+            try:
+                remote = repo.git.rev_parse('FETCH_HEAD')
+            except git.exc.GitCommandError:  # pragma: no cover
+                remote = None
+            self.set_sync_state(synced=time.time(), remote=remote, scheduled=None)
 
         self.update_metadata_from_repo(repo)
 
         return repo
 
+    def git_pull_delay(self, foreground=None):
+        """
+        Pull in the background, unless a pull for this store is already queued
+        """
+        from app.extensions.git_store.tasks import git_pull
+
+        if foreground is None:
+            foreground = current_app.testing
+
+        if foreground:
+            return self.git_pull()
+
+        scheduled = self.get_sync_state().get('scheduled')
+        ttl = current_app.config.get('GIT_STORE_SYNC_TTL', 0)
+        if scheduled is not None and time.time() - scheduled < ttl:
+            return None
+
+        self.set_sync_state(scheduled=time.time())
+        git_pull.delay(str(self.guid))
+
     def git_clone(self, project, **kwargs):
         repo = self.get_repository()
         assert repo is None
@@ -545,6 +766,7 @@ class GitStore(db.Model, HoustonModel):
 
         repo = self.get_repository()
         assert repo is not None
+        self.set_sync_state(synced=time.time(), remote=self.get_remote_head(repo))
 
         self.update_metadata_from_project(project)
         self.update_metadata_from_repo(repo)
@@ -572,8 +794,9 @@ class GitStore(db.Model, HoustonModel):
                 db.session.add(git_store)
             db.session.refresh(git_store)
 
-        # Make sure that the repo for this git store exists
-        git_store.ensure_repository()
+        # Make sure that the repo for this git store exists, a stale clone is
+        # refreshed in the background rather than holding up the caller
+        git_store.ensure_repository(sync=False)
 
         # Create gitlab project in the background (we won't wait for its
         # completion here)
@@ -1170,6 +1393,12 @@ class GitStore(db.Model, HoustonModel):
         assert self.exists
         db.session.refresh(self)
 
+        # make the derived renditions now, rather than when the first grid view asks for them
+        try:
+            Asset.schedule_renditions(assets)
+        except Exception:
+            log.exception('Unable to schedule asset renditions')
+
         if self.progress_preparation:
             self.progress_preparation.set(90)
 
@@ -1267,14 +1496,23 @@ class GitStore(db.Model, HoustonModel):
         if (repo_path / '.git').exists():
             return Repo(repo_path)
 
-    def ensure_repository(self):
+    def ensure_repository(self, sync=True):
+        """
+        Make sure the local clone exists, pulling from the remote only when the
+        last sync is older than ``GIT_STORE_SYNC_TTL``
+
+        With ``sync=False`` a stale clone is returned as-is and the pull queued.
+        """
         from app.extensions.elapsed_time import ElapsedTime
 
         timer = ElapsedTime()
         repo = self.get_repository()
         if repo:
-            if 'origin' in repo.remotes:
-                repo = self.git_pull()
+            if 'origin' in repo.remotes and self.is_stale():
+                if sync:
+                    repo = self.git_pull()
+                else:
+                    self.git_pull_delay()
         else:
             cls = type(self)
             project = cls.get_remote(self.guid)
@@ -9,9 +9,21 @@ from flask import current_app
 from app.extensions.celery import celery
 from app.extensions.gitlab import GitlabInitializationError
 
+GIT_STORE_REMOTE_CHECK_FREQUENCY = 60 * 10
+
 log = logging.getLogger(__name__)
 
 
+@celery.on_after_configure.connect
+def git_store_setup_periodic_tasks(sender, **kwargs):
+    if GIT_STORE_REMOTE_CHECK_FREQUENCY is not None:
+        sender.add_periodic_task(
+            GIT_STORE_REMOTE_CHECK_FREQUENCY,
+            git_store_check_remotes.s(),
+            name='Check Git Store remotes for new commits',
+        )
+
+
 @celery.task(
     autoretry_for=(GitlabInitializationError, requests.exceptions.RequestException),
     default_retry_delay=600,
@@ -92,26 +104,103 @@ def git_commit(git_store_guid, description, input_files, ignore_error=True):
     default_retry_delay=600,
     max_retries=10,
 )
-def git_push(git_store_guid, ignore_error=True):
+def git_push(git_store_guid, ignore_error=True, progress_guid=None, messages=None):
     from app.extensions.git_store import GitStore
+    from app.modules.progress.models import Progress
 
     git_store = GitStore.query.get(git_store_guid)
     if git_store is None:
         return  # git store doesn't exist in the database
 
-    try:
-        repo = git_store.get_repository()
-
-        exists = repo and 'origin' in repo.remotes
-        if not exists:
-            exists = ensure_remote(git_store_guid)
+    progress = Progress.query.get(progress_guid) if progress_guid else None
 
-        if exists:
-            log.debug('Pushing to authorized URL')
-            if len(repo.remotes) > 0:
-                repo.git.push('--set-upstream', repo.remotes.origin, repo.head.ref)
-                log.debug(f'...pushed to {repo.head.ref}')
+    try:
+        # One commit and push per store at a time, anything queued while this runs
+        # gets a push of its own
+        with git_store.git_lock():
+            messages = (messages or []) + git_store.git_pending_messages()
+            repo = git_store.get_repository()
+            if progress:
+                progress.set(10)
+
+            if repo and messages:
+                if len(messages) > 1:
+                    message = '\n'.join(
+                        [f'Houston commit of {len(messages)} changes', '']
+                        + [f'- {message}' for message in messages]
+                    )
+                else:
+                    message = messages[0]
+                git_store.git_commit_changes(message, repo)
+            if progress:
+                progress.set(50)
+
+            exists = repo and 'origin' in repo.remotes
+            if not exists:
+                exists = ensure_remote(git_store_guid)
+
+            if exists:
+                log.debug('Pushing to authorized URL')
+                if len(repo.remotes) > 0:
+                    repo.git.push('--set-upstream', repo.remotes.origin, repo.head.ref)
+                    log.debug(f'...pushed to {repo.head.ref}')
+        if progress:
+            progress.set(100)
     except GitlabInitializationError:
         log.warning('GitLab Initialization Error in tasks.git_push()')
+        if progress:
+            progress.fail('GitLab Initialization Error')
         if not ignore_error:
             raise
+    except Exception as ex:
+        if progress and git_push.request.retries >= git_push.max_retries:
+            progress.fail(str(ex))
+        raise
+
+
+@celery.task(
+    autoretry_for=(requests.exceptions.RequestException, git.exc.GitCommandError),
+    default_retry_delay=60,
+    max_retries=3,
+)
+def git_pull(git_store_guid):
+    from app.extensions.git_store import GitStore
+
+    git_store = GitStore.query.get(git_store_guid)
+    if git_store is None:
+        return  # git store doesn't exist in the database
+
+    if git_store.get_repository() is not None:
+        git_store.git_pull()
+
+
+@celery.task
+def git_store_check_remotes():
+    """
+    Compare each stale local clone against its remote with ``git ls-remote`` and
+    only pull the ones that have actually moved
+    """
+    import time
+
+    from app.extensions.git_store import GitStore
+
+    ttl = current_app.config.get('GIT_STORE_SYNC_TTL', 0)
+    checked, pulled = 0, 0
+    for git_store in GitStore.query.yield_per(100):
+        repo = git_store.get_repository()
+        if repo is None or 'origin' not in repo.remotes:
+            continue
+        if not git_store.is_stale(ttl / 2):
+            continue
+
+        checked += 1
+        remote = git_store.get_remote_head(repo)
+        if remote is None:
+            continue
+        if remote == git_store.get_sync_state().get('remote'):
+            git_store.set_sync_state(synced=time.time())
+        else:
+            git_store.git_pull()
+            pulled += 1
+
+    log.info(f'Checked {checked} Git Store remotes, pulled {pulled}')
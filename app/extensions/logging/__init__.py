@@ -3,6 +3,7 @@
 Logging adapter
 ---------------
 """
+import contextlib
 import enum
 import logging
 
@@ -10,6 +11,9 @@ from flask_login import current_user  # NOQA
 
 log = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
+# Buffered audit entries are written out early once this many are pending
+AUDIT_LOG_BUFFER_SIZE = 1000
+
 
 class Logging(object):
     """
@@ -65,6 +69,119 @@ class Logging(object):
 
         logging.addLevelName(self.AUDIT, 'AUDIT')
 
+        # Audit entries created while handling a request are written in one go
+        # at the end of it
+        app.before_request(self.begin_buffer)
+        app.teardown_request(lambda exception: self.end_buffer())
+
+    @classmethod
+    def begin_buffer(cls):
+        """
+        Start buffering audit log entries on the current application context,
+        returns False if a buffer was already active
+        """
+        from flask import g, has_app_context
+
+        if not has_app_context() or g.get('audit_log_buffer') is not None:
+            return False
+        g.audit_log_buffer = []
+        return True
+
+    @classmethod
+    def flush_buffer(cls, raise_errors=False):
+        """
+        Write out the buffered entries, returns how many were written
+
+        A failed write is re-raised if ``raise_errors``, otherwise it is logged
+        along with every entry that was lost.
+        """
+        from flask import g, has_app_context
+
+        if not has_app_context():
+            return 0
+        entries = g.get('audit_log_buffer')
+        if not entries:
+            return 0
+        g.audit_log_buffer = []
+
+        from app.modules.audit_logs.models import AuditLog
+
+        try:
+            AuditLog.bulk_create(entries)
+        except Exception:
+            log.exception(f'Failed to write {len(entries)} buffered audit log entries')
+            for entry in entries:
+                log.error(f'Lost audit log entry: {entry.audit_type} {entry.message}')
+            if raise_errors:
+                raise
+            return 0
+        return len(entries)
+
+    @classmethod
+    def discard_buffered(cls, entries):
+        """
+        Drop entries from the buffer again (their work was rolled back)
+        """
+        from flask import g, has_app_context
+
+        if not has_app_context() or not g.get('audit_log_buffer'):
+            return
+        discarded = {id(entry) for entry in entries}
+        g.audit_log_buffer = [
+            entry for entry in g.audit_log_buffer if id(entry) not in discarded
+        ]
+
+    @classmethod
+    def end_buffer(cls, raise_errors=False):
+        from flask import g, has_app_context
+
+        try:
+            count = cls.flush_buffer(raise_errors=raise_errors)
+        finally:
+            if has_app_context():
+                g.pop('audit_log_buffer', None)
+        return count
+
+    @classmethod
+    @contextlib.contextmanager
+    def buffered(cls):
+        """
+        Buffer the audit log entries created inside this block and write them with
+        a single insert when it exits (used to wrap Celery tasks)
+        """
+        started = cls.begin_buffer()
+        try:
+            yield
+        finally:
+            if started:
+                cls.end_buffer(raise_errors=True)
+
+    @classmethod
+    def buffer_entry(cls, entry):
+        """
+        Add an audit log entry to the active buffer, returns False if there is no
+        buffer and the entry needs to be written directly
+        """
+        from flask import g, has_app_context
+
+        if not has_app_context():
+            return False
+        entries = g.get('audit_log_buffer')
+        if entries is None:
+            return False
+        entries.append(entry)
+
+        from app.extensions import db
+
+        session = db.session()
+        if session.transaction is not None:
+            # Dropped from the buffer again should this transaction roll back
+            session.info.setdefault('audit_log_uncommitted', []).append(entry)
+
+        if len(entries) >= AUDIT_LOG_BUFFER_SIZE:
+            cls.flush_buffer()
+        return True
+
     @classmethod
     def _log_message(cls, logger, msg, audit_type, *args, **kwargs):
         if audit_type == cls.AuditType.SystemCreate:
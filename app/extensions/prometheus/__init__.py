@@ -2,16 +2,23 @@
 """
 Logging adapter
 ---------------
+
+Two kinds of metrics are exposed on ``/metrics``:
+
+* request metrics (counts, latency, response size, in-flight) are recorded by
+  every web process; when ``PROMETHEUS_MULTIPROC_DIR`` is set they are shared
+  between processes and aggregated on scrape.
+* state gauges (models, taxonomies, logins, tasks) are expensive to compute, so
+  a Celery task refreshes them and stores the rendered result in Redis for any
+  web process to serve.
 """
 import datetime
 import logging
 import os
+import time
 
-from flask import current_app, url_for
-from oauthlib.oauth2 import BackendApplicationClient
-from prometheus_client import Counter, Gauge, Info
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, Info
 from prometheus_client.metrics import MetricWrapperBase
-from requests_oauthlib import OAuth2Session
 
 from app.extensions.api import api_v1
 from flask_restx_patched import is_extension_enabled
@@ -19,57 +26,91 @@ from flask_restx_patched import is_extension_enabled
 log = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
 
-# Allow non-ssl communication
-os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
-
 REGISTERED_MODELS = {}
 REGISTERED_TAXONOMIES = {}
 
+# Redis key of the state gauges last rendered by the Celery worker
+PROMETHEUS_STATE_KEY = 'prometheus_state'
+
+# label for requests that did not match any route (404s), so they share one series
+UNMATCHED_ROUTE = '<unmatched>'
+
+STATE_REGISTRY = CollectorRegistry(auto_describe=True)
+
 
 info = Info(
     'info',
     'Description of the Houston environment',
+    registry=STATE_REGISTRY,
 )
 
 models = Gauge(
     'models',
     'Number of total models by type',
     ['cls'],
+    registry=STATE_REGISTRY,
 )
 
 taxonomies_individuals = Gauge(
     'codex_individuals_total',
     'Number of individuals by taxonomy',
     ['species'],
+    registry=STATE_REGISTRY,
 )
 taxonomies_encounters = Gauge(
     'codex_encounters_total',
     'Number of encounters by taxonomy',
     ['species'],
+    registry=STATE_REGISTRY,
 )
 
 logins = Gauge(
     'logins',
     'Number of unique users who have logged in over the past specified days',
     ['days'],
+    registry=STATE_REGISTRY,
+)
+
+tasks_ = Gauge(
+    'tasks',
+    'Number of Celery tasks by function',
+    ['function'],
+    registry=STATE_REGISTRY,
 )
 
+STATE_METRICS = (info, models, taxonomies_individuals, taxonomies_encounters, logins, tasks_)
+
 requests = Counter(
     'requests',
-    'Number of total requests by endpoint since start',
-    ['method', 'endpoint'],
+    'Number of total requests by route since start',
+    ['method', 'route'],
 )
 
 responses = Counter(
     'responses',
-    'Number of total responses by endpoint since start',
-    ['method', 'endpoint', 'code'],
+    'Number of total responses by route since start',
+    ['method', 'route', 'code'],
 )
 
-tasks_ = Gauge(
-    'tasks',
-    'Number of Celery tasks by function',
-    ['function'],
+request_duration = Histogram(
+    'request_duration_seconds',
+    'Time spent handling requests by route',
+    ['method', 'route'],
+    buckets=Histogram.DEFAULT_BUCKETS[:-1] + (30.0, 60.0, float('inf')),
+)
+
+response_size = Histogram(
+    'response_size_bytes',
+    'Size of response bodies by route',
+    ['method', 'route'],
+    buckets=tuple(256 * 4**power for power in range(10)) + (float('inf'),),
+)
+
+requests_in_flight = Gauge(
+    'requests_in_flight',
+    'Number of requests currently being handled by route',
+    ['method', 'route'],
+    multiprocess_mode='livesum',
 )
 
 
@@ -207,28 +248,59 @@ def _update_celery(*args, **kwargs):
             tasks_.labels(function=function).set(value)
 
 
+def _request_route():
+    from flask import request
+
+    # the route template (e.g. /api/v1/assets/<uuid:asset_guid>), not the path, so
+    # the number of series is bounded by the number of routes
+    if request.url_rule is None:
+        return UNMATCHED_ROUTE
+    return request.url_rule.rule
+
+
 def _attach_flask_callbacks(app):
     @app.before_request
     def before_request_callback():
-        from flask import request
+        from flask import g, request
 
         method = request.method
-        endpoint = request.path
+        route = _request_route()
 
-        requests.labels(method=method, endpoint=endpoint).inc()
+        g.prometheus_request = (method, route, time.perf_counter())
+        requests.labels(method=method, route=route).inc()
+        requests_in_flight.labels(method=method, route=route).inc()
 
     @app.after_request
     def after_request_callback(response):
-        from flask import request
+        from flask import g
 
-        method = request.method
-        endpoint = request.path
+        started = g.get('prometheus_request')
+        if started is None:
+            return response
+        method, route, start = started
         code = response.status_code
 
-        responses.labels(method=method, endpoint=endpoint, code=code).inc()
+        responses.labels(method=method, route=route, code=code).inc()
+        request_duration.labels(method=method, route=route).observe(
+            time.perf_counter() - start
+        )
+        # streamed responses have no length up front
+        if response.content_length is not None:
+            response_size.labels(method=method, route=route).observe(
+                response.content_length
+            )
 
         return response
 
+    @app.teardown_request
+    def teardown_request_callback(exception):
+        from flask import g
+
+        started = g.pop('prometheus_request', None)
+        if started is not None:
+            method, route, _ = started
+            requests_in_flight.labels(method=method, route=route).dec()
+
 
 def _attach_sqlalchemy_listeners(app):
     from sqlalchemy.event import listen
@@ -264,7 +336,6 @@ def _attach_sqlalchemy_listeners(app):
 
 
 def init(app, *args, **kwargs):
-    _attach_flask_callbacks(app)
     _attach_sqlalchemy_listeners(app)
 
     _init_info(*args, **kwargs)
@@ -277,8 +348,6 @@ def init(app, *args, **kwargs):
 
 
 def update(*args, **kwargs):
-    from app.extensions import prometheus as current_module
-
     _update_info(*args, **kwargs)
 
     _update_models(*args, **kwargs)
@@ -288,7 +357,7 @@ def update(*args, **kwargs):
     _update_celery(*args, **kwargs)
 
     samples = []
-    for key, value in current_module.__dict__.items():
+    for value in STATE_METRICS:
         if isinstance(value, MetricWrapperBase):
             metrics = value.collect()
             for metric in metrics:
@@ -303,6 +372,55 @@ def update_logins(*args, **kwargs):
     _update_logins(*args, **kwargs)
 
 
+def store_state():
+    """
+    Save the rendered state gauges of this process for every web process to serve
+    """
+    from prometheus_client import generate_latest
+
+    from app.utils import set_persisted_value
+
+    set_persisted_value(
+        PROMETHEUS_STATE_KEY, generate_latest(STATE_REGISTRY).decode('utf-8')
+    )
+
+
+def get_state():
+    from prometheus_client import generate_latest
+
+    from app.utils import get_persisted_value
+
+    try:
+        state = get_persisted_value(PROMETHEUS_STATE_KEY)
+    except Exception:
+        log.warning('Unable to read Prometheus state from Redis, using local values')
+        state = None
+    if state is None:
+        state = generate_latest(STATE_REGISTRY).decode('utf-8')
+    return state
+
+
+def get_request_metrics():
+    from prometheus_client import REGISTRY, generate_latest, multiprocess
+
+    if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        return generate_latest(REGISTRY).decode('utf-8')
+
+    # aggregate the request metrics of every process, the state gauges are served
+    # from get_state() instead
+    state_names = {metric._name for metric in STATE_METRICS}
+
+    class RequestCollector(object):
+        def collect(self):
+            for family in multiprocess.MultiProcessCollector(None).collect():
+                if family.name not in state_names:
+                    yield family
+
+    registry = CollectorRegistry()
+    registry.register(RequestCollector())
+    return generate_latest(registry).decode('utf-8')
+
+
 def init_app(app, **kwargs):
     # pylint: disable=unused-argument
     """
@@ -310,41 +428,19 @@ def init_app(app, **kwargs):
     """
 
     if is_extension_enabled('prometheus'):
-        from . import resources
+        from . import profiling, resources
 
+        # kept so OAuth clients created with these scopes remain valid
         api_v1.add_oauth_scope('prometheus:read', 'Provide access to Prometheus details')
         api_v1.add_oauth_scope(
             'prometheus:write', 'Provide write access to Prometheus details'
         )
 
-        api_v1.add_namespace(resources.api)
+        _attach_flask_callbacks(app)
+        profiling.init_app(app)
 
         app.register_blueprint(resources.prometheus)
 
         log.info('Prometheus metrics available')
     else:
         log.info('Prometheus metrics hidden')
-
-
-def send_update(data):
-    oauth_user = current_app.config.get('OAUTH_USER', None)
-    if oauth_user:
-        client_id = oauth_user.get('client_id')
-        client_secret = oauth_user.get('client_secret')
-
-        token_url = url_for('api.auth_o_auth2_tokens', _external=True)
-
-        client = BackendApplicationClient(
-            client_id=client_id, scope=['prometheus:read', 'prometheus:write']
-        )
-        session = OAuth2Session(client=client)
-
-        session.fetch_token(
-            token_url=token_url,
-            client_id=client_id,
-            client_secret=client_secret,
-        )
-
-        update_url = url_for('api.prometheus_prometheus_update', _external=True)
-        response = session.request('POST', update_url, json=data)
-        return response
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+Request profiling
+-----------------
+
+Opt-in (``PROFILING_ENABLED``) accounting of the SQL queries and external calls
+(Sage, EDM, Elasticsearch) made by each request and Celery task, exported as
+Prometheus histograms.  Anything slower than ``PROFILING_SLOW_SECONDS`` has its
+full trace logged, with repeated statements (the usual N+1 suspects) listed first.
+"""
+import collections
+import contextlib
+import contextvars
+import functools
+import logging
+import time
+
+from prometheus_client import Histogram
+
+log = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+# most trace entries kept for a single request or task
+PROFILE_TRACE_LIMIT = 2000
+
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, float('inf'))
+
+profile_queries = Histogram(
+    'profile_queries',
+    'SQL queries per request or task',
+    ['kind', 'name'],
+    buckets=COUNT_BUCKETS,
+)
+
+profile_db_seconds = Histogram(
+    'profile_db_seconds',
+    'Time spent in SQL per request or task',
+    ['kind', 'name'],
+)
+
+profile_external_calls = Histogram(
+    'profile_external_calls',
+    'External calls per request or task by service',
+    ['kind', 'name', 'service'],
+    buckets=COUNT_BUCKETS,
+)
+
+profile_external_seconds = Histogram(
+    'profile_external_seconds',
+    'Time spent in external calls per request or task by service',
+    ['kind', 'name', 'service'],
+)
+
+external_call_seconds = Histogram(
+    'external_call_seconds',
+    'Latency of single external calls by service',
+    ['service'],
+)
+
+section_seconds = Histogram(
+    'profile_section_seconds',
+    'Time spent in profiled code sections',
+    ['section'],
+)
+
+section_queries = Histogram(
+    'profile_section_queries',
+    'SQL queries made by profiled code sections',
+    ['section'],
+    buckets=COUNT_BUCKETS,
+)
+
+
+_enabled = False
+_slow_seconds = None
+
+current_profile = contextvars.ContextVar('houston_profile', default=None)
+
+# Celery tasks start and finish in separate signal handlers
+_task_tokens = {}
+
+
+class Profile(object):
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.external = {}  # service: [calls, seconds]
+        self.trace = []  # (offset, kind, description, seconds)
+        self.untraced = 0
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def _record(self, kind, description, seconds):
+        if len(self.trace) < PROFILE_TRACE_LIMIT:
+            offset = self.elapsed() - seconds
+            self.trace.append((offset, kind, description, seconds))
+        else:
+            self.untraced += 1
+
+    def add_query(self, statement, seconds):
+        self.queries += 1
+        self.db_seconds += seconds
+        self._record('sql', statement, seconds)
+
+    def add_external(self, service, description, seconds):
+        calls = self.external.setdefault(service, [0, 0.0])
+        calls[0] += 1
+        calls[1] += seconds
+        self._record(service, description, seconds)
+
+    def observe(self):
+        labels = {'kind': self.kind, 'name': self.name}
+        profile_queries.labels(**labels).observe(self.queries)
+        profile_db_seconds.labels(**labels).observe(self.db_seconds)
+        for service, (calls, seconds) in self.external.items():
+            profile_external_calls.labels(service=service, **labels).observe(calls)
+            profile_external_seconds.labels(service=service, **labels).observe(seconds)
+
+    def format_trace(self, elapsed=None):
+        if elapsed is None:
+            elapsed = self.elapsed()
+        external = ', '.join(
+            f'{service} {calls} calls ({seconds:.3f}s)'
+            for service, (calls, seconds) in sorted(self.external.items())
+        )
+        lines = [
+            f'Slow {self.kind} {self.name} took {elapsed:.3f}s: '
+            f'{self.queries} queries ({self.db_seconds:.3f}s)'
+            + (f', {external}' if external else '')
+        ]
+        repeated = collections.Counter(
+            description for _, kind, description, _ in self.trace if kind == 'sql'
+        )
+        for statement, count in repeated.most_common(10):
+            if count > 1:
+                lines.append(f'  repeated {count}x: {" ".join(statement.split())}')
+        for offset, kind, description, seconds in self.trace:
+            description = ' '.join(description.split())
+            lines.append(f'  +{offset:.3f}s {seconds * 1000:.1f}ms {kind}: {description}')
+        if self.untraced:
+            lines.append(f'  ... and {self.untraced} more not traced')
+        return '\n'.join(lines)
+
+
+def start_profile(kind, name):
+    if not _enabled:
+        return None
+    return current_profile.set(Profile(kind, name))
+
+
+def finish_profile(token):
+    if token is None:
+        return None
+    profile = current_profile.get()
+    current_profile.reset(token)
+    if profile is None:
+        return None
+
+    elapsed = profile.elapsed()
+    profile.observe()
+    if _slow_seconds is not None and elapsed >= _slow_seconds:
+        log.warning(profile.format_trace(elapsed))
+    return profile
+
+
+@contextlib.contextmanager
+def external_call(service, description=''):
+    """
+    Time a call to an external service, for the current request or task
+    """
+    if not _enabled:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        external_call_seconds.labels(service=service).observe(seconds)
+        profile = current_profile.get()
+        if profile is not None:
+            profile.add_external(service, description, seconds)
+
+
+def profiled(section):
+    """
+    Decorator timing a hot code path (and counting its queries) as ``section``
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+
+            profile = current_profile.get()
+            queries = profile.queries if profile is not None else None
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                section_seconds.labels(section=section).observe(
+                    time.perf_counter() - start
+                )
+                if profile is not None:
+                    section_queries.labels(section=section).observe(
+                        profile.queries - queries
+                    )
+
+        return wrapper
+
+    return decorator
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('profile_query_start')
+    if not starts:
+        return
+    seconds = time.perf_counter() - starts.pop()
+    profile = current_profile.get()
+    if profile is not None:
+        profile.add_query(statement, seconds)
+
+
+def _attach_sqlalchemy_listeners():
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def _attach_flask_callbacks(app):
+    @app.before_request
+    def profile_before_request():
+        from flask import g, request
+
+        from . import _request_route
+
+        g.profile_token = start_profile('request', f'{request.method} {_request_route()}')
+
+    @app.teardown_request
+    def profile_teardown_request(exception):
+        from flask import g
+
+        finish_profile(g.pop('profile_token', None))
+
+
+def _attach_celery_signals():
+    from celery.signals import task_postrun, task_prerun
+
+    def profile_task_prerun(task_id=None, task=None, **kwargs):
+        _task_tokens[task_id] = start_profile('task', task.name)
+
+    def profile_task_postrun(task_id=None, task=None, **kwargs):
+        finish_profile(_task_tokens.pop(task_id, None))
+
+    task_prerun.connect(profile_task_prerun, weak=False)
+    task_postrun.connect(profile_task_postrun, weak=False)
+
+
+def init_app(app):
+    global _enabled
+    global _slow_seconds
+
+    if not app.config.get('PROFILING_ENABLED', False):
+        return
+
+    _enabled = True
+    _slow_seconds = app.config.get('PROFILING_SLOW_SECONDS', None)
+
+    _attach_sqlalchemy_listeners()
+    _attach_flask_callbacks(app)
+    _attach_celery_signals()
+
+    log.info(f'Request profiling enabled (slow threshold {_slow_seconds}s)')
@@ -21,14 +21,7 @@ def prometheus_task_setup_periodic_tasks(sender, **kwargs):
 
 @celery.task
 def prometheus_update():
-    import json
-
     from app.extensions import prometheus
 
-    samples = prometheus.update()
-
-    data = json.dumps(samples)
-    response = prometheus.send_update(data)
-
-    assert response is not None
-    assert response.status_code == 200
+    prometheus.update()
+    prometheus.store_state()
@@ -254,6 +254,8 @@ class RestManager(RestManagerUserMixin):
         verbose=False,
         reauthenticated=False,
     ):
+        from app.extensions.prometheus.profiling import external_call
+
         if ensure_initialized:
             self._ensure_initialized()
 
@@ -289,7 +291,8 @@ class RestManager(RestManagerUserMixin):
             request_func = getattr(session_, method, None)
             assert request_func is not None
 
-            response = request_func(endpoint_encoded, **passthrough_kwargs)
+            with external_call(self.NAME, f'{method.upper()} {endpoint_encoded}'):
+                response = request_func(endpoint_encoded, **passthrough_kwargs)
 
         if response.ok:
             if decode_as_object:
@@ -24,6 +24,11 @@ if not is_extension_enabled('sage'):
 KEYWORD_SET = set(keyword.kwlist)
 SAGE_UNKNOWN_NAME = '____'
 
+# objects loaded (and their Sage requests started) at a time by sync_all_with_sage()
+SAGE_SYNC_BATCH_SIZE = 200
+# most Sage requests in flight at once during sync_all_with_sage()
+SAGE_SYNC_WORKERS = 4
+
 log = logging.getLogger(__name__)
 
 
@@ -31,7 +36,24 @@ class SageModel(object):
     """Adds `viewed` column to a derived declarative model."""
 
     @classmethod
-    def sync_all_with_sage(cls, prune=False, **kwargs):
+    def sync_all_with_sage(
+        cls,
+        prune=False,
+        resume=False,
+        batch_size=SAGE_SYNC_BATCH_SIZE,
+        workers=SAGE_SYNC_WORKERS,
+        **kwargs,
+    ):
+        """
+        Sync every object of this class with Sage
+
+        Objects are loaded in batches (in guid order), checked against one bulk
+        listing of what Sage already has, and uploaded by up to ``workers``
+        concurrent requests.  The last finished batch is checkpointed, so an
+        interrupted sync can be picked up again with ``resume=True``.
+        """
+        import concurrent.futures
+
         houston_tag, sage_tag = cls.get_sage_sync_tags()
         sage_uuids = current_app.sage.request_passthrough_result(
             '{}.list'.format(houston_tag), 'get', target='sync'
@@ -50,10 +72,32 @@ class SageModel(object):
             sage_uuids_ = {from_sage_uuid(guid) for guid in sage_uuids_}
             bulk_sage_uuids[houston_tag_] = sage_uuids_
 
-        objs = cls.query.all()
+        last_guid = cls.get_sage_sync_checkpoint() if resume else None
+        query = cls.query
+        if last_guid is not None:
+            log.info(f'Resuming Sage Sync {cls.__name__} after {last_guid}')
+            query = query.filter(cls.guid > last_guid)
+        options = cls.sage_sync_load_options()
+        if options:
+            query = query.options(*options)
+
         desc = 'Sage Sync {}'.format(cls.__name__)
-        for obj in tqdm.tqdm(objs, desc=desc):
-            obj.sync_with_sage(bulk_sage_uuids=bulk_sage_uuids, **kwargs)
+        with tqdm.tqdm(total=query.count(), desc=desc) as progress:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                while True:
+                    batch_query = query
+                    if last_guid is not None:
+                        batch_query = batch_query.filter(cls.guid > last_guid)
+                    batch = batch_query.order_by(cls.guid).limit(batch_size).all()
+                    if not batch:
+                        break
+                    cls.sync_batch_with_sage(
+                        batch, executor, bulk_sage_uuids=bulk_sage_uuids, **kwargs
+                    )
+                    last_guid = batch[-1].guid
+                    cls.set_sage_sync_checkpoint(last_guid)
+                    progress.update(len(batch))
+        cls.set_sage_sync_checkpoint(None)
 
         if prune:
             houston_sage_uuids = cls.query.with_entities(cls.content_guid).all()
@@ -90,13 +134,118 @@ class SageModel(object):
                 )
                 assert sage_response
 
+    @classmethod
+    def sync_batch_with_sage(cls, objs, executor, **kwargs):
+        """
+        Sync a batch of objects, the Sage requests run on the executor's threads
+        and everything touching the database stays on this one
+
+        Failures are only reported once every request has finished and the
+        successful ones are saved.
+        """
+        from app.extensions import db
+
+        app = current_app._get_current_object()
+
+        def run(sage_request):
+            with app.app_context():
+                return sage_request()
+
+        pending = []
+        for obj in objs:
+            sage_request = obj.prepare_sage_sync(**kwargs)
+            if sage_request is not None:
+                pending.append((obj, executor.submit(run, sage_request)))
+
+        synced, failed = [], []
+        try:
+            for obj, future in pending:
+                try:
+                    synced.append((obj, future.result()))
+                except Exception as exception:
+                    failed.append((obj, exception))
+        finally:
+            # everything that reached Sage is saved first, so that a resumed sync
+            # does not send it again
+            if synced:
+                with db.session.begin(subtransactions=True):
+                    for obj, sage_guid in synced:
+                        obj.content_guid = sage_guid
+                        db.session.merge(obj)
+
+        errors = []
+        for obj, exception in failed:
+            try:
+                obj.sage_sync_failed(exception)
+            except Exception as error:
+                log.error(f'Sage sync of {obj} failed: {error!r}')
+                errors.append(error)
+        if errors:
+            raise errors[0]
+
+    @classmethod
+    def _sage_sync_checkpoint_key(cls):
+        return f'sage_sync_checkpoint:{cls.__name__}'
+
+    @classmethod
+    def get_sage_sync_checkpoint(cls):
+        from app.utils import get_persisted_value
+
+        try:
+            value = get_persisted_value(cls._sage_sync_checkpoint_key())
+        except Exception:
+            log.warning('Could not read the Sage sync checkpoint, starting over')
+            return None
+        return uuid.UUID(value) if value else None
+
+    @classmethod
+    def set_sage_sync_checkpoint(cls, guid):
+        from app.utils import set_persisted_value
+
+        try:
+            set_persisted_value(
+                cls._sage_sync_checkpoint_key(), str(guid) if guid else ''
+            )
+        except Exception:
+            log.warning('Could not save the Sage sync checkpoint')
+
+    @classmethod
+    def sage_sync_load_options(cls):
+        return []
+
     @classmethod
     def get_sage_sync_tags(cls):
         raise NotImplementedError('implement this function in each class')
 
-    def sync_with_sage(cls, **kwargs):
+    def prepare_sage_sync(self, **kwargs):
+        """
+        Make the (database side) checks for syncing this object with Sage
+
+        Returns a function that makes the Sage request (it must not touch the
+        database) and returns the new Sage guid, or None if there is nothing to send.
+        """
         raise NotImplementedError('implement this function in each class')
 
+    def sage_sync_failed(self, exception):
+        raise exception
+
+    def sync_with_sage(self, **kwargs):
+        from app.extensions import db
+
+        sage_request = self.prepare_sage_sync(**kwargs)
+        if sage_request is None:
+            return
+        try:
+            sage_guid = sage_request()
+        except Exception as exception:
+            self.sage_sync_failed(exception)
+            return
+
+        with db.session.begin(subtransactions=True):
+            self.content_guid = sage_guid
+            db.session.merge(self)
+        db.session.refresh(self)
+
 
 def to_sage_uuid(houston_guid):
     if houston_guid is None:
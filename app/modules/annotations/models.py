@@ -161,7 +161,11 @@ class Annotation(db.Model, HoustonModel, SageModel):
     def get_sage_sync_tags(cls):
         return 'annotation', 'annot'
 
-    def sync_with_sage(
+    @classmethod
+    def sage_sync_load_options(cls):
+        return [db.joinedload(Annotation.asset)]
+
+    def prepare_sage_sync(
         self, ensure=False, force=False, bulk_sage_uuids=None, skip_asset=False, **kwargs
     ):
         from app.extensions.sage import SAGE_UNKNOWN_NAME, from_sage_uuid, to_sage_uuid
@@ -254,15 +258,14 @@ class Annotation(db.Model, HoustonModel, SageModel):
             'annot_name_list': [annot_name],
             'annot_theta_list': [self.bounds.get('theta', 0)],
         }
-        sage_response = current_app.sage.request_passthrough_result(
-            'annotation.create', 'post', {'json': sage_request}, target='sync'
-        )
-        sage_guid = from_sage_uuid(sage_response[0])
 
-        with db.session.begin(subtransactions=True):
-            self.content_guid = sage_guid
-            db.session.merge(self)
-        db.session.refresh(self)
+        def create():
+            sage_response = current_app.sage.request_passthrough_result(
+                'annotation.create', 'post', {'json': sage_request}, target='sync'
+            )
+            return from_sage_uuid(sage_response[0])
+
+        return create
 
     def init_progress_identification(self, parent=None, overwrite=False):
         from app.modules.progress.models import Progress
@@ -574,12 +577,17 @@ class Annotation(db.Model, HoustonModel, SageModel):
             ags.config = ags.config
             with db.session.begin(subtransactions=True):
                 db.session.merge(ags)
+        from app.modules.keywords.models import Keyword
+
         with db.session.begin(subtransactions=True):
+            keywords = []
             while self.keyword_refs:
                 ref = self.keyword_refs.pop()
                 # this is actually removing the AnnotationKeywords refs (not actual Keywords)
                 db.session.delete(ref)
-                ref.keyword.delete_if_unreferenced()  # but this *may* remove keyword itself
+                keywords.append(ref.keyword)
+            # but this *may* remove the keywords themselves
+            Keyword.delete_unreferenced(keywords)
             db.session.delete(self)
 
     def set_bounds(self, bounds):
@@ -59,6 +59,18 @@ class PatchAnnotationDetailsParameters(PatchJSONParameters):
 
     NON_NULL_PATHS = ('/ia_class',)
 
+    @classmethod
+    def perform_patch(cls, operations, obj=None, obj_cls=None, state=None):
+        from app.modules.keywords.models import Keyword
+
+        if state is None:
+            state = {}
+        # Look up (or create) every keyword value in the patch at once
+        state['keyword_values'] = Keyword.ensure_patch_keywords(operations, 'keywords')
+        return super(PatchAnnotationDetailsParameters, cls).perform_patch(
+            operations, obj=obj, obj_cls=obj_cls, state=state
+        )
+
     @classmethod
     def _check_keyword_value(cls, obj, field, value, state, create=True):
         from app.modules.keywords.models import Keyword
@@ -79,7 +91,11 @@ class PatchAnnotationDetailsParameters(PatchJSONParameters):
 
         # Otherwise, try to ensure the keyword as normal
         if keyword is None:
-            keyword = Keyword.ensure_keyword(value, create=create)
+            resolved = state.get('keyword_values', {})
+            if isinstance(value, str) and value in resolved:
+                keyword = resolved[value]
+            else:
+                keyword = Keyword.ensure_keyword(value, create=create)
 
         return keyword
 
@@ -401,12 +401,20 @@ class AnnotationSageHeatmap(Resource):
     def get(self, filename):
         import os
 
-        from flask import current_app, send_file
+        from flask import current_app
+
+        from app.utils import not_modified_response, send_cached_file
 
         filename = os.path.normpath(filename)
         if '/' in filename:  # prevent dir-roaming
             abort(code=HTTPStatus.NOT_FOUND)
 
+        # heatmap filenames are made from the Sage job and annotation content, so never change
+        etag = os.path.splitext(filename)[0]
+        response = not_modified_response(etag, immutable=True)
+        if response is not None:
+            return response
+
         # TODO make this a path in sightings (or etc) cuz it is duplicated there
         filepath = os.path.join(
             current_app.config.get('FILEUPLOAD_BASE_PATH', '/tmp'),
@@ -415,4 +423,4 @@ class AnnotationSageHeatmap(Resource):
         )
         if not os.path.exists(filepath):
             abort(code=HTTPStatus.NOT_FOUND)
-        return send_file(filepath, 'image/jpeg')
+        return send_cached_file(filepath, 'image/jpeg', etag, immutable=True)
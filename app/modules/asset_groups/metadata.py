@@ -19,6 +19,9 @@ from app.utils import HoustonException
 
 log = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
+# individual guids checked per query when resolving the references in a request
+METADATA_LOOKUP_SIZE = 1000
+
 
 class AssetGroupMetadataError(HoustonException):
     def __init__(self, logger, log_message, message=None, status_code=400):
@@ -143,12 +146,78 @@ class AssetGroupMetadata(object):
                     raise AssetGroupMetadataError(log, f'failed to find {algorithm}')
 
     @classmethod
-    def validate_owner_email(cls, owner_email, debug):
+    def resolve_references(cls, sightings):
+        """
+        Collect the owners, individuals and regions referenced anywhere in the
+        sightings (and their encounters) and resolve each kind in one go, the per
+        item validation then checks against the returned dict
+
+        Anything malformed is skipped here and reported by the per item validation.
+        """
+        from app.extensions import db
+        from app.modules.individuals.models import Individual
+        from app.modules.site_settings.models import Regions
+        from app.modules.users.models import User
+
+        owner_emails = set()
+        individual_guids = set()
+        location_ids = set()
+        for sighting in sightings:
+            if not isinstance(sighting, dict):
+                continue
+            location_ids.add(sighting.get('locationId'))
+            encounters = sighting.get('encounters')
+            if not isinstance(encounters, list):
+                continue
+            for encounter in encounters:
+                if not isinstance(encounter, dict):
+                    continue
+                location_ids.add(encounter.get('locationId'))
+                if isinstance(encounter.get('ownerEmail'), str):
+                    owner_emails.add(encounter['ownerEmail'])
+                if util.is_valid_uuid_string(encounter.get('individualUuid')):
+                    individual_guids.add(uuid.UUID(encounter['individualUuid']))
+
+        individual_guids = list(individual_guids)
+        individuals = set()
+        for start in range(0, len(individual_guids), METADATA_LOOKUP_SIZE):
+            individuals.update(
+                guid
+                for (guid,) in db.session.query(Individual.guid).filter(
+                    Individual.guid.in_(
+                        individual_guids[start : start + METADATA_LOOKUP_SIZE]
+                    )
+                )
+            )
+
+        return {
+            'owners': User.find_by_emails(owner_emails),
+            'individuals': individuals,
+            'regions': Regions.valid_region_guids(
+                location_id
+                for location_id in location_ids
+                if isinstance(location_id, str)
+            ),
+        }
+
+    @classmethod
+    def _is_region_valid(cls, location_id, references):
+        from app.modules.site_settings.models import Regions
+
+        if isinstance(location_id, str):
+            return location_id in references['regions']
+        return Regions.is_region_guid_valid(location_id)
+
+    @classmethod
+    def validate_owner_email(cls, owner_email, debug, owners=None):
         from app.modules.users.models import User
 
         if not isinstance(owner_email, str):
             raise AssetGroupMetadataError(log, f'{debug} ownerEmail must be a string')
-        encounter_owner = User.find(email=owner_email)
+        if owners is not None:
+            encounter_owner = owners.get(owner_email)
+        else:
+            encounter_owner = User.find(email=owner_email)
         if encounter_owner is None:
             raise AssetGroupMetadataError(log, f'{debug} owner {owner_email} not found')
 
@@ -211,17 +280,20 @@ class AssetGroupMetadata(object):
             )
 
     @classmethod
-    def validate_individual(cls, individual_uuid, debug):
+    def validate_individual(cls, individual_uuid, debug, individual_guids=None):
         from app.modules.individuals.models import Individual
 
         try:
-            individual = Individual.query.get(individual_uuid)
+            if individual_guids is not None:
+                found = uuid.UUID(individual_uuid) in individual_guids
+            else:
+                found = Individual.query.get(individual_uuid) is not None
         except Exception:
             raise AssetGroupMetadataError(
                 log, f'{debug} individual {individual_uuid} not valid'
             )
 
-        if individual is None:
+        if not found:
             raise AssetGroupMetadataError(
                 log, f'{debug} individual {individual_uuid} not found'
             )
@@ -255,11 +327,14 @@ class AssetGroupMetadata(object):
                 )
 
     @classmethod
-    def validate_encounters(cls, encounters, debug):
+    def validate_encounters(cls, encounters, debug, references=None):
         encounter_num = 0
         owner_assignment = False
         from app.modules.complex_date_time.models import ComplexDateTime
 
+        if references is None:
+            references = cls.resolve_references([{'encounters': encounters}])
+
         # Have a sighting with multiple encounters, make sure we have all of the files
         for encounter in encounters:
             encounter_num += 1
@@ -287,10 +362,8 @@ class AssetGroupMetadata(object):
                 f'{debug}{encounter_num}',
             )
 
-            from app.modules.site_settings.models import Regions
-
-            if 'locationId' in encounter and not Regions.is_region_guid_valid(
-                encounter['locationId']
+            if 'locationId' in encounter and not cls._is_region_valid(
+                encounter['locationId'], references
             ):
                 raise AssetGroupMetadataError(
                     log,
@@ -305,12 +378,16 @@ class AssetGroupMetadata(object):
             # individual must be valid
             if 'individualUuid' in encounter:
                 cls.validate_individual(
-                    encounter['individualUuid'], f'{debug}{encounter_num}'
+                    encounter['individualUuid'],
+                    f'{debug}{encounter_num}',
+                    references['individuals'],
                 )
             # Can reassign encounter owner but only to a valid user
             if 'ownerEmail' in encounter:
                 cls.validate_owner_email(
-                    encounter['ownerEmail'], f'{debug}{encounter_num}'
+                    encounter['ownerEmail'],
+                    f'{debug}{encounter_num}',
+                    references['owners'],
                 )
                 owner_assignment = True
 
@@ -319,7 +396,9 @@ class AssetGroupMetadata(object):
 
         return owner_assignment
 
-    def _validate_sighting(self, sighting, file_dir, sighting_debug, encounter_debug):
+    def _validate_sighting(
+        self, sighting, file_sizes, references, sighting_debug, encounter_debug
+    ):
 
         sighting_fields = [
             ('locationId', uuid.UUID, True),
@@ -336,10 +415,9 @@ class AssetGroupMetadata(object):
         ]
         self._validate_fields(sighting, sighting_fields, sighting_debug)
         from app.modules.complex_date_time.models import ComplexDateTime
-        from app.modules.site_settings.models import Regions
         from app.utils import get_stored_filename
 
-        if not Regions.is_region_guid_valid(sighting['locationId']):
+        if not self._is_region_valid(sighting['locationId'], references):
             raise AssetGroupMetadataError(
                 log, f"Invalid locationId guid {sighting['locationId']}"
             )
@@ -354,17 +432,15 @@ class AssetGroupMetadata(object):
                     raise AssetGroupMetadataError(
                         log, f'Invalid assetReference data {filename}'
                     )
-                stored_filename = get_stored_filename(filename)
-                file_path = os.path.join(file_dir, stored_filename)
-                file_size = 0
-                try:
-                    file_size = os.path.getsize(file_path)  # 2for1
-                except OSError as err:
+                file_size = file_sizes.get(get_stored_filename(filename))
+                if file_size is None:
                     raise AssetGroupMetadataError(
-                        log, f'Failed to find {filename} in transaction {err} '
+                        log, f'Failed to find {filename} in transaction'
                     )
                 if file_size < 1:
-                    raise AssetGroupMetadataError(f'found zero-size file for {filename}')
+                    raise AssetGroupMetadataError(
+                        log, f'found zero-size file for {filename}'
+                    )
                 if filename in self.files:
                     raise AssetGroupMetadataError(
                         log, f'found {filename} in multiple sightings'
@@ -379,9 +455,10 @@ class AssetGroupMetadata(object):
         if 'decimalLatitude' in sighting or 'decimalLongitude' in sighting:
             self._validate_lat_long(sighting, sighting_debug)
 
-        self.owner_assignment = self.validate_encounters(
-            sighting['encounters'], f'{encounter_debug}'
-        )
+        if self.validate_encounters(
+            sighting['encounters'], f'{encounter_debug}', references
+        ):
+            self.owner_assignment = True
         from app.modules.sightings.models import Sighting
 
         unsupported_fields = Sighting.get_unsupported_fields(sighting.keys())
@@ -559,6 +636,18 @@ class AssetGroupMetadata(object):
         from app.extensions.tus import tus_upload_dir
 
         file_dir = tus_upload_dir(current_app, transaction_id=self.tus_transaction_id)
+        # sizes of the uploaded files, by stored filename
+        file_sizes = {}
+        try:
+            with os.scandir(file_dir) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        file_sizes[entry.name] = entry.stat().st_size
+        except OSError:
+            pass
+
+        # everything the sightings refer to is looked up once, up front
+        references = self.resolve_references(self.request['sightings'])
 
         asset_refs = []
         sighting_num = 0
@@ -574,7 +663,8 @@ class AssetGroupMetadata(object):
             # all files referenced must exist in the tus dir
             self._validate_sighting(
                 sighting,
-                file_dir,
+                file_sizes,
+                references,
                 f'Sighting {sighting_num}',
                 f'Encounter {sighting_num}.',
             )
@@ -16,6 +16,7 @@ from flask_login import current_user  # NOQA
 import app.extensions.logging as AuditLog  # NOQA
 from app.extensions import HoustonModel, db
 from app.extensions.git_store import GitStore
+from app.extensions.prometheus.profiling import profiled
 from app.extensions.sage import from_sage_uuid
 from app.modules.annotations.models import Annotation
 from app.modules.assets.models import Asset
@@ -202,6 +203,7 @@ class AssetGroupSighting(db.Model, HoustonModel):
                 self.delete()
                 raise ex
 
+    @profiled('asset_group_sighting.commit')
     def commit(self):
         from app.extensions.elapsed_time import ElapsedTime
 
@@ -270,108 +272,192 @@ class AssetGroupSighting(db.Model, HoustonModel):
             time=time,
         )
 
+        encounter_configs = self.sighting_config['encounters']
+        owners, individuals_by_name, individuals, annotations = self._commit_prefetch(
+            encounter_configs
+        )
+
+        # Everything is written in one transaction, the new objects are indexed in
+        # Elasticsearch as one bulk operation when it ends.  The audit entries for
+        # the encounters are only written once it has committed
+        audits = []
         with db.session.begin(subtransactions=True):
             db.session.add(sighting)
 
-        # Add the assets for all of the encounters to the created sighting object
-        for reference in self.sighting_config.get('assetReferences', []):
-            asset = self.asset_group.get_asset_for_file(reference)
-            assert asset
-            sighting.add_asset(asset)
-
-        for encounter_num in range(len(self.sighting_config['encounters'])):
-            req_data = self.sighting_config['encounters'][encounter_num]
-            try:
-                owner_guid = self.asset_group.owner_guid
-                if 'ownerEmail' in req_data:
-                    owner_email = req_data['ownerEmail']
-                    encounter_owner = User.find(email=owner_email)
-                    # Validated in the metadata code so must be correct
-                    assert encounter_owner
-                    owner_guid = encounter_owner.guid
-
-                individual = None
-                if DEFAULT_NAME_CONTEXT in req_data:
-                    individual = Individual.get_by_name(req_data[DEFAULT_NAME_CONTEXT])
+            # Add the assets for all of the encounters to the created sighting object
+            assets_by_path = {asset.path: asset for asset in self.asset_group.assets}
+            added_assets = set()
+            for reference in self.sighting_config.get('assetReferences', []):
+                asset = assets_by_path.get(reference)
+                assert asset
+                if asset.guid not in added_assets:
+                    sighting.add_asset_in_context(asset)
+                    added_assets.add(asset.guid)
+
+            # The encounters are flushed together (as batched INSERTs), a failure on
+            # any of them rolls back the sighting as well
+            for encounter_num, req_data in enumerate(encounter_configs):
                 try:
-                    # will raise ValueError if data no good
-                    if 'time' in req_data:
-                        time = ComplexDateTime.from_data(req_data)
-                    else:
-                        time = None
-                except ValueError as ve:
+                    self._commit_encounter(
+                        sighting,
+                        req_data,
+                        owners,
+                        individuals_by_name,
+                        individuals,
+                        annotations,
+                        audits,
+                    )
+                except Exception as ex:
                     raise HoustonException(
                         log,
-                        f'Problem with sighting time/timeSpecificity values: {str(ve)}',
-                        obj=self,
+                        f'Problem with creating encounter [{encounter_num}]: {ex}'
+                        f'{ex} on encounter {encounter_num}: enc={req_data}',
                     )
-                assert 'guid' in req_data
-                new_encounter = Encounter(
-                    individual=individual,
-                    owner_guid=owner_guid,
-                    asset_group_sighting_encounter_guid=req_data['guid'],
-                    submitter_guid=self.asset_group.submitter_guid,
-                    decimal_latitude=req_data.get('decimalLatitude'),
-                    decimal_longitude=req_data.get('decimalLongitude'),
-                    location_guid=req_data.get('locationId'),
-                    taxonomy_guid=req_data.get('taxonomy'),
-                    verbatim_locality=req_data.get('verbatimLocality'),
-                    sex=req_data.get('sex'),
-                    time=time,
-                    custom_fields=req_data.get('customFields', {}),
-                )
 
-                if 'individualUuid' in req_data:
-                    ind_guid = req_data['individualUuid']
-                    individual = Individual.query.get(uuid.UUID(ind_guid))
-                    if individual:
-                        new_encounter.set_individual(individual)
-                    else:
-                        log.warning(
-                            f'Individual with guid {ind_guid} not found for auto assignment to created encounter'
-                        )
+            # This has to be done as the final step in the creation as the FE does not seem to wait for the commit
+            # response but starts using the sighting as soon as it can be read from the AGS
+            sighting.set_asset_group_sighting(self)
 
-                AuditLog.user_create_object(log, new_encounter, f'for owner {owner_guid}')
+            # AssetGroupSighting is finished, all subsequent processing is on the Sighting
+            self.complete()
 
-                annotations = req_data.get('annotations', [])
-                for annot_uuid in annotations:
-                    annot = Annotation.query.get(annot_uuid)
-                    assert annot
+        for obj, msg, audit_type in audits:
+            AuditLog.audit_log_object(log, obj, msg, audit_type)
 
-                    AuditLog.audit_log_object(
-                        log,
-                        new_encounter,
-                        f' Added annotation {annot_uuid}',
-                        AuditLog.AuditType.Update,
-                    )
+        sighting.ia_pipeline()
 
-                    new_encounter.add_annotation(annot)
+        num_encounters = self.num_encounters()
+        AuditLog.user_create_object(
+            log, sighting, f'with {num_encounters} encounter(s)', duration=timer.elapsed()
+        )
+        return sighting
 
-                sighting.add_encounter(new_encounter)
-                with db.session.begin(subtransactions=True):
-                    db.session.add(new_encounter)
+    def _commit_prefetch(self, encounter_configs):
+        """
+        Load the owners, individuals and annotations that the encounters refer to,
+        with one query for each
+        """
+        owners = User.find_by_emails(
+            req_data['ownerEmail']
+            for req_data in encounter_configs
+            if 'ownerEmail' in req_data
+        )
+        individuals_by_name = Individual.get_by_names(
+            req_data[DEFAULT_NAME_CONTEXT]
+            for req_data in encounter_configs
+            if DEFAULT_NAME_CONTEXT in req_data
+        )
 
-            except Exception as ex:
-                sighting.delete()
-                raise HoustonException(
-                    log,
-                    f'Problem with creating encounter [{encounter_num}]: {ex}'
-                    f'{ex} on encounter {encounter_num}: enc={req_data}',
+        individual_guids = set()
+        annotation_guids = set()
+        for req_data in encounter_configs:
+            try:
+                if 'individualUuid' in req_data:
+                    individual_guids.add(uuid.UUID(req_data['individualUuid']))
+                for annot_uuid in req_data.get('annotations', []):
+                    annotation_guids.add(uuid.UUID(str(annot_uuid)))
+            except ValueError:
+                # reported against the encounter when it is created
+                continue
+        individuals = {}
+        if individual_guids:
+            individuals = {
+                individual.guid: individual
+                for individual in Individual.query.filter(
+                    Individual.guid.in_(list(individual_guids))
+                )
+            }
+        annotations = {}
+        if annotation_guids:
+            annotations = {
+                annot.guid: annot
+                for annot in Annotation.query.filter(
+                    Annotation.guid.in_(list(annotation_guids))
                 )
+            }
+        return owners, individuals_by_name, individuals, annotations
+
+    def _commit_encounter(
+        self,
+        sighting,
+        req_data,
+        owners,
+        individuals_by_name,
+        individuals,
+        annotations,
+        audits,
+    ):
+        from app.modules.complex_date_time.models import ComplexDateTime
 
-        # This has to be done as the final step in the creation as the FE does not seem to wait for the commit
-        # response but starts using the sighting as soon as it can be read from the AGS
-        sighting.set_asset_group_sighting(self)
+        owner_guid = self.asset_group.owner_guid
+        if 'ownerEmail' in req_data:
+            encounter_owner = owners.get(req_data['ownerEmail'])
+            # Validated in the metadata code so must be correct
+            assert encounter_owner
+            owner_guid = encounter_owner.guid
 
-        # AssetGroupSighting is finished, all subsequent processing is on the Sighting
-        self.complete()
-        sighting.ia_pipeline()
+        individual = None
+        if DEFAULT_NAME_CONTEXT in req_data:
+            individual = individuals_by_name.get(req_data[DEFAULT_NAME_CONTEXT])
+        try:
+            # will raise ValueError if data no good
+            if 'time' in req_data:
+                time = ComplexDateTime.from_data(req_data)
+            else:
+                time = None
+        except ValueError as ve:
+            raise HoustonException(
+                log,
+                f'Problem with sighting time/timeSpecificity values: {str(ve)}',
+                obj=self,
+            )
+        assert 'guid' in req_data
+        new_encounter = Encounter(
+            guid=uuid.uuid4(),
+            individual=individual,
+            owner_guid=owner_guid,
+            asset_group_sighting_encounter_guid=req_data['guid'],
+            submitter_guid=self.asset_group.submitter_guid,
+            decimal_latitude=req_data.get('decimalLatitude'),
+            decimal_longitude=req_data.get('decimalLongitude'),
+            location_guid=req_data.get('locationId'),
+            taxonomy_guid=req_data.get('taxonomy'),
+            verbatim_locality=req_data.get('verbatimLocality'),
+            sex=req_data.get('sex'),
+            time=time,
+            custom_fields=req_data.get('customFields', {}),
+        )
 
-        num_encounters = self.num_encounters()
-        AuditLog.user_create_object(
-            log, sighting, f'with {num_encounters} encounter(s)', duration=timer.elapsed()
+        if 'individualUuid' in req_data:
+            ind_guid = req_data['individualUuid']
+            individual = individuals.get(uuid.UUID(ind_guid))
+            if individual:
+                new_encounter.set_individual(individual)
+            else:
+                log.warning(
+                    f'Individual with guid {ind_guid} not found for auto assignment to created encounter'
+                )
+
+        audits.append(
+            (new_encounter, f'for owner {owner_guid}', AuditLog.AuditType.UserCreate)
         )
-        return sighting
+
+        for annot_uuid in req_data.get('annotations', []):
+            annot = annotations.get(uuid.UUID(str(annot_uuid)))
+            assert annot
+
+            audits.append(
+                (
+                    new_encounter,
+                    f' Added annotation {annot_uuid}',
+                    AuditLog.AuditType.Update,
+                )
+            )
+            annot.encounter = new_encounter
+
+        new_encounter.sighting = sighting
+        db.session.add(new_encounter)
+        return new_encounter
 
     def has_filename(self, filename):
         if not self.sighting_config:
@@ -1683,11 +1769,6 @@ class AssetGroup(GitStore):
 
         ensure_remote.delay(str(asset_group.guid))
 
-    def git_push_delay(self):
-        from app.extensions.git_store.tasks import git_push
-
-        git_push.delay(str(self.guid))
-
     def delete_remote_delay(self):
         from app.extensions.git_store.tasks import delete_remote
 
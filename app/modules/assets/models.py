@@ -3,6 +3,7 @@
 Assets database models
 --------------------
 """
+import contextlib
 import logging
 import os
 import pathlib
@@ -21,6 +22,69 @@ from app.utils import HoustonException
 
 log = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
+# renditions made straight from the original, abox is drawn over master on demand
+# as it changes with the annotations
+RENDITION_FORMATS = ('master', 'mid', 'thumb')
+
+
+@contextlib.contextmanager
+def rendition_lock(lock_path):
+    import fcntl
+
+    pathlib.Path(lock_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def save_rendition(image, target_path):
+    # written under a temporary name then renamed, so readers never see a partial file
+    target_path = pathlib.Path(target_path)
+    temp_path = target_path.with_name(f'.{target_path.name}.{os.getpid()}.tmp')
+    image.save(temp_path, format='JPEG')
+    os.replace(temp_path, target_path)
+
+
+def generate_renditions(source_path, targets):
+    """
+    Make every rendition in ``targets`` ({format: (target_path, size)}) from a
+    single decode of ``source_path``
+
+    Renditions are made largest first, each shrunk from the one before, and
+    JPEG decoding is drafted down to (about) the largest size needed.
+    """
+    ordered = sorted(targets.values(), key=lambda target: max(target[1]), reverse=True)
+    if not ordered:
+        return
+    with Image.open(source_path) as source_image:
+        largest = tuple(ordered[0][1])
+        source_image.draft('RGB', largest)
+        source_image.thumbnail(largest)
+        image = source_image.convert('RGB')
+    for target_path, size in ordered:
+        image.thumbnail(size)
+        save_rendition(image, target_path)
+
+
+# process pool worker for Asset.pregenerate_renditions()
+def generate_renditions_locked(source_path, lock_path, targets):
+    try:
+        with rendition_lock(lock_path):
+            # skip anything an on-demand request made while we were queued
+            targets = {
+                format: target
+                for format, target in targets.items()
+                if not target[0].exists()
+            }
+            generate_renditions(source_path, targets)
+    except Exception:
+        log.exception(f'Unable to generate renditions of {source_path}')
+        return False
+    return True
+
 
 class AssetTags(db.Model, HoustonModel):
     asset_guid = db.Column(db.GUID, db.ForeignKey('asset.guid'), primary_key=True)
@@ -180,9 +244,21 @@ class Asset(db.Model, HoustonModel, SageModel):
 
     @classmethod
     def get_elasticsearch_schema(cls):
-        from app.modules.assets.schemas import DetailedAssetTableSchema
+        from app.modules.assets.schemas import ElasticsearchAssetSchema
+
+        return ElasticsearchAssetSchema
+
+    @classmethod
+    def patch_elasticsearch_mappings(cls, mappings):
+        mappings = super(Asset, cls).patch_elasticsearch_mappings(mappings)
 
-        return DetailedAssetTableSchema
+        # the mission membership fields are only added at the top-level (due to
+        # _schema), an index built before they existed gets rebuilt
+        if '_schema' in mappings and is_module_enabled('missions'):
+            for key in ('mission_guid', 'mission_task_guids'):
+                mappings[key] = {'type': 'keyword'}
+
+        return mappings
 
     def __eq__(self, other):
         return self.guid == other.guid
@@ -285,6 +361,18 @@ class Asset(db.Model, HoustonModel, SageModel):
             for participation in self.mission_task_participations
         ]
 
+    @module_required('missions', resolve='quiet', default=None)
+    def get_mission_guid_str(self):
+        mission_guid = getattr(self.git_store, 'mission_guid', None)
+        return str(mission_guid) if mission_guid else None
+
+    @module_required('missions', resolve='quiet', default=[])
+    def get_mission_task_guid_strs(self):
+        return sorted(
+            str(participation.mission_task_guid)
+            for participation in self.mission_task_participations
+        )
+
     @module_required('sightings', resolve='quiet', default=[])
     def get_asset_sightings(self):
         return self.asset_sightings
@@ -297,7 +385,9 @@ class Asset(db.Model, HoustonModel, SageModel):
     def get_sage_sync_tags(cls):
         return 'asset', 'image'
 
-    def sync_with_sage(self, ensure=False, force=False, bulk_sage_uuids=None, **kwargs):
+    def prepare_sage_sync(
+        self, ensure=False, force=False, bulk_sage_uuids=None, **kwargs
+    ):
         from app.extensions.sage import from_sage_uuid
 
         if self.mime_type not in current_app.config.get(
@@ -347,30 +437,28 @@ class Asset(db.Model, HoustonModel, SageModel):
         assert self.content_guid is None
         symlink = self.get_symlink()
         image_filepath = symlink.resolve()
-        if os.path.exists(image_filepath):
-            try:
-                with open(image_filepath, 'rb') as image_file:
-                    files = {
-                        'image': image_file,
-                    }
-                    sage_response = current_app.sage.request_passthrough_result(
-                        'asset.upload', 'post', {'files': files}, target='sync'
-                    )
-                    sage_guid = from_sage_uuid(sage_response)
-
-                    with db.session.begin(subtransactions=True):
-                        self.content_guid = sage_guid
-                        db.session.merge(self)
-                    db.session.refresh(self)
-            except Exception:
-                message = f'Asset {self} is corrupted or an incompatible type, cannot send to Sage'
-                AuditLog.audit_log_object_error(log, self, message)
-                log.error(message)
-
-        else:
+        if not os.path.exists(image_filepath):
             message = f'Asset {self} is missing on disk, cannot send to Sage'
             AuditLog.audit_log_object_error(log, self, message)
             log.error(message)
+            return None
+
+        def upload():
+            with open(image_filepath, 'rb') as image_file:
+                files = {
+                    'image': image_file,
+                }
+                sage_response = current_app.sage.request_passthrough_result(
+                    'asset.upload', 'post', {'files': files}, target='sync'
+                )
+            return from_sage_uuid(sage_response)
+
+        return upload
+
+    def sage_sync_failed(self, exception):
+        message = f'Asset {self} is corrupted or an incompatible type, cannot send to Sage'
+        AuditLog.audit_log_object_error(log, self, message)
+        log.error(message)
 
     # this property is so that schema can output { "filename": "original_filename.jpg" }
     @property
@@ -517,28 +605,107 @@ class Asset(db.Model, HoustonModel, SageModel):
     def get_or_make_format_path(self, format):
         assert format in self.FORMATS
         target_path = self.get_derived_path(format)
-        if target_path.exists():
-            return target_path
-        log.info(
-            'get_or_make_format_path() attempting to create format %r as %r'
-            % (
-                format,
-                target_path,
+        if not target_path.exists():
+            self.make_renditions([format])
+        return target_path
+
+    # changes whenever the rendition's bytes would, so browsers can keep it forever
+    def get_rendition_etag(self, format):
+        import hashlib
+
+        revision = (self.meta or {}).get('rendition_revision', 0)
+        etag = f'{self.filesystem_guid}-{format}-{revision}'
+        if format not in RENDITION_FORMATS:
+            # abox is also drawn with the annotations
+            boxes = sorted(
+                f"{ann.guid}:{(ann.bounds or {}).get('rect')}" for ann in self.annotations
             )
+            etag += '-' + hashlib.sha1('|'.join(boxes).encode()).hexdigest()[:16]
+        return etag
+
+    def get_rendition_lock_path(self):
+        return self.get_derived_path('master').with_name(f'.{self.guid}.lock')
+
+    # the renditions (of RENDITION_FORMATS) that are not on disk yet
+    def get_missing_renditions(self):
+        targets = {}
+        for format in RENDITION_FORMATS:
+            target_path = self.get_derived_path(format)
+            if not target_path.exists():
+                targets[format] = (target_path, self.FORMATS[format])
+        return targets
+
+    def make_renditions(self, formats=RENDITION_FORMATS):
+        """
+        Make any missing renditions on demand, under a per-asset file lock so
+        concurrent requests (and the background pipeline) do not repeat the work
+        """
+        source_path = self.get_symlink()
+        if not source_path.exists():
+            raise HoustonException(
+                log,
+                'Asset does not have a valid path, needs to be within an AssetGroup',
+                obj=self,
+            )
+        with rendition_lock(self.get_rendition_lock_path()):
+            # while the original is decoded, make all of the plain renditions
+            targets = self.get_missing_renditions()
+            if targets:
+                log.info(f'make_renditions() creating {sorted(targets)} for {self}')
+                generate_renditions(source_path, targets)
+
+            abox_path = self.get_derived_path('abox')
+            if 'abox' in formats and not abox_path.exists():
+                with Image.open(self.get_derived_path('master')) as source_image:
+                    source_image.thumbnail(self.FORMATS['abox'])
+                    save_rendition(self.draw_annotations(source_image), abox_path)
+
+    @classmethod
+    def pregenerate_renditions(cls, assets, thread=False):
+        """
+        Make the missing renditions of ``assets`` in a process pool, one decode
+        per asset
+
+        Returns the number of assets processed successfully.
+        """
+        import multiprocessing
+
+        from app.extensions import parallel
+
+        args_list = []
+        for asset in assets:
+            if not asset.is_mime_type_major('image'):
+                continue
+            source_path = asset.get_symlink()
+            targets = asset.get_missing_renditions()
+            if not targets or not source_path.exists():
+                continue
+            args_list.append((source_path, asset.get_rendition_lock_path(), targets))
+
+        if not args_list:
+            return 0
+        results = parallel(
+            generate_renditions_locked,
+            args_list,
+            thread=thread,
+            workers=min(multiprocessing.cpu_count(), len(args_list)),
         )
+        return sum(results)
 
-        # we make all non-master images _from_ master format (where we assume more work will be done?
-        source_path = self.get_or_make_master_format_path()
-        if format == 'master':  # if so, we are done!
-            return source_path
+    @classmethod
+    def schedule_renditions(cls, assets, foreground=None):
+        from .tasks import asset_generate_renditions
 
-        with Image.open(source_path) as source_image:
-            source_image.thumbnail(self.FORMATS[format])
-            if format == 'abox':
-                source_image = self.draw_annotations(source_image)
-            source_image.save(target_path)
+        if foreground is None:
+            foreground = current_app.testing
 
-        return target_path
+        asset_guids = [str(asset.guid) for asset in assets]
+        if not asset_guids:
+            return
+        if foreground:
+            asset_generate_renditions(asset_guids, thread=True)
+        else:
+            asset_generate_renditions.delay(asset_guids)
 
     # currently only works with boxy annotations and theta=0
     def draw_annotations(self, image):
@@ -596,10 +763,14 @@ class Asset(db.Model, HoustonModel, SageModel):
 
     def reset_derived_images(self):
         # Reset metadata
+        revision = (self.meta or {}).get('rendition_revision', 0)
         self.set_derived_meta()
+        # new renditions need new ETags
+        self.meta = dict(self.meta or {}, rendition_revision=revision + 1)
         # Delete derived images (generated next time they're fetched)
-        for format in self.FORMATS:
-            self.get_derived_path(format).unlink(missing_ok=True)
+        with rendition_lock(self.get_rendition_lock_path()):
+            for format in self.FORMATS:
+                self.get_derived_path(format).unlink(missing_ok=True)
 
     def original_changed(self, image_object):
         # Creates a copy of the original image
@@ -628,25 +799,7 @@ class Asset(db.Model, HoustonModel, SageModel):
     # note: Image seems to *strip exif* sufficiently here (tested with gps, comments, etc) so this may be enough!
     # also note: this fails horribly in terms of exif orientation.  wom-womp
     def get_or_make_master_format_path(self):
-        source_path = self.get_symlink()
-        if not source_path.exists():
-            raise HoustonException(
-                log,
-                'Asset does not have a valid path, needs to be within an AssetGroup',
-                obj=self,
-            )
-        target_path = self.get_derived_path('master')
-        target_path.parent.mkdir(parents=True, exist_ok=True)
-        if target_path.exists():
-            return target_path
-        log.info(
-            'make_master_format() creating master format as {!r}'.format(target_path)
-        )
-        with Image.open(source_path) as source_image:
-            source_image.thumbnail(self.FORMATS['master'])
-            rgb = source_image.convert('RGB')
-            rgb.save(target_path)
-        return target_path
+        return self.get_or_make_format_path('master')
 
     def delete_relationships(self, delete_unreferenced_tags=True):
         for annotation in self.annotations:
@@ -663,8 +816,9 @@ class Asset(db.Model, HoustonModel, SageModel):
             tags.append(ref.tag)
 
         if delete_unreferenced_tags:
-            for tag in tags:
-                tag.delete_if_unreferenced()
+            from app.modules.keywords.models import Keyword
+
+            Keyword.delete_unreferenced(tags)
         else:
             return tags
 
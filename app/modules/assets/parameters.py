@@ -23,6 +23,18 @@ class PatchAssetParameters(PatchJSONParameters):
 
     PATH_CHOICES = tuple('/%s' % field for field in ('tags', 'image'))
 
+    @classmethod
+    def perform_patch(cls, operations, obj=None, obj_cls=None, state=None):
+        from app.modules.keywords.models import Keyword
+
+        if state is None:
+            state = {}
+        # Look up (or create) every tag value in the patch at once
+        state['keyword_values'] = Keyword.ensure_patch_keywords(operations, 'tags')
+        return super(PatchAssetParameters, cls).perform_patch(
+            operations, obj=obj, obj_cls=obj_cls, state=state
+        )
+
     @classmethod
     def _check_tag_value(cls, obj, field, value, state, create=True):
         from app.modules.keywords.models import Keyword as Tag
@@ -43,7 +55,11 @@ class PatchAssetParameters(PatchJSONParameters):
 
         # Otherwise, try to ensure the tag as normal
         if tag is None:
-            tag = Tag.ensure_keyword(value, create=create)
+            resolved = state.get('keyword_values', {})
+            if isinstance(value, str) and value in resolved:
+                tag = resolved[value]
+            else:
+                tag = Tag.ensure_keyword(value, create=create)
 
         return tag
 
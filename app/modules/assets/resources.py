@@ -169,15 +169,29 @@ class AssetSrcUByID(Resource):
         },
     )
     def get(self, asset, format):
-        cls = type(asset.git_store)
-        cls.ensure_store(asset.git_store_guid)
+        from app.utils import not_modified_response, send_cached_file
 
-        try:
-            asset_format_path = asset.get_or_make_format_path(format)
-        except Exception:
-            logging.exception('Got exception from get_or_make_format_path()')
+        if format not in asset.FORMATS:
             raise werkzeug.exceptions.NotImplemented
-        return send_file(asset_format_path, asset.DERIVED_MIME_TYPE)
+
+        # the URL stays the same when the rendition is remade (e.g. after a rotation),
+        # so browsers revalidate every time and get a 304 while the ETag still matches
+        etag = asset.get_rendition_etag(format)
+        response = not_modified_response(etag)
+        if response is not None:
+            return response
+
+        asset_format_path = asset.get_derived_path(format)
+        if not asset_format_path.exists():
+            # only need the store (and the original) to make a missing rendition
+            cls = type(asset.git_store)
+            cls.ensure_store(asset.git_store_guid)
+            try:
+                asset_format_path = asset.get_or_make_format_path(format)
+            except Exception:
+                logging.exception('Got exception from get_or_make_format_path()')
+                raise werkzeug.exceptions.NotImplemented
+        return send_cached_file(asset_format_path, asset.DERIVED_MIME_TYPE, etag)
 
 
 @api.route('/src_raw/<uuid:asset_guid>', doc=False)
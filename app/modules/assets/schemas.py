@@ -73,6 +73,24 @@ class DetailedAssetTableSchema(BaseAssetSchema):
         )
 
 
+class ElasticsearchAssetSchema(DetailedAssetTableSchema):
+    """
+    Asset schema for Elasticsearch, adds the mission membership that searches
+    filter on
+    """
+
+    if is_module_enabled('missions'):
+        mission_guid = base_fields.Function(lambda asset: asset.get_mission_guid_str())
+        mission_task_guids = base_fields.Function(
+            lambda asset: asset.get_mission_task_guid_strs()
+        )
+
+    class Meta(DetailedAssetTableSchema.Meta):
+        fields = DetailedAssetTableSchema.Meta.fields + (Asset.git_store_guid.key,)
+        if is_module_enabled('missions'):
+            fields = fields + ('mission_guid', 'mission_task_guids')
+
+
 class DetailedAssetSchema(BaseAssetSchema):
     """
     Detailed Asset schema exposes all useful fields.
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from app.extensions.celery import celery
+
+log = logging.getLogger(__name__)
+
+
+@celery.task
+def asset_generate_renditions(asset_guids, thread=False):
+    from .models import Asset
+
+    assets = Asset.query.filter(Asset.guid.in_(asset_guids)).all()
+    generated = Asset.pregenerate_renditions(assets, thread=thread)
+    log.info(f'Generated renditions for {generated} of {len(assets)} assets')
+    return generated
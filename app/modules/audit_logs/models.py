@@ -8,6 +8,8 @@ import logging
 import uuid
 
 from flask_login import current_user  # NOQA
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 
 from app.extensions import HoustonModel, db
 
@@ -108,5 +110,88 @@ class AuditLog(db.Model, HoustonModel):
                 duration=duration,
             )
 
+        from app.extensions.logging import Logging
+
+        # Within a request or Celery task the entry is written at the end of it
+        if Logging.buffer_entry(log_entry):
+            return
+
         with db.session.begin(subtransactions=True):
             db.session.add(log_entry)
+
+    @classmethod
+    def bulk_create(cls, log_entries):
+        """
+        Write (transient) AuditLog entries with a single multi-row insert and
+        index them in Elasticsearch as one bulk operation
+        """
+        if not log_entries:
+            return
+        columns = list(cls.__table__.columns)
+        rows = []
+        for log_entry in log_entries:
+            row = {}
+            for column in columns:
+                value = getattr(log_entry, column.name)
+                if value is None and column.default is not None:
+                    # Transient entries have not had their (guid, timestamp) defaults
+                    # applied yet, an explicit None would be inserted as NULL
+                    default = column.default
+                    value = default.arg(None) if default.is_callable else default.arg
+                    setattr(log_entry, column.name, value)
+                row[column.name] = value
+            rows.append(row)
+        session = db.session()
+        in_transaction = session.transaction is not None
+        with db.session.begin(subtransactions=True):
+            db.session.execute(cls.__table__.insert().values(rows))
+
+        if in_transaction:
+            # Inside a caller's transaction the rows may still be rolled back, they
+            # are indexed once it commits (see _audit_logs_committed below)
+            session.info.setdefault('audit_log_unindexed', []).extend(log_entries)
+        else:
+            cls._index_entries(log_entries)
+
+    @classmethod
+    def _index_entries(cls, log_entries):
+        from app.extensions import elasticsearch_context
+
+        with elasticsearch_context():
+            for log_entry in log_entries:
+                log_entry.index(force=True)
+
+    @classmethod
+    def prune(cls, retention_days):
+        """
+        Delete the entries that are older than the retention window, returns the
+        number removed
+        """
+        import datetime
+
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=retention_days)
+        with db.session.begin(subtransactions=True):
+            result = db.session.execute(
+                cls.__table__.delete().where(cls.created < cutoff)
+            )
+        return result.rowcount
+
+
+@event.listens_for(Session, 'after_commit')
+def _audit_logs_committed(session):
+    session.info.pop('audit_log_uncommitted', None)
+    entries = session.info.pop('audit_log_unindexed', None)
+    if entries:
+        AuditLog._index_entries(entries)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _audit_logs_rolled_back(session, previous_transaction):
+    from app.extensions.logging import Logging
+
+    session.info.pop('audit_log_unindexed', None)
+    # Entries buffered for work that has now been rolled back are dropped, as they
+    # would have been had they been written straight away
+    uncommitted = session.info.pop('audit_log_uncommitted', None)
+    if uncommitted:
+        Logging.discard_buffered(uncommitted)
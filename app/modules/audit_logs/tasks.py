@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from app.extensions.celery import celery
+
+AUDIT_LOG_PRUNE_FREQUENCY = 60 * 60 * 24
+
+
+log = logging.getLogger(__name__)
+
+
+@celery.on_after_configure.connect
+def audit_log_setup_periodic_tasks(sender, **kwargs):
+    if AUDIT_LOG_PRUNE_FREQUENCY is not None:
+        sender.add_periodic_task(
+            AUDIT_LOG_PRUNE_FREQUENCY,
+            audit_log_prune.s(),
+            name='Prune Audit Logs',
+        )
+
+
+@celery.task
+def audit_log_prune():
+    from flask import current_app
+
+    from .models import AuditLog
+
+    retention_days = current_app.config.get('AUDIT_LOG_RETENTION_DAYS')
+    if not retention_days:
+        return 0
+
+    removed = AuditLog.prune(int(retention_days))
+    log.info(f'Pruned {removed} audit log entries older than {retention_days} days')
+    return removed
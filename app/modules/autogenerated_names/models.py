@@ -4,6 +4,7 @@ Autogeneratednames database models
 --------------------
 """
 
+import collections
 import enum
 import logging
 import uuid
@@ -16,6 +17,35 @@ log = logging.getLogger(__name__)  # pylint: disable=invalid-name
 AUTOGEN_NAME_PREFIX_MIN_LENGTH = 3
 AUTOGEN_NAME_PREFIX_MAX_LENGTH = 5
 AUTOGEN_NAME_CONTEXT_PREFIX = 'autogen-'
+# Name rows inserted per statement when populating individuals
+AUTOGEN_NAME_BULK_SIZE = 1000
+
+# what the per-individual path needs to know about an enabled AutogeneratedName
+AutogeneratedNameEntry = collections.namedtuple(
+    'AutogeneratedNameEntry', ['guid', 'type', 'reference_guid']
+)
+
+# per-process cache of AutogeneratedName data, (site settings version, {key: value})
+_cache = None
+
+
+def _cached(key, load):
+    """
+    Value of ``load()``, cached until the site settings (which the
+    AutogeneratedNames are written along with) change
+    """
+    from app.modules.site_settings.models import site_settings_cache_version
+
+    global _cache
+
+    version = site_settings_cache_version()
+    if version is None:
+        return load()
+    if _cache is None or _cache[0] != version:
+        _cache = (version, {})
+    if key not in _cache[1]:
+        _cache[1][key] = load()
+    return _cache[1][key]
 
 
 class AutogeneratedNameType(str, enum.Enum):
@@ -81,23 +111,177 @@ class AutogeneratedName(db.Model, HoustonModel):
         else:
             raise ValueError(f'unsupported reference type {self.type}')
 
-    def get_next(self):
+    @classmethod
+    def format_value(cls, value):
+        return str(value).zfill(3)
+
+    def reserve_values(self, count):
+        """
+        Reserve a block of ``count`` counter values, returns the first of them
+
+        The counter row is locked while it is read and advanced, so concurrent
+        writers are given separate blocks.
+        """
         with db.session.begin(subtransactions=True):
-            # keep read/modify/write all within the single db.session to make it atomic WRT the DB
-            next_val = str(self.next_value).zfill(3)
-            self.next_value += 1
-            db.session.merge(self)
-        return str(next_val)
+            first = (
+                db.session.query(AutogeneratedName.next_value)
+                .filter(AutogeneratedName.guid == self.guid)
+                .with_for_update()
+                .scalar()
+            ) or 1
+            db.session.query(AutogeneratedName).filter(
+                AutogeneratedName.guid == self.guid
+            ).update({'next_value': first + count}, synchronize_session=False)
+        db.session.expire(self, ['next_value'])
+        return first
+
+    def get_next(self):
+        return self.format_value(self.reserve_values(1))
+
+    @classmethod
+    def get_enabled_entries(cls, type=None):
+        """
+        The enabled AutogeneratedNames (optionally of one type) as
+        AutogeneratedNameEntry tuples
+        """
+
+        def load():
+            return [
+                AutogeneratedNameEntry(*row)
+                for row in db.session.query(cls.guid, cls.type, cls.reference_guid)
+                .filter(cls.enabled.is_(True))
+                .order_by(cls.guid)
+            ]
+
+        entries = _cached('enabled', load)
+        return [entry for entry in entries if type in (None, entry.type)]
+
+    @classmethod
+    def get_prefixes(cls):
+        """
+        Dict of (string) AutogeneratedName guid to prefix, for resolving names
+        """
+
+        def load():
+            return {
+                str(guid): prefix
+                for guid, prefix in db.session.query(cls.guid, cls.prefix)
+            }
+
+        return _cached('prefixes', load)
+
+    @classmethod
+    def invalidate_cache(cls):
+        global _cache
+
+        _cache = None
 
     # use on newly-created or newly-enabled agn
     def populate_all_individuals(self, user):
+        """
+        Give a name from this AutogeneratedName to every individual of its taxonomy
+        that does not have one yet, returns the number of names added
+
+        The counter values are reserved as one block and the names are written with
+        multi-row inserts.
+        """
+        import datetime
+
         from app.modules.individuals.models import Individual
+        from app.modules.names.models import Name
 
-        indivs = Individual.query.all()
-        for indiv in indivs:
-            if not indiv.has_name_context(self.context):
-                log.debug(f'populating {self} on {indiv} with user {user}')
-                indiv.update_autogen_name(user, self)
+        if not self.enabled:
+            return 0
+        if self.type != AutogeneratedNameType.auto_species.value:
+            # future development
+            log.warning(f'skipping unsupported AutogeneratedName type={self.type}')
+            return 0
+
+        individual_guids = db.select([Individual.guid]).where(
+            Individual.taxonomy_guid == self.reference_guid
+        )
+
+        # names from the species AutogeneratedNames of other taxonomies are invalid on
+        # these individuals, while any name from one for this taxonomy (such as an
+        # older, since disabled, one) is kept and counts as already named
+        own_contexts = {self.context}
+        other_contexts = []
+        for guid, reference_guid in db.session.query(
+            AutogeneratedName.guid, AutogeneratedName.reference_guid
+        ).filter(AutogeneratedName.type == AutogeneratedNameType.auto_species.value):
+            context = f'{AUTOGEN_NAME_CONTEXT_PREFIX}{guid}'
+            if reference_guid == self.reference_guid:
+                own_contexts.add(context)
+            else:
+                other_contexts.append(context)
+        if other_contexts:
+            invalid_names = Name.query.filter(
+                Name.context.in_(other_contexts),
+                Name.individual_guid.in_(individual_guids),
+            ).all()
+            for name in invalid_names:
+                log.debug(f'removing {name} from {name.individual_guid} due to {self}')
+                name.delete()
+
+        missing = [
+            guid
+            for (guid,) in db.session.query(Individual.guid)
+            .filter(
+                Individual.taxonomy_guid == self.reference_guid,
+                ~db.exists().where(
+                    db.and_(
+                        Name.individual_guid == Individual.guid,
+                        Name.context.in_(sorted(own_contexts)),
+                    )
+                ),
+            )
+            .order_by(Individual.created, Individual.guid)
+        ]
+        if not missing:
+            return 0
+
+        log.debug(f'populating {self} on {len(missing)} individuals with user {user}')
+        creator_guid = user.guid if hasattr(user, 'guid') else user
+        now = datetime.datetime.utcnow()
+        with db.session.begin(subtransactions=True):
+            first = self.reserve_values(len(missing))
+            rows = [
+                {
+                    'guid': uuid.uuid4(),
+                    'value': self.format_value(first + offset),
+                    'context': self.context,
+                    'individual_guid': individual_guid,
+                    'creator_guid': creator_guid,
+                    'created': now,
+                    'updated': now,
+                    'indexed': now,
+                    'viewed': now,
+                }
+                for offset, individual_guid in enumerate(missing)
+            ]
+            for start in range(0, len(rows), AUTOGEN_NAME_BULK_SIZE):
+                end = start + AUTOGEN_NAME_BULK_SIZE
+                db.session.execute(Name.__table__.insert().values(rows[start:end]))
+                # The individuals' indexed names are now out of date
+                db.session.execute(
+                    Individual.__table__.update()
+                    .where(Individual.guid.in_(missing[start:end]))
+                    .values(updated=now)
+                )
+
+        # Any individuals already loaded in this session hold their old names
+        for individual_guid in missing:
+            key = db.session.identity_key(Individual, individual_guid)
+            individual = db.session.identity_map.get(key)
+            if individual is not None:
+                db.session.expire(individual, ['names'])
+
+        import app.extensions.logging as AuditLog  # NOQA
+
+        AuditLog.audit_log_object(
+            log, self, f'populated names on {len(missing)} individuals'
+        )
+        return len(missing)
 
     # takes a Name and returns human-facing value
     @classmethod
@@ -105,11 +289,11 @@ class AutogeneratedName(db.Model, HoustonModel):
         agn_guid = name.autogenerated_guid
         if not agn_guid:
             return name.value  # lets be kind
-        agn = AutogeneratedName.query.get(agn_guid)
-        if not agn:
+        prefix = cls.get_prefixes().get(agn_guid)
+        if prefix is None:
             log.warning(f'no matching AutogeneratedName for {name}')
             return None
-        return f'{agn.prefix}-{name.value}'
+        return f'{prefix}-{name.value}'
 
     # skip_taxonomy_check is specifically for site.species setting which needs to also set this (but taxonomies wont exist yet)
     @classmethod
@@ -290,6 +474,8 @@ class AutogeneratedName(db.Model, HoustonModel):
 
                 AuditLog.user_create_object(log, autogenerated_name)
 
+        cls.invalidate_cache()
+
     @classmethod
     def get_rest_response(cls):
         ret_val = {}
@@ -96,7 +96,11 @@ class Encounter(db.Model, HoustonModel, CustomFieldMixin, ExportMixin):
     verbatim_locality = db.Column(db.String(), nullable=True)
     sex = db.Column(db.String(length=40), nullable=True)
 
-    custom_fields = db.Column(db.JSON, default=lambda: {}, nullable=True)
+    custom_fields = db.Column(db.JSONB, default=lambda: {}, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_encounter_custom_fields', custom_fields, postgresql_using='gin'),
+    )
 
     # Matches guid in site.species
     taxonomy_guid = db.Column(db.GUID, index=True, nullable=True)
@@ -121,6 +125,22 @@ class Encounter(db.Model, HoustonModel, CustomFieldMixin, ExportMixin):
         data['taxonomy'] = tx.scientificName if tx else None
         return data
 
+    @classmethod
+    def export_load_options(cls):
+        from sqlalchemy.orm import selectinload
+
+        return [
+            selectinload(Encounter.time),
+            selectinload(Encounter.sighting),
+            selectinload(Encounter.individual),
+        ]
+
+    def export_related(self):
+        related = [self.sighting]
+        if self.individual:
+            related.append(self.individual)
+        return related
+
     @classmethod
     def get_elasticsearch_schema(cls):
         from app.modules.encounters.schemas import ElasticsearchEncounterSchema
@@ -249,35 +249,12 @@ class EncounterExport(Resource):
     )
     def post(self):
         search = request.get_json()
-        encs = Encounter.elasticsearch(search, limit=15000)
-        if not encs:
-            abort(400, 'No results to export')
         from flask import send_file
 
-        from app.extensions.export.models import Export
+        from app.extensions.export.models import EXPORT_SYNCHRONOUS_LIMIT, Export
 
-        ct = 0
-        added = set()
         export = Export()
-        for enc in encs:
-            if not enc.current_user_has_export_permission():
-                continue
-            export.add(enc)
-            ct += 1
-            if (
-                enc.sighting_guid not in added
-                and enc.sighting.current_user_has_export_permission()
-            ):
-                added.add(enc.sighting_guid)
-                export.add(enc.sighting)
-            if (
-                enc.individual_guid
-                and enc.individual_guid not in added
-                and enc.individual.current_user_has_export_permission()
-            ):
-                added.add(enc.individual_guid)
-                export.add(enc.individual)
-        if not ct:
+        if not export.add_search(Encounter, search, limit=EXPORT_SYNCHRONOUS_LIMIT):
             abort(400, 'No results to export')
         export.save()
         return send_file(
@@ -286,3 +263,23 @@ class EncounterExport(Resource):
             as_attachment=True,
             attachment_filename=export.filename,
         )
+
+
+@api.route('/export/background')
+@api.login_required(oauth_scopes=['encounters:read'])
+class EncounterExportBackground(Resource):
+    @api.permission_required(
+        permissions.ModuleAccessPermission,
+        kwargs_on_request=lambda kwargs: {
+            'module': Encounter,
+            'action': AccessOperation.READ,
+        },
+    )
+    def post(self):
+        """
+        Start a background export, the workbook is then fetched from /export/<progress_guid>
+        """
+        from app.extensions.export.models import Export
+
+        progress = Export.start_background(Encounter, request.get_json(), current_user)
+        return {'progress_guid': str(progress.guid)}
@@ -4,6 +4,7 @@ import copy
 import json
 import logging
 import pathlib
+import threading
 
 log = logging.getLogger(__name__)
 
@@ -40,22 +41,76 @@ def recurse_update(dict1, dict2):
 
 
 class IaConfig:
-    def __init__(self):
-        # self.name = name
-        # self.fname = f'IA.{name}.json'
-        # config_path = path.jpytest -s tests/modules/test_ia_config.py::test_get_seal_detectors --no-elasticsearchoin('ia-configs', self.fname)
-        # assert path.isfile(config_path), f'Could not find config at path {config_path}'
-        # with open(config_path, 'r') as file:
-        #     self.config_dict = json.load(file)
+    """
+    Merged contents of every ia-configs/IA.*.json
+
+    There is one shared instance per process: IaConfig() only re-reads the files
+    when one of them has been added, removed or modified.  Lookups are memoized
+    (with @-links resolved) and the per-species detector and identifier lists
+    are computed at load, so values returned are shared and must be copied by
+    anyone wanting to modify them.
+    """
+
+    CONFIG_GLOB = 'IA.*.json'
+    CONFIG_PATH = 'ia-configs'
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        signature = cls._files_signature()
+        with cls._lock:
+            instance = cls._instance
+            if instance is None or instance._signature != signature:
+                instance = super().__new__(cls)
+                instance._load(signature)
+                cls._instance = instance
+        return instance
+
+    @classmethod
+    def _files_signature(cls):
+        signature = []
+        for conf_fpath in sorted(pathlib.Path(cls.CONFIG_PATH).glob(cls.CONFIG_GLOB)):
+            try:
+                stat = conf_fpath.stat()
+            except FileNotFoundError:
+                continue
+            signature.append((str(conf_fpath), stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _load(self, signature):
+        self._signature = signature
         self.config_dict = {}
-        for conf_fpath in pathlib.Path('ia-configs').glob('IA.*.json'):
+        for conf_fpath, _, _ in signature:
             with open(conf_fpath, 'r') as file:
                 _conf_dict = json.load(file)
                 self.config_dict = recurse_update(self.config_dict, _conf_dict)
+        log.info(f'Loaded IA config from {len(signature)} files')
+
+        self._values = {}
+        self._species = self._compile_species()
+        self._detectors = {}  # genus_species: (list, dict)
+        self._identifiers = {}  # (genus_species, ia_class): (list, dict)
+        for genus_species in self._species:
+            try:
+                self._detectors[genus_species] = self._compile_detectors(genus_species)
+                for ia_class in self.get_supported_ia_classes(genus_species):
+                    self._identifiers[
+                        (genus_species, ia_class)
+                    ] = self._compile_identifiers(genus_species, ia_class)
+            except (KeyError, TypeError):
+                # incomplete species, left to fail on lookup as before
+                log.warning(f'IA config for {genus_species} is incomplete')
 
     def get(self, period_separated_keys):
+        try:
+            return self._values[period_separated_keys]
+        except KeyError:
+            pass
         keys = period_separated_keys.split('.')
-        return self.get_recursive(keys, self.config_dict)
+        value = self.get_recursive(keys, self.config_dict)
+        self._values[period_separated_keys] = value
+        return value
 
     def get_recursive(self, keys, config_dict_level):
         current_key = keys[0]
@@ -85,15 +140,22 @@ class IaConfig:
         detectors = self.get(detectors_key)
         return detectors
 
-    def get_detectors_list(self, genus_species):
+    def _compile_detectors(self, genus_species):
         detectors = self.get_detectors_with_links(genus_species)
-        detectors_list = self._resolve_links_in_value_list(detectors)
-        return detectors_list
+        return (
+            self._resolve_links_in_value_list(detectors),
+            self._resolve_links_to_dict(detectors),
+        )
+
+    def get_detectors_list(self, genus_species):
+        if genus_species in self._detectors:
+            return list(self._detectors[genus_species][0])
+        return self._compile_detectors(genus_species)[0]
 
     def get_detectors_dict(self, genus_species):
-        detectors = self.get_detectors_with_links(genus_species)
-        detectors_dict = self._resolve_links_to_dict(detectors)
-        return detectors_dict
+        if genus_species in self._detectors:
+            return dict(self._detectors[genus_species][1])
+        return self._compile_detectors(genus_species)[1]
 
     def get_identifiers_with_links(self, genus_species, ia_class):
         species_key = _get_species_key(genus_species)
@@ -101,12 +163,7 @@ class IaConfig:
         identifiers = self.get(identifiers_key)
         return identifiers
 
-    def get_identifiers_list(self, genus_species, ia_class):
-        identifiers = self.get_identifiers_with_links(genus_species, ia_class)
-        identifiers_list = self._resolve_links_in_value_list(identifiers)
-        return identifiers_list
-
-    def get_identifiers_dict(self, genus_species, ia_class):
+    def _compile_identifiers(self, genus_species, ia_class):
         identifiers = self.get_identifiers_with_links(genus_species, ia_class)
         identifiers_dict = self._resolve_links_to_dict(identifiers)
         # trim the '_identifiers.' prefix off the keys
@@ -116,7 +173,17 @@ class IaConfig:
             if key.startswith('_identifiers.'):
                 algo = key[13:]
             trimmed[algo] = identifiers_dict[key]
-        return trimmed
+        return self._resolve_links_in_value_list(identifiers), trimmed
+
+    def get_identifiers_list(self, genus_species, ia_class):
+        if (genus_species, ia_class) in self._identifiers:
+            return list(self._identifiers[(genus_species, ia_class)][0])
+        return self._compile_identifiers(genus_species, ia_class)[0]
+
+    def get_identifiers_dict(self, genus_species, ia_class):
+        if (genus_species, ia_class) in self._identifiers:
+            return dict(self._identifiers[(genus_species, ia_class)][1])
+        return self._compile_identifiers(genus_species, ia_class)[1]
 
     def _resolve_links_in_value_list(self, value_list):
         resolved_list = [
@@ -134,6 +201,9 @@ class IaConfig:
         return resolved_dicts
 
     def get_configured_species(self):
+        return list(self._species)
+
+    def _compile_species(self):
         genuses = [key for key in self.config_dict.keys() if not key.startswith('_')]
         species = []
         for genus in genuses:
@@ -161,9 +231,8 @@ class IaConfig:
             ia_classes = self.get_supported_ia_classes(genus_species)
         ia_algos = dict()
         for ia_class in ia_classes:
-            algo_dict = copy.deepcopy(self.get_identifiers_dict(genus_species, ia_class))
             # so one can modify the returned dicts without modifying this class's config dict
-            algo_dict = copy.deepcopy(algo_dict)
+            algo_dict = copy.deepcopy(self.get_identifiers_dict(genus_species, ia_class))
             ia_algos.update(algo_dict)
         return ia_algos
 
@@ -17,6 +17,9 @@ from app.utils import HoustonException
 
 log = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
+# name values looked up per query by Individual.get_by_names()
+INDIVIDUAL_NAME_LOOKUP_SIZE = 1000
+
 
 class IndividualMergeRequestVote(db.Model):
     """
@@ -132,7 +135,11 @@ class Individual(db.Model, HoustonModel, CustomFieldMixin, ExportMixin):
     # FIXME there will be a follow-up task to cdx-7 which makes this nullable=False ... later
     taxonomy_guid = db.Column(db.GUID, index=True, nullable=True)
 
-    custom_fields = db.Column(db.JSON, default=lambda: {}, nullable=True)
+    custom_fields = db.Column(db.JSONB, default=lambda: {}, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_individual_custom_fields', custom_fields, postgresql_using='gin'),
+    )
 
     # social_groups = db.relationship(
     #     'SocialGroupIndividualMembership',
@@ -169,6 +176,15 @@ class Individual(db.Model, HoustonModel, CustomFieldMixin, ExportMixin):
             data[f'name.{name.context}'] = name.value_resolved
         return data
 
+    @classmethod
+    def export_load_options(cls):
+        from sqlalchemy.orm import selectinload
+
+        return [
+            selectinload(Individual.names),
+            selectinload(Individual.encounters),
+        ]
+
     @classmethod
     def get_elasticsearch_schema(cls):
         from app.modules.individuals.schemas import ElasticsearchIndividualSchema
@@ -333,19 +349,37 @@ class Individual(db.Model, HoustonModel, CustomFieldMixin, ExportMixin):
 
     @classmethod
     def get_by_name(cls, name_value, context=DEFAULT_NAME_CONTEXT):
-        matching_names = Name.query.filter(
-            Name.value == name_value, Name.context == context
-        )
-        individuals = [name.individual for name in list(matching_names)]
-        if len(individuals) > 1:
-            raise HoustonException(
-                log,
-                f'Multiple individuals have name {name_value} in context {context}. Offending individuals: {[ind.guid for ind in individuals]}]',
+        return cls.get_by_names([name_value], context).get(name_value)
+
+    @classmethod
+    def get_by_names(cls, name_values, context=DEFAULT_NAME_CONTEXT):
+        """
+        Look up the individuals for many name values (in one context) at once,
+        returns a dict of name value to Individual for the values that were found
+        """
+        name_values = list(set(name_values))
+        individuals = {}
+        for start in range(0, len(name_values), INDIVIDUAL_NAME_LOOKUP_SIZE):
+            matching_names = (
+                Name.query.filter(
+                    Name.context == context,
+                    Name.value.in_(
+                        name_values[start : start + INDIVIDUAL_NAME_LOOKUP_SIZE]
+                    ),
+                )
+                .options(db.joinedload(Name.individual))
+                .all()
             )
-        individual = None
-        if len(individuals) > 0:
-            individual = individuals[0]
-        return individual
+            for name in matching_names:
+                individuals.setdefault(name.value, []).append(name.individual)
+
+        for name_value, matches in individuals.items():
+            if len(matches) > 1:
+                raise HoustonException(
+                    log,
+                    f'Multiple individuals have name {name_value} in context {context}. Offending individuals: {[ind.guid for ind in matches]}]',
+                )
+        return {name_value: matches[0] for name_value, matches in individuals.items()}
 
     def get_adoption_name(self):
         adoption_name = None
@@ -496,16 +530,30 @@ class Individual(db.Model, HoustonModel, CustomFieldMixin, ExportMixin):
 
     # can update on only one type if desired
     def update_autogen_names(self, user, agn_type=None):
-        from app.modules.autogenerated_names.models import AutogeneratedName
+        from app.modules.autogenerated_names.models import (
+            AutogeneratedName,
+            AutogeneratedNameType,
+        )
 
-        if agn_type:
-            autogen_names = AutogeneratedName.query.filter_by(type=agn_type).all()
-        else:
-            autogen_names = AutogeneratedName.query.all()
-        if not autogen_names or not len(autogen_names):
+        # the enabled AutogeneratedNames are cached, only the one that applies to
+        # this individual's taxonomy needs loading
+        species_entries = []
+        for entry in AutogeneratedName.get_enabled_entries(agn_type):
+            if entry.type == AutogeneratedNameType.auto_species.value:
+                species_entries.append(entry)
+            else:
+                # future development
+                log.warning(f'skipping unsupported AutogeneratedName type={entry.type}')
+        if not species_entries:
             return
-        for agn in autogen_names:
-            self.update_autogen_name(user, agn)
+        tx_guid = self.get_taxonomy_guid()
+        matching = [
+            entry
+            for entry in species_entries
+            if tx_guid and str(entry.reference_guid) == str(tx_guid)
+        ]
+        agn = AutogeneratedName.query.get(matching[0].guid) if matching else None
+        self.set_autogenerated_name_species(agn, user)
 
     def update_autogen_name(self, user, agn):
         from app.modules.autogenerated_names.models import AutogeneratedNameType
@@ -521,7 +569,8 @@ class Individual(db.Model, HoustonModel, CustomFieldMixin, ExportMixin):
     def set_autogenerated_name_species(self, agn, user):
         from app.modules.autogenerated_names.models import AutogeneratedNameType
 
-        if not agn or agn.type != AutogeneratedNameType.auto_species.value:
+        # without an agn only the invalid-species names are removed
+        if agn and agn.type != AutogeneratedNameType.auto_species.value:
             return
         tx_guid = self.get_taxonomy_guid()
         tx_guid = str(tx_guid) if tx_guid else None
@@ -541,7 +590,7 @@ class Individual(db.Model, HoustonModel, CustomFieldMixin, ExportMixin):
             log.debug(f'removing {name} from {self} due to {agn}')
             self.remove_name(name)
         # if we already have the name we need, or cannot use this agn, we bail
-        if found or not tx_guid or str(tx_guid) != str(agn.reference_guid):
+        if found or not tx_guid or not agn or str(tx_guid) != str(agn.reference_guid):
             log.debug(f'bailing due to found={found}, tx_guid={tx_guid}, agn={agn}')
             return
         new_name = agn.get_next()
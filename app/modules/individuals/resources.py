@@ -272,21 +272,12 @@ class IndividualExport(Resource):
     )
     def post(self):
         search = request.get_json()
-        indivs = Individual.elasticsearch(search, limit=15000)
-        if not indivs:
-            abort(400, 'No results to export')
         from flask import send_file
 
-        from app.extensions.export.models import Export
+        from app.extensions.export.models import EXPORT_SYNCHRONOUS_LIMIT, Export
 
-        ct = 0
         export = Export()
-        for indiv in indivs:
-            if not indiv.current_user_has_export_permission():
-                continue
-            export.add(indiv)
-            ct += 1
-        if not ct:
+        if not export.add_search(Individual, search, limit=EXPORT_SYNCHRONOUS_LIMIT):
             abort(400, 'No results to export')
         export.save()
         return send_file(
@@ -297,6 +288,26 @@ class IndividualExport(Resource):
         )
 
 
+@api.route('/export/background')
+@api.login_required(oauth_scopes=['individuals:read'])
+class IndividualExportBackground(Resource):
+    @api.permission_required(
+        permissions.ModuleAccessPermission,
+        kwargs_on_request=lambda kwargs: {
+            'module': Individual,
+            'action': AccessOperation.READ,
+        },
+    )
+    def post(self):
+        """
+        Start a background export, the workbook is then fetched from /export/<progress_guid>
+        """
+        from app.extensions.export.models import Export
+
+        progress = Export.start_background(Individual, request.get_json(), current_user)
+        return {'progress_guid': str(progress.guid)}
+
+
 @api.route('/remove_all_empty')
 @api.login_required(oauth_scopes=['individuals:write'])
 class IndividualRemoveEmpty(Resource):
@@ -11,6 +11,9 @@ from app.extensions import HoustonModel, db
 
 log = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
+# keyword values looked up or inserted per statement
+KEYWORD_BULK_SIZE = 1000
+
 
 class KeywordSource(str, enum.Enum):
     user = 'user'
@@ -59,32 +62,113 @@ class Keyword(db.Model, HoustonModel):
             value['create'] = True
             return cls.ensure_keyword(**value)
 
+        assert value is not None, 'The value for a Keyword cannot be missing'
+        return cls.ensure_keywords([value], source=source, create=create).get(value)
+
+    @classmethod
+    def ensure_keywords(cls, values, source=None, create=True):
+        """
+        Resolve many keyword values at once, creating the missing ones with a single
+        insert that skips values another writer created concurrently
+
+        Returns a dict of value to Keyword (values that are neither found nor
+        created are left out).  As with ensure_keyword(), a value may also be the
+        GUID of an existing Keyword.
+        """
+        import datetime
+
         # If a source is not provided, use the default
         if source is None:
             source = KeywordSource.user
 
-        assert value is not None, 'The value for a Keyword cannot be missing'
-        assert source is not None, 'The source for a Keyword must be specified'
-        keyword = cls.query.filter_by(value=value, source=source).first()
-
-        # If the keyword is not found, let's double check that the user didn't specify the GUID as the value
-        if keyword is None:
-            try:
-                keyword = cls.query.get(value)
-            except Exception:
-                pass
-
-        # If we still haven't found it, make it and return keyword
-        if keyword is None and create:
+        values = list(dict.fromkeys(values))
+        assert None not in values, 'The value for a Keyword cannot be missing'
+
+        keywords = cls._query_by_values(values)
+
+        # Values not found might be the GUIDs of existing keywords
+        guids = {}
+        for value in values:
+            if value not in keywords:
+                try:
+                    guids[uuid.UUID(str(value))] = value
+                except ValueError:
+                    pass
+        if guids:
+            for keyword in cls.query.filter(cls.guid.in_(list(guids))):
+                keywords[guids[keyword.guid]] = keyword
+
+        missing = [value for value in values if value not in keywords]
+        if missing and create:
+            now = datetime.datetime.utcnow()
+            rows = [
+                {
+                    'guid': uuid.uuid4(),
+                    'value': value,
+                    'source': source,
+                    'created': now,
+                    'updated': now,
+                    'indexed': now,
+                    'viewed': now,
+                }
+                for value in missing
+            ]
             with db.session.begin(subtransactions=True):
-                keyword = cls(
-                    value=value,
-                    source=source,
-                )
-                db.session.add(keyword)
-            db.session.refresh(keyword)
+                statement = cls.__table__.insert()
+                if db.engine.dialect.name == 'postgresql':
+                    from sqlalchemy.dialects.postgresql import insert
+
+                    statement = insert(cls.__table__).on_conflict_do_nothing(
+                        index_elements=[cls.value]
+                    )
+                for start in range(0, len(rows), KEYWORD_BULK_SIZE):
+                    db.session.execute(
+                        statement.values(rows[start : start + KEYWORD_BULK_SIZE])
+                    )
+            keywords.update(cls._query_by_values(missing))
+
+        return keywords
+
+    @classmethod
+    def ensure_patch_keywords(cls, operations, field):
+        """
+        Resolve the keyword values of all the ``field`` operations of a patch at
+        once, creating the ones that test operations ask for
 
-        return keyword
+        Returns a dict of value to Keyword, or None for values that do not exist.
+        Values that refer back to earlier test operations ("[0]") and dicts are
+        left to ensure_keyword().
+        """
+        create = []
+        lookup = []
+        for operation in operations:
+            value = operation.get('value')
+            if operation.get('field_name') != field or not isinstance(value, str):
+                continue
+            if not value or (value[0] == '[' and value[-1] == ']'):
+                continue
+            if operation.get('op') == 'test':
+                create.append(value)
+            else:
+                lookup.append(value)
+
+        keywords = {}
+        if create:
+            keywords.update(cls.ensure_keywords(create))
+        lookup = [value for value in lookup if value not in keywords]
+        if lookup:
+            keywords.update(cls.ensure_keywords(lookup, create=False))
+        return {value: keywords.get(value) for value in create + lookup}
+
+    @classmethod
+    def _query_by_values(cls, values):
+        keywords = {}
+        for start in range(0, len(values), KEYWORD_BULK_SIZE):
+            query = cls.query.filter(
+                cls.value.in_(values[start : start + KEYWORD_BULK_SIZE])
+            )
+            keywords.update({keyword.value: keyword for keyword in query})
+        return keywords
 
     def __repr__(self):
         return (
@@ -103,17 +187,77 @@ class Keyword(db.Model, HoustonModel):
             db.session.delete(self)
 
     def delete_if_unreferenced(self):
-        if self.number_referenced_dependencies() < 1:
+        if not self.is_referenced():
             log.warning(
                 f'{self} is no longer referenced by any Annotation or Asset, deleting.'
             )
             self.delete()
 
+    @classmethod
+    def _referenced_clauses(cls, guid):
+        from app.modules.annotations.models import AnnotationKeywords
+        from app.modules.assets.models import AssetTags
+
+        return (
+            db.exists().where(AnnotationKeywords.keyword_guid == guid),
+            db.exists().where(AssetTags.tag_guid == guid),
+        )
+
+    def is_referenced(self):
+        return db.session.query(db.or_(*self._referenced_clauses(self.guid))).scalar()
+
+    @classmethod
+    def delete_unreferenced(cls, keywords):
+        """
+        Delete whichever of ``keywords`` no Annotation or Asset references any more,
+        with one statement per batch, and return how many were deleted
+        """
+        guids = list({keyword.guid for keyword in keywords if keyword is not None})
+        if not guids:
+            return 0
+
+        deleted = set()
+        with db.session.begin(subtransactions=True):
+            # The reference rows removed so far have to be gone for the check
+            db.session.flush()
+            annotation_clause, asset_clause = cls._referenced_clauses(cls.guid)
+            for start in range(0, len(guids), KEYWORD_BULK_SIZE):
+                unreferenced = [
+                    row[0]
+                    for row in db.session.query(cls.guid).filter(
+                        cls.guid.in_(guids[start : start + KEYWORD_BULK_SIZE]),
+                        ~annotation_clause,
+                        ~asset_clause,
+                    )
+                ]
+                if unreferenced:
+                    cls.query.filter(cls.guid.in_(unreferenced)).delete(
+                        synchronize_session=False
+                    )
+                    deleted.update(unreferenced)
+
+        for keyword in keywords:
+            if keyword is not None and keyword.guid in deleted and keyword in db.session:
+                db.session.expunge(keyword)
+        if deleted:
+            log.warning(
+                f'Deleted {len(deleted)} Keywords no longer referenced by any '
+                'Annotation or Asset'
+            )
+        return len(deleted)
+
     def number_referenced_dependencies(self):
         from app.modules.annotations.models import AnnotationKeywords
         from app.modules.assets.models import AssetTags
 
-        refs = []
-        refs += AnnotationKeywords.query.filter_by(keyword_guid=self.guid).all()
-        refs += AssetTags.query.filter_by(tag_guid=self.guid).all()
-        return len(refs)
+        annotations = (
+            db.session.query(db.func.count(AnnotationKeywords.annotation_guid))
+            .filter(AnnotationKeywords.keyword_guid == self.guid)
+            .scalar()
+        )
+        assets = (
+            db.session.query(db.func.count(AssetTags.asset_guid))
+            .filter(AssetTags.tag_guid == self.guid)
+            .scalar()
+        )
+        return annotations + assets
@@ -16,6 +16,9 @@ from app.extensions.git_store import GitStore
 
 log = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
+# participation rows written or deleted per statement
+MISSION_TASK_BULK_SIZE = 1000
+
 
 class MissionUserAssignment(db.Model, HoustonModel):
     mission_guid = db.Column(db.GUID, db.ForeignKey('mission.guid'), primary_key=True)
@@ -107,45 +110,92 @@ class Mission(db.Model, HoustonModel, Timestamp):
     def assets(self):
         return self.get_assets()
 
-    def asset_search(self, search, total=True, **pagination_kwargs):
+    def asset_search(
+        self,
+        search,
+        total=True,
+        load=True,
+        limit=100,
+        offset=0,
+        sort='guid',
+        reverse=False,
+        reverse_after=False,
+        **kwargs
+    ):
+        """
+        Search the mission's Assets, the mission filter and the pagination both
+        happen in Elasticsearch (on the indexed ``mission_guid``) and only the
+        requested page is loaded from the database
+        """
+        from app.extensions import elasticsearch as es
         from app.modules.assets.models import Asset
 
-        # Get all mission's GUIDs
-        mission_guids = self.get_assets(load=False)
-
-        # Get Elasticsearch GUIDs
-        response = Asset.elasticsearch(
-            search,
-            load=False,
-            total=total,
-            filter_guids=mission_guids,
-            **pagination_kwargs
-        )
+        mission_filter = {'term': {'mission_guid': str(self.guid)}}
+        filters = [search, mission_filter] if search else [mission_filter]
+        query = {'bool': {'filter': filters}}
 
-        if total:
-            assert len(response) == 2
-            num_total, search_guids = response
+        order = 'desc' if reverse else 'asc'
+        if sort is None or sort.lower() in ['guid', 'default', 'primary']:
+            es_sort = [{'guid': {'order': order}}]
+        elif sort.startswith(es.ELASTICSEARCH_SORTING_PREFIX):
+            es_sort_term = sort.replace(es.ELASTICSEARCH_SORTING_PREFIX, '')
+            es_sort = [{es_sort_term: {'order': order}}, {'guid': {'order': order}}]
         else:
-            num_total, search_guids = None, response
+            es_sort = None
+
+        index = es.es_index_name(Asset)
+        if (
+            index is None
+            or es_sort is None
+            or limit is None
+            or offset + limit > es.ELASTICSEARCH_MAX_RESULT_WINDOW
+        ):
+            # Sorting on database columns or fetching everything, fall back to
+            # scrolling through every (mission filtered) hit
+            return Asset.elasticsearch(
+                query,
+                load=load,
+                total=total,
+                limit=limit,
+                offset=offset,
+                sort=sort,
+                reverse=reverse,
+                reverse_after=reverse_after,
+                **kwargs
+            )
 
-        # Load assets from DB
-        assets = []
-        for guid in search_guids:
-            asset = Asset.query.get(guid)
-            if asset is not None:
-                assets.append(asset)
+        body = {'query': query, 'sort': es_sort, '_source': False}
+        num_total, hits = es.es_search_page(index, body, offset=offset, limit=limit)
+        search_guids = [uuid.UUID(hit['_id']) for hit in hits]
+        if reverse_after:
+            search_guids = search_guids[::-1]
 
-        if num_total is None:
-            return assets
+        if load:
+            # Load the page in one query, keeping the Elasticsearch order
+            loaded = {}
+            if search_guids:
+                loaded = {
+                    asset.guid: asset
+                    for asset in Asset.query.filter(Asset.guid.in_(search_guids))
+                }
+            results = [loaded[guid] for guid in search_guids if guid in loaded]
         else:
-            return num_total, assets
+            results = search_guids
+
+        if total:
+            return num_total, results
+        return results
 
     @property
     def asset_count(self):
-        count = 0
-        for collection in self.collections:
-            count += collection.asset_count
-        return count
+        from app.modules.assets.models import Asset
+
+        return (
+            db.session.query(db.func.count(Asset.guid))
+            .join(MissionCollection, MissionCollection.guid == Asset.git_store_guid)
+            .filter(MissionCollection.mission_guid == self.guid)
+            .scalar()
+        )
 
     def get_options(self):
         return self.options.get('model_options', [])
@@ -242,6 +292,8 @@ class Mission(db.Model, HoustonModel, Timestamp):
             db.session.merge(self)
 
     def delete_cascade(self):
+        from app.modules.keywords.models import Keyword
+
         with elasticsearch_context():
             with db.session.no_autoflush:
                 while self.tasks:
@@ -256,9 +308,7 @@ class Mission(db.Model, HoustonModel, Timestamp):
                     tags += new_tags
                     asset.delete(justify_git_store=False)
 
-                tags = list(set(tags))
-                for tag in tags:
-                    tag.delete_if_unreferenced()
+                Keyword.delete_unreferenced(tags)
                 while self.collections:
                     collection = self.collections.pop()
                     collection.delete()
@@ -306,7 +356,13 @@ class MissionCollection(GitStore):
 
     @property
     def asset_count(self):
-        return len(self.get_assets(load=False))
+        from app.modules.assets.models import Asset
+
+        return (
+            db.session.query(db.func.count(Asset.guid))
+            .filter(Asset.git_store_guid == self.guid)
+            .scalar()
+        )
 
     def post_preparation_hook(self):
         pass
@@ -343,11 +399,6 @@ class MissionCollection(GitStore):
 
         ensure_remote.delay(str(mission_collection.guid))
 
-    def git_push_delay(self):
-        from app.extensions.git_store.tasks import git_push
-
-        git_push.delay(str(self.guid))
-
     def delete_remote_delay(self):
         from app.extensions.git_store.tasks import delete_remote
 
@@ -517,11 +568,21 @@ class MissionTask(db.Model, HoustonModel, Timestamp):
 
     @property
     def asset_count(self):
-        return len(self.asset_participations)
+        return (
+            db.session.query(db.func.count(MissionTaskAssetParticipation.asset_guid))
+            .filter(MissionTaskAssetParticipation.mission_task_guid == self.guid)
+            .scalar()
+        )
 
     @property
     def annotation_count(self):
-        return len(self.annotation_participations)
+        return (
+            db.session.query(
+                db.func.count(MissionTaskAnnotationParticipation.annotation_guid)
+            )
+            .filter(MissionTaskAnnotationParticipation.mission_task_guid == self.guid)
+            .scalar()
+        )
 
     @db.validates('title')
     def validate_title(self, key, title):  # pylint: disable=unused-argument,no-self-use
@@ -582,6 +643,71 @@ class MissionTask(db.Model, HoustonModel, Timestamp):
                 db.session.delete(participation)
                 break
 
+    def get_asset_guids(self):
+        rows = db.session.query(MissionTaskAssetParticipation.asset_guid).filter(
+            MissionTaskAssetParticipation.mission_task_guid == self.guid
+        )
+        return {row[0] for row in rows}
+
+    def add_assets_in_context(self, asset_guids):
+        """
+        Add participations for many Assets (by GUID) with multi-row inserts rather
+        than one ORM object at a time
+        """
+        asset_guids = list(asset_guids)
+        if not asset_guids:
+            return
+        if self.guid is None:
+            db.session.flush()
+
+        now = datetime.datetime.utcnow()
+        table = MissionTaskAssetParticipation.__table__
+        for start in range(0, len(asset_guids), MISSION_TASK_BULK_SIZE):
+            rows = [
+                {
+                    'mission_task_guid': self.guid,
+                    'asset_guid': asset_guid,
+                    'created': now,
+                    'updated': now,
+                    'indexed': now,
+                    'viewed': now,
+                }
+                for asset_guid in asset_guids[start : start + MISSION_TASK_BULK_SIZE]
+            ]
+            db.session.execute(table.insert().values(rows))
+        db.session.expire(self, ['asset_participations'])
+        self._touch_assets(asset_guids)
+
+    def remove_assets_in_context(self, asset_guids):
+        asset_guids = list(asset_guids)
+        if not asset_guids:
+            return
+
+        for start in range(0, len(asset_guids), MISSION_TASK_BULK_SIZE):
+            MissionTaskAssetParticipation.query.filter(
+                MissionTaskAssetParticipation.mission_task_guid == self.guid,
+                MissionTaskAssetParticipation.asset_guid.in_(
+                    asset_guids[start : start + MISSION_TASK_BULK_SIZE]
+                ),
+            ).delete(synchronize_session=False)
+        db.session.expire(self, ['asset_participations'])
+        self._touch_assets(asset_guids)
+
+    def _touch_assets(self, asset_guids):
+        # The Assets' indexed task membership is now out of date, mark them for
+        # the next Elasticsearch refresh
+        from app.modules.assets.models import Asset
+
+        now = datetime.datetime.utcnow()
+        for start in range(0, len(asset_guids), MISSION_TASK_BULK_SIZE):
+            db.session.execute(
+                Asset.__table__.update()
+                .where(
+                    Asset.guid.in_(asset_guids[start : start + MISSION_TASK_BULK_SIZE])
+                )
+                .values(updated=now)
+            )
+
     def get_annotations(self):
         return [
             participation.annotation for participation in self.annotation_participations
@@ -198,8 +198,19 @@ class CreateMissionTaskParameters(SetOperationsJSONParameters):
 
     @classmethod
     def resolve(cls, field, value, obj):
+        """
+        Resolve the (field, value) into the set of Asset GUIDs it names, without
+        loading the Assets themselves
+        """
+        import uuid
+
+        from app.extensions import db
         from app.modules.assets.models import Asset
-        from app.modules.missions.models import MissionCollection, MissionTask
+        from app.modules.missions.models import (
+            MissionCollection,
+            MissionTask,
+            MissionTaskAssetParticipation,
+        )
 
         def _check(condition):
             if not condition:
@@ -208,57 +219,74 @@ class CreateMissionTaskParameters(SetOperationsJSONParameters):
                     % (field, value)
                 )
 
-        if field == 'search':
-            return obj.asset_search(value, total=False, limit=None)
-        elif field == 'collections':
-            assets = []
-
+        def _guids():
             _check(isinstance(value, list))
+            guids = set()
             for guid in value:
                 _check(isinstance(guid, str))
-                mission_collection = MissionCollection.query.get(guid)
-                if mission_collection is not None:
-                    if mission_collection.mission == obj:
-                        assets += mission_collection.assets
-                    else:
-                        raise ValidationError(
-                            'Failed to update set. Mission Collection %r is not part of Mission %r'
-                            % (mission_collection.guid, obj.guid)
-                        )
+                try:
+                    guids.add(uuid.UUID(guid))
+                except ValueError:
+                    _check(False)
+            return guids
 
-            return assets
+        if field == 'search':
+            return obj.asset_search(value, total=False, limit=None, load=False)
+        elif field == 'collections':
+            guids = _guids()
+            if not guids:
+                return set()
+            collection_guids = []
+            for guid, mission_guid in db.session.query(
+                MissionCollection.guid, MissionCollection.mission_guid
+            ).filter(MissionCollection.guid.in_(guids)):
+                if mission_guid != obj.guid:
+                    raise ValidationError(
+                        'Failed to update set. Mission Collection %r is not part of Mission %r'
+                        % (guid, obj.guid)
+                    )
+                collection_guids.append(guid)
+            if not collection_guids:
+                return set()
+
+            rows = db.session.query(Asset.guid).filter(
+                Asset.git_store_guid.in_(collection_guids)
+            )
+            return {row[0] for row in rows}
         elif field == 'tasks':
-            assets = []
-
-            _check(isinstance(value, list))
-            for guid in value:
-                _check(isinstance(guid, str))
-                mission_task = MissionTask.query.get(guid)
-                if mission_task is not None:
-                    if mission_task.mission == obj:
-                        assets += mission_task.assets
-                    else:
-                        raise ValidationError(
-                            'Failed to update set. Mission Task %r is not part of Mission %r'
-                            % (mission_task.guid, obj.guid)
-                        )
-
-            return assets
+            guids = _guids()
+            if not guids:
+                return set()
+            for guid, mission_guid in db.session.query(
+                MissionTask.guid, MissionTask.mission_guid
+            ).filter(MissionTask.guid.in_(guids)):
+                if mission_guid != obj.guid:
+                    raise ValidationError(
+                        'Failed to update set. Mission Task %r is not part of Mission %r'
+                        % (guid, obj.guid)
+                    )
+
+            rows = db.session.query(MissionTaskAssetParticipation.asset_guid).filter(
+                MissionTaskAssetParticipation.mission_task_guid.in_(guids)
+            )
+            return {row[0] for row in rows}
         elif field == 'assets':
-            assets = []
-
-            _check(isinstance(value, list))
-            for guid in value:
-                _check(isinstance(guid, str))
-                asset = Asset.query.get(guid)
-                if asset is not None:
-                    if asset.git_store.mission == obj:
-                        assets.append(asset)
-                    else:
-                        raise ValidationError(
-                            'Failed to update set. Asset %r is not part of any Mission Collection for Mission %r'
-                            % (asset.guid, obj.guid)
-                        )
+            guids = _guids()
+            if not guids:
+                return set()
+            rows = (
+                db.session.query(Asset.guid, MissionCollection.mission_guid)
+                .outerjoin(MissionCollection, MissionCollection.guid == Asset.git_store_guid)
+                .filter(Asset.guid.in_(guids))
+            )
+            assets = set()
+            for guid, mission_guid in rows:
+                if mission_guid != obj.guid:
+                    raise ValidationError(
+                        'Failed to update set. Asset %r is not part of any Mission Collection for Mission %r'
+                        % (guid, obj.guid)
+                    )
+                assets.add(guid)
 
             return assets
 
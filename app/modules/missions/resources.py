@@ -10,7 +10,6 @@ import uuid
 from http import HTTPStatus
 
 import randomname
-import tqdm
 import werkzeug
 from flask import request
 from flask_login import current_user  # NOQA
@@ -367,14 +366,12 @@ class MissionTasksForMission(Resource):
         """
         Create a new instance of Mission.
         """
-        from app.modules.assets.models import Asset
-
         try:
             (
-                asset_set,
+                asset_guids,
                 identity_dict,
             ) = parameters.CreateMissionTaskParameters.perform_set_operations(
-                args, obj=mission, obj_cls=Asset
+                args, obj=mission, obj_cls=uuid.UUID
             )
         except ValidationError as exception:
             abort(409, message=str(exception))
@@ -420,8 +417,7 @@ class MissionTasksForMission(Resource):
         with context:
             db.session.add(mission_task)
             mission_task.add_user_in_context(current_user)
-            for asset in tqdm.tqdm(asset_set, desc='Adding Assets to MissionTask'):
-                mission_task.add_asset_in_context(asset)
+            mission_task.add_assets_in_context(asset_guids)
 
         db.session.refresh(mission_task)
 
@@ -735,15 +731,16 @@ class MissionTaskByID(Resource):
         """
         Create a new instance of Mission.
         """
-        from app.modules.assets.models import Asset
-
-        starting_set = set(mission_task.assets)
+        starting_set = mission_task.get_asset_guids()
         try:
             (
-                asset_set,
+                asset_guids,
                 identity_dict,
             ) = parameters.CreateMissionTaskParameters.perform_set_operations(
-                args, obj=mission_task.mission, obj_cls=Asset, starting_set=starting_set
+                args,
+                obj=mission_task.mission,
+                obj_cls=uuid.UUID,
+                starting_set=starting_set,
             )
         except ValidationError as exception:
             abort(409, message=str(exception))
@@ -753,14 +750,8 @@ class MissionTaskByID(Resource):
         )
 
         with context:
-            add_set = asset_set - starting_set
-            for asset in add_set:
-                mission_task.add_asset_in_context(asset)
-
-            remove_set = starting_set - asset_set
-            for asset in remove_set:
-                mission_task.remove_asset_in_context(asset)
-
+            mission_task.add_assets_in_context(asset_guids - starting_set)
+            mission_task.remove_assets_in_context(starting_set - asset_guids)
             db.session.merge(mission_task)
 
         db.session.refresh(mission_task)
@@ -68,7 +68,11 @@ class Name(db.Model, HoustonModel, Timestamp):
     )
 
     # this will ensure individual+context is unique (one context per individual)
-    __table_args__ = (db.UniqueConstraint(context, individual_guid),)
+    __table_args__ = (
+        db.UniqueConstraint(context, individual_guid),
+        # lookups of individuals by name (Individual.get_by_names)
+        db.Index('ix_name_context_value', context, value),
+    )
 
     @classmethod
     def get_elasticsearch_schema(cls):
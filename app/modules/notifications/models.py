@@ -16,6 +16,9 @@ from app.utils import HoustonException
 
 log = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
+# max notifications emailed per pass over the outbox
+NOTIFICATION_OUTBOX_BATCH_SIZE = 500
+
 
 class NotificationType(str, enum.Enum):
     raw = 'raw'  # Dummy value used as a default
@@ -603,6 +606,8 @@ class Notification(db.Model, HoustonModel):
     )
     recipient = db.relationship('User', back_populates='notifications')
     sender_guid = db.Column(db.GUID, nullable=True)
+    # outbox flag, set when the recipient wants this emailed and cleared once it is sent
+    email_pending = db.Column(db.Boolean, default=False, nullable=False, index=True)
 
     created = db.Column(
         db.DateTime, index=True, default=datetime.datetime.utcnow, nullable=False
@@ -671,24 +676,36 @@ class Notification(db.Model, HoustonModel):
     def get_sender_guid(self):
         return str(self.sender_guid) if self.sender_guid else None
 
-    def get_sender_name(self):
+    def get_sender(self):
         from app.modules.users.models import User
 
-        if self.sender_guid is not None:
-            user = User.query.get(self.sender_guid)
-            if user:
-                return user.full_name
+        if not hasattr(self, '_sender'):
+            self._sender = (
+                User.query.get(self.sender_guid) if self.sender_guid is not None else None
+            )
+        return self._sender
 
-        return 'N/A'
+    def get_sender_name(self):
+        sender = self.get_sender()
+        return sender.full_name if sender else 'N/A'
 
     def get_sender_email(self):
+        sender = self.get_sender()
+        return sender.email if sender else 'N/A'
+
+    # looks up the senders of many notifications in one query (rather than one get per notification)
+    @classmethod
+    def prefetch_senders(cls, notifications):
         from app.modules.users.models import User
 
-        user = User.query.get(self.sender_guid)
-        if user:
-            return user.email
-        else:
-            return 'N/A'
+        guids = {notif.sender_guid for notif in notifications if notif.sender_guid}
+        senders = {}
+        if guids:
+            senders = {
+                user.guid: user for user in User.query.filter(User.guid.in_(guids))
+            }
+        for notif in notifications:
+            notif._sender = senders.get(notif.sender_guid)
 
     # returns dictionary of channel:bool
     def channels_to_send(self, digest=False):
@@ -713,27 +730,219 @@ class Notification(db.Model, HoustonModel):
 
         return channels
 
-    def send_if_required(self):
+    def wants_email(self):
+        return bool(self.channels_to_send(False).get(NotificationChannel.email))
+
+    def email_message_values(self):
+        values = {
+            'context_name': 'context not set',
+            'sender_name': self.get_sender_name(),
+            'sender_guid': self.get_sender_guid(),
+            'sender_link': 'TBD',  # TODO will be fixed after some SiteSetting hackery
+        }
+        values.update(self.message_values or {})
+        return values
+
+    def build_email(self):
         from app.extensions.email import Email
 
-        channels = self.channels_to_send(False)
+        config = NOTIFICATION_CONFIG[self.message_type]
+        email = Email(recipients=[self.recipient])
+        email.template(
+            f"notifications/{config['email_template_name']}",
+            **self.email_message_values(),
+        )
+        return email
+
+    # one line (or so) describing this notification within a digest email
+    def digest_content(self, email):
+        config = NOTIFICATION_CONFIG[self.message_type]
+        values = self.email_message_values()
+        content = None
+        digest_template = config.get('email_digest_content_template')
+        if digest_template:
+            digest_template = digest_template.replace('.jinja2', '')
+            content = email.render_fragment(
+                f'notifications/digest/{digest_template}', **values
+            )
+        if not content:
+            # every notification type has a one line subject to fall back on
+            content = email.render_fragment(
+                f"notifications/{config['email_template_name']}", 'subject', **values
+            )
+        return content or self.message_type
+
+    # hands the email (if any) off to the outbox, sent here when running in the foreground
+    def send_if_required(self, foreground=None):
+        from flask import current_app
 
         self._channels_sent = {}  # store what was sent out, if anything
-        if channels[NotificationChannel.email]:
-            config = NOTIFICATION_CONFIG[self.message_type]
-            email_message_values = {
-                'context_name': 'context not set',
-                'sender_name': self.get_sender_name(),
-                'sender_guid': self.get_sender_guid(),
-                'sender_link': 'TBD',  # TODO will be fixed after some SiteSetting hackery
-            }
-            email_message_values.update(self.message_values)
-            email = Email(recipients=[self.recipient])
-            email.template(
-                f"notifications/{config['email_template_name']}", **email_message_values
-            )
-            email.send_message()
-            self._channels_sent[NotificationChannel.email.value] = email
+        if not self.email_pending:
+            return
+        if UserNotificationPreferences.is_digest_user(self.recipient):
+            # sent later, batched with the rest of the digest
+            return
+        if foreground is None:
+            foreground = current_app.testing
+        if foreground:
+            Notification.send_emails([self])
+        else:
+            from .tasks import notification_send_outbox
+
+            notification_send_outbox.delay()
+
+    @classmethod
+    def pending_emails(cls, digest=False):
+        digest_users = db.session.query(UserNotificationPreferences.user_guid).filter(
+            UserNotificationPreferences.digest.is_(True),
+            UserNotificationPreferences.user_guid.isnot(None),
+        )
+        if digest:
+            recipient_filter = cls.recipient_guid.in_(digest_users)
+        else:
+            recipient_filter = ~cls.recipient_guid.in_(digest_users)
+        return cls.query.filter(cls.email_pending.is_(True), recipient_filter)
+
+    @classmethod
+    def claim_pending(cls, query, limit=None):
+        """
+        Take the pending notifications matching ``query`` out of the outbox before
+        they are emailed, returns the ones this caller now owns
+
+        Concurrent outbox drains never claim the same notification, so each email
+        is sent once.  On PostgreSQL the rows are claimed with one UPDATE over a
+        ``FOR UPDATE SKIP LOCKED`` selection, elsewhere each row is claimed with
+        its own conditional UPDATE.
+        """
+        guid_query = (
+            query.filter(cls.email_pending.is_(True))
+            .with_entities(cls.guid)
+            .order_by(cls.created, cls.guid)
+        )
+        if limit is not None:
+            guid_query = guid_query.limit(limit)
+
+        table = cls.__table__
+        with db.session.begin(subtransactions=True):
+            if db.engine.dialect.name == 'postgresql':
+                selection = guid_query.with_for_update(skip_locked=True).subquery()
+                claimed = [
+                    guid
+                    for (guid,) in db.session.execute(
+                        table.update()
+                        .where(table.c.guid.in_(db.select([selection.c.guid])))
+                        .values(email_pending=False)
+                        .returning(table.c.guid)
+                    )
+                ]
+            else:
+                claimed = []
+                for (guid,) in guid_query.all():
+                    result = db.session.execute(
+                        table.update()
+                        .where(table.c.guid == guid)
+                        .where(table.c.email_pending.is_(True))
+                        .values(email_pending=False)
+                    )
+                    if result.rowcount == 1:
+                        claimed.append(guid)
+
+        if not claimed:
+            return []
+        return (
+            cls.query.filter(cls.guid.in_(claimed))
+            .order_by(cls.created, cls.guid)
+            .populate_existing()
+            .all()
+        )
+
+    @classmethod
+    def send_emails(cls, notifications):
+        """
+        Email each notification individually, sharing one SMTP connection
+
+        Only the notifications still in the outbox are sent, they are claimed
+        (taken out of it) first, whether or not the send then succeeds.  Failures
+        are logged by Email.send_message().
+        """
+        guids = [notif.guid for notif in notifications]
+        return cls._send_claimed(cls.claim_pending(cls.query.filter(cls.guid.in_(guids))))
+
+    @classmethod
+    def _send_claimed(cls, notifications):
+        from app.extensions.email import mail_connection
+
+        if not notifications:
+            return 0
+        cls.prefetch_senders(notifications)
+        with mail_connection() as connection:
+            for notif in notifications:
+                notif._channels_sent = {}
+                email = notif.build_email()
+                email.send_message(connection=connection)
+                notif._channels_sent[NotificationChannel.email.value] = email
+        return len(notifications)
+
+    @classmethod
+    def send_outbox(cls, batch_size=NOTIFICATION_OUTBOX_BATCH_SIZE):
+        total = 0
+        while True:
+            batch = cls.claim_pending(cls.pending_emails(digest=False), batch_size)
+            if not batch:
+                break
+            total += cls._send_claimed(batch)
+            if len(batch) < batch_size:
+                break
+        return total
+
+    @classmethod
+    def build_digest_email(cls, recipient, notifications):
+        from app.extensions.email import Email
+
+        email = Email(recipients=[recipient])
+        items = [notif.digest_content(email) for notif in notifications]
+        email.template('notifications/digest', digest_items=items)
+        return email
+
+    @classmethod
+    def send_digests(cls, window=None, now=None):
+        """
+        Send one email per digest user covering all their pending notifications,
+        once the oldest of them has waited ``window`` seconds
+        """
+        from flask import current_app
+
+        from app.extensions.email import mail_connection
+
+        if window is None:
+            window = current_app.config.get('NOTIFICATION_DIGEST_WINDOW', 0)
+        if now is None:
+            now = datetime.datetime.utcnow()
+        cutoff = now - datetime.timedelta(seconds=window)
+
+        by_recipient = {}
+        for notif in cls.pending_emails(digest=True).order_by(cls.created):
+            by_recipient.setdefault(notif.recipient_guid, []).append(notif)
+        # ordered by created, so the first is the oldest
+        due = [notifs for notifs in by_recipient.values() if notifs[0].created <= cutoff]
+        if not due:
+            return 0
+
+        # another drain may have claimed some of them in the meantime
+        guids = [notif.guid for notifs in due for notif in notifs]
+        sent = cls.claim_pending(cls.query.filter(cls.guid.in_(guids)))
+        if not sent:
+            return 0
+        by_recipient = {}
+        for notif in sent:
+            by_recipient.setdefault(notif.recipient_guid, []).append(notif)
+
+        cls.prefetch_senders(sent)
+        with mail_connection() as connection:
+            for notifs in by_recipient.values():
+                email = cls.build_digest_email(notifs[0].recipient, notifs)
+                email.send_message(connection=connection)
+        return len(by_recipient)
 
     @classmethod
     def create(cls, notification_type, receiving_user, builder):
@@ -769,6 +978,7 @@ class Notification(db.Model, HoustonModel):
                 message_values=data,
                 sender_guid=sender_guid,
             )
+            new_notification.email_pending = new_notification.wants_email()
             log.debug(f'Created new notification {new_notification}')
             with db.session.begin(subtransactions=True):
                 db.session.add(new_notification)
@@ -869,6 +1079,10 @@ class UserNotificationPreferences(db.Model, NotificationPreferences):
             ')>'.format(class_name=self.__class__.__name__, self=self)
         )
 
+    @classmethod
+    def is_digest_user(cls, user):
+        return any(prefs.digest for prefs in user.notification_preferences)
+
     @classmethod
     def get_user_preferences(cls, user):
         prefs = SystemNotificationPreferences.get().preferences
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from app.extensions.celery import celery
+
+# sweeps up anything left in the outbox, e.g. queued inside a transaction that committed late
+NOTIFICATION_OUTBOX_FREQUENCY = 60 * 5
+NOTIFICATION_DIGEST_FREQUENCY = 60 * 15
+
+
+log = logging.getLogger(__name__)
+
+
+@celery.on_after_configure.connect
+def notification_setup_periodic_tasks(sender, **kwargs):
+    if NOTIFICATION_OUTBOX_FREQUENCY is not None:
+        sender.add_periodic_task(
+            NOTIFICATION_OUTBOX_FREQUENCY,
+            notification_send_outbox.s(),
+            name='Send Notification Outbox',
+        )
+    if NOTIFICATION_DIGEST_FREQUENCY is not None:
+        sender.add_periodic_task(
+            NOTIFICATION_DIGEST_FREQUENCY,
+            notification_send_digests.s(),
+            name='Send Notification Digests',
+        )
+
+
+@celery.task
+def notification_send_outbox():
+    from .models import Notification
+
+    sent = Notification.send_outbox()
+    if sent:
+        log.info(f'Emailed {sent} notifications from the outbox')
+    return sent
+
+
+@celery.task
+def notification_send_digests():
+    from .models import Notification
+
+    sent = Notification.send_digests()
+    if sent:
+        log.info(f'Emailed {sent} notification digests')
+    return sent
@@ -13,6 +13,7 @@ from flask import current_app, url_for
 
 import app.extensions.logging as AuditLog
 from app.extensions import CustomFieldMixin, ExportMixin, HoustonModel, db
+from app.extensions.prometheus.profiling import profiled
 from app.modules.annotations.models import Annotation
 from app.modules.encounters.models import Encounter
 from app.modules.individuals.models import Individual
@@ -136,7 +137,11 @@ class Sighting(db.Model, HoustonModel, CustomFieldMixin, ExportMixin):
     comments = db.Column(db.String(), nullable=True)
     verbatim_locality = db.Column(db.String(), nullable=True)
 
-    custom_fields = db.Column(db.JSON, default=lambda: {}, nullable=True)
+    custom_fields = db.Column(db.JSONB, default=lambda: {}, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_sighting_custom_fields', custom_fields, postgresql_using='gin'),
+    )
 
     unreviewed_start = db.Column(
         db.DateTime, index=True, default=datetime.datetime.utcnow, nullable=False
@@ -167,6 +172,19 @@ class Sighting(db.Model, HoustonModel, CustomFieldMixin, ExportMixin):
         data['comments'] = self.comments
         return data
 
+    @classmethod
+    def export_load_options(cls):
+        from sqlalchemy.orm import selectinload
+
+        return [
+            selectinload(Sighting.time),
+            selectinload(Sighting.taxonomy_joins),
+            selectinload(Sighting.encounters),
+        ]
+
+    def export_related(self):
+        return self.get_encounters()
+
     @classmethod
     def get_elasticsearch_schema(cls):
         from app.modules.sightings.schemas import ElasticsearchSightingSchema
@@ -1715,6 +1733,7 @@ class Sighting(db.Model, HoustonModel, CustomFieldMixin, ExportMixin):
             }
 
     # See https://docs.google.com/document/d/1oveaPLspQsXS7XXx3hxKA8HUCYb2p-A2wd4zGPga3rs/edit#
+    @profiled('sighting.get_id_result')
     def get_id_result(self):
 
         response = {
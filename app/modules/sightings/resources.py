@@ -20,7 +20,12 @@ from app.extensions.api import Namespace, abort
 from app.modules import utils
 from app.modules.users import permissions
 from app.modules.users.permissions.types import AccessOperation
-from app.utils import CascadeDeleteException, HoustonException
+from app.utils import (
+    CascadeDeleteException,
+    HoustonException,
+    not_modified_response,
+    send_cached_file,
+)
 from flask_restx_patched import Resource
 
 from . import parameters, schemas
@@ -149,23 +154,12 @@ class SightingExport(Resource):
     )
     def post(self):
         search = request.get_json()
-        sights = Sighting.elasticsearch(search, limit=15000)
-        if not sights:
-            abort(400, 'No results to export')
         from flask import send_file
 
-        from app.extensions.export.models import Export
+        from app.extensions.export.models import EXPORT_SYNCHRONOUS_LIMIT, Export
 
         export = Export()
-        ct = 0
-        for sight in sights:
-            if not sight.current_user_has_export_permission():
-                continue
-            ct += 1
-            export.add(sight)
-            for enc in sight.get_encounters():
-                export.add(enc)
-        if not ct:
+        if not export.add_search(Sighting, search, limit=EXPORT_SYNCHRONOUS_LIMIT):
             abort(400, 'No results to export')
         export.save()
         return send_file(
@@ -176,6 +170,26 @@ class SightingExport(Resource):
         )
 
 
+@api.route('/export/background')
+@api.login_required(oauth_scopes=['sightings:read'])
+class SightingExportBackground(Resource):
+    @api.permission_required(
+        permissions.ModuleAccessPermission,
+        kwargs_on_request=lambda kwargs: {
+            'module': Sighting,
+            'action': AccessOperation.READ,
+        },
+    )
+    def post(self):
+        """
+        Start a background export, the workbook is then fetched from /export/<progress_guid>
+        """
+        from app.extensions.export.models import Export
+
+        progress = Export.start_background(Sighting, request.get_json(), current_user)
+        return {'progress_guid': str(progress.guid)}
+
+
 @api.route('/remove_all_empty')
 @api.login_required(oauth_scopes=['sightings:write'])
 class SightingRemoveEmpty(Resource):
@@ -536,15 +550,22 @@ class SightingIdResultAnnotationSrcAsset(Resource):
 
         # The user is allowed to view the asset, but not the original source.  Only show the derived "mid" version
         format = 'mid'
-        cls = type(asset.git_store)
-        cls.ensure_store(asset.git_store_guid)
-        try:
-            asset_format_path = asset.get_or_make_format_path(format)
-        except Exception:
-            logging.exception('Got exception from get_or_make_format_path()')
-            raise werkzeug.exceptions.NotImplemented
+        etag = asset.get_rendition_etag(format)
+        response = not_modified_response(etag)
+        if response is not None:
+            return response
+
+        asset_format_path = asset.get_derived_path(format)
+        if not asset_format_path.exists():
+            cls = type(asset.git_store)
+            cls.ensure_store(asset.git_store_guid)
+            try:
+                asset_format_path = asset.get_or_make_format_path(format)
+            except Exception:
+                logging.exception('Got exception from get_or_make_format_path()')
+                raise werkzeug.exceptions.NotImplemented
 
-        return send_file(asset_format_path, asset.DERIVED_MIME_TYPE)
+        return send_cached_file(asset_format_path, asset.DERIVED_MIME_TYPE, etag)
 
 
 @api.route('/<uuid:sighting_guid>/featured_image', doc=False)
@@ -812,7 +812,6 @@ class SiteSettingCustomFields(object):
     @classmethod
     def _find_data(cls, cf_id, class_name):
         # hacky - it limits us to these 3 classes, alas
-        from app.extensions import db
         from app.modules.encounters.models import Encounter
         from app.modules.individuals.models import Individual
         from app.modules.sightings.models import Sighting
@@ -825,15 +824,7 @@ class SiteSettingCustomFields(object):
         }
         cls = cls_map.get(class_name)
         assert cls
-        has_values = []
-        res = db.session.execute(
-            # h/t https://stackoverflow.com/a/68679549 for this madness
-            f'SELECT guid FROM {class_name.lower()} WHERE (custom_fields #>> \'{{}}\')::jsonb->\'{cf_id}\' IS NOT NULL'
-        )
-        for row in res:
-            obj = cls.query.get(row[0])
-            has_values.append(obj)
-        return has_values
+        return cls.query.filter(cls.custom_field_filter(cf_id)).all()
 
     @classmethod
     def validate_encounters(cls, value):
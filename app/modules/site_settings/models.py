@@ -3,11 +3,15 @@
 Site Settings database models
 --------------------
 """
+import copy
 import logging
+import time
 import uuid
 
 from flask import current_app
 from flask_login import current_user  # NOQA
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
 
 from app.extensions import Timestamp, db, is_extension_enabled
 from app.utils import HoustonException
@@ -17,6 +21,77 @@ from .helpers import SiteSettingCustomFields, SiteSettingModules, SiteSettingSpe
 log = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
 
+# redis key of the counter bumped whenever any site setting is written
+SITE_SETTINGS_VERSION_KEY = 'site_settings_version'
+# how long a process trusts its cached values before re-reading the version
+SITE_SETTINGS_VERSION_CHECK_SECONDS = 2.0
+
+# per-process cache of stored values (or _NOT_STORED), keyed by setting key
+_value_cache = {}
+_cache_version = None
+_cache_checked = 0.0
+_NOT_STORED = object()
+
+
+def _read_cache_version():
+    from app.utils import get_persisted_value
+
+    try:
+        return get_persisted_value(SITE_SETTINGS_VERSION_KEY) or '0'
+    except Exception:  # pragma: no cover
+        log.warning('Unable to read site settings version, caching disabled')
+        return None
+
+
+def site_settings_cache_valid():
+    """
+    Check (at most every SITE_SETTINGS_VERSION_CHECK_SECONDS) that nobody has
+    written a site setting since the cache was filled, returns False when the
+    version can not be read and the cache must not be used
+    """
+    global _cache_version
+    global _cache_checked
+
+    now = time.monotonic()
+    fresh = now - _cache_checked < SITE_SETTINGS_VERSION_CHECK_SECONDS
+    if _cache_version is not None and fresh:
+        return True
+    version = _read_cache_version()
+    if version is None or version != _cache_version:
+        _value_cache.clear()
+    _cache_version = version
+    _cache_checked = now
+    return version is not None
+
+
+def site_settings_cache_version():
+    """
+    Version of the site settings that this process's cached values belong to, or
+    None when they can not be cached (other per-process caches of data written
+    along with the site settings key on it)
+    """
+    return _cache_version if site_settings_cache_valid() else None
+
+
+def invalidate_site_settings_cache(bump=True):
+    """
+    Drop this process's cached values and (with bump) tell every other process
+    to do the same on its next version check
+    """
+    global _cache_version
+
+    _value_cache.clear()
+    _cache_version = None
+    if not bump:
+        return
+    from app.utils import get_redis_connection
+
+    try:
+        get_redis_connection().incr(SITE_SETTINGS_VERSION_KEY)
+    except Exception:  # pragma: no cover
+        log.warning('Unable to bump site settings version')
+
+
 class SiteSetting(db.Model, Timestamp):
     """
     Site Settings database model.
@@ -603,15 +678,32 @@ class SiteSetting(db.Model, Timestamp):
         if not cls.is_valid_setting(key):
             raise HoustonException(log, f'Key {key} Not supported')
 
-        setting = cls.query.get(key)
-        if not setting:
+        value = cls._get_stored_value(key)
+        if value is _NOT_STORED:
             setting_default = cls._get_default_value(key)
             if default is None and setting_default is not None:
                 if callable(setting_default):
                     setting_default = setting_default()
                 return setting_default
             return default
-        return setting.get_val()
+        return value
+
+    @classmethod
+    def _get_stored_value(cls, key):
+        """
+        Value stored for key (or _NOT_STORED), from the per-process cache when
+        it is still current.  Containers are copied so callers can modify them.
+        """
+        if site_settings_cache_valid() and key in _value_cache:
+            value = _value_cache[key]
+        else:
+            setting = cls.query.get(key)
+            value = setting.get_val() if setting else _NOT_STORED
+            if _cache_version is not None:
+                _value_cache[key] = value
+        if isinstance(value, (dict, list)):
+            value = copy.deepcopy(value)
+        return value
 
     def get_val(self):
         if self.file_upload_guid:
@@ -790,25 +882,192 @@ class SiteSetting(db.Model, Timestamp):
         return val
 
 
+# Writes are caught at flush (however they were made) and other processes are
+# only told once they are committed, so they can not re-cache the old value
+@event.listens_for(SiteSetting, 'after_insert')
+@event.listens_for(SiteSetting, 'after_update')
+@event.listens_for(SiteSetting, 'after_delete')
+def _site_setting_written(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info['site_settings_changed'] = True
+    invalidate_site_settings_cache(bump=session is None)
+
+
+@event.listens_for(Session, 'after_bulk_delete')
+@event.listens_for(Session, 'after_bulk_update')
+def _site_settings_bulk_written(context):
+    entities = [desc['entity'] for desc in context.query.column_descriptions]
+    if SiteSetting in entities:
+        # outside a transaction (autocommit) the write is already committed
+        committed = context.session.transaction is None
+        if not committed:
+            context.session.info['site_settings_changed'] = True
+        invalidate_site_settings_cache(bump=committed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _site_settings_committed(session):
+    if session.info.pop('site_settings_changed', False):
+        invalidate_site_settings_cache()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _site_settings_rolled_back(session, previous_transaction):
+    if session.info.pop('site_settings_changed', False):
+        invalidate_site_settings_cache(bump=False)
+
+
+def _trigrams(text):
+    padded = f'  {text.lower()} '
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class RegionIndex(object):
+    """
+    Region tree compiled once into lookup tables: nodes by id in tree order,
+    the (first) path to each id, every id below each id, and a trigram index of
+    names so fuzzy matching only scores plausible candidates
+    """
+
+    # (version, index) of the index built from the stored site.custom.regions
+    _current = None
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.nodes = []  # every node with an 'id' key, in tree order
+        self.by_id = {}  # id: [(order, node), ...], more than one if duplicated
+        self.paths = {}  # id: [node, ...] from the top to the first node with id
+        self.descendants = {}  # id: set of ids below (any node with) id
+        self.transfer = {}  # id or _prev_id: first node having it
+        self.names = {}  # id: name, as fuzzy-matched
+        self.trigrams = {}  # trigram: set of ids
+        self._compile(tree, [])
+        for guid, name in self.names.items():
+            for trigram in _trigrams(name):
+                self.trigrams.setdefault(trigram, set()).add(guid)
+
+    def _compile(self, node, path):
+        if not isinstance(node, dict):
+            return set()
+        this_id = node.get('id')
+        if 'id' in node:
+            order = len(self.nodes)
+            self.nodes.append(node)
+            if this_id:
+                self.by_id.setdefault(this_id, []).append((order, node))
+                self.names[this_id] = node.get('name', this_id)
+            for key in (node.get('_prev_id'), this_id):
+                if key:
+                    self.transfer.setdefault(key, node)
+        if this_id:  # skips nodes without id (e.g. top)
+            path = path + [node]
+            self.paths.setdefault(this_id, path)
+
+        below = set()
+        children = node.get('locationID')
+        if isinstance(children, list):
+            for child in children:
+                if isinstance(child, dict) and child.get('id'):
+                    below.add(child['id'])
+                below.update(self._compile(child, path))
+        if this_id:
+            self.descendants.setdefault(this_id, set()).update(below)
+        return below
+
+    @classmethod
+    def current(cls):
+        """
+        Index of the stored regions (None if there are none), only rebuilt when
+        the setting has changed
+        """
+        current = cls._current
+        if (
+            current is not None
+            and site_settings_cache_valid()
+            and current[0] == _cache_version
+        ):
+            return current[1]
+
+        data = SiteSetting.get_value('site.custom.regions')
+        if current is not None and current[1] is not None and current[1].tree == data:
+            index = current[1]
+        else:
+            index = cls(data) if data else None
+        cls._current = (_cache_version, index) if _cache_version is not None else None
+        return index
+
+    @classmethod
+    def node_data(cls, node, full_tree=False):
+        data = node.copy()
+        if not full_tree and data.get('locationID'):
+            del data['locationID']
+        return data
+
+    def full_path(self, loc, id_only=True):
+        if not loc:
+            raise ValueError('must pass loc')
+        path = self.paths.get(loc)
+        if not path:
+            return None
+        if id_only:
+            return [node['id'] for node in path]
+        return [
+            {key: value for key, value in node.items() if key != 'locationID'}
+            for node in path
+        ]
+
+    def find(self, locs, id_only, full_tree):
+        if not locs:
+            locs = []
+        elif isinstance(locs, str):
+            locs = [locs]
+        elif not isinstance(locs, list):
+            raise ValueError('must pass string, list, or None')
+        if locs:
+            matches = sorted(
+                (match for loc in set(locs) for match in self.by_id.get(loc, [])),
+                key=lambda match: match[0],
+            )
+        else:
+            matches = [match for nodes in self.by_id.values() for match in nodes]
+            matches.sort(key=lambda match: match[0])
+        if id_only:
+            return [node['id'] for _, node in matches]
+        return [self.node_data(node, full_tree) for _, node in matches]
+
+    def fuzzy_candidates(self, match):
+        candidates = set()
+        for trigram in _trigrams(match):
+            candidates.update(self.trigrams.get(trigram, ()))
+        # keep tree order, so ties are broken the same way as a full scan
+        return {guid: name for guid, name in self.names.items() if guid in candidates}
+
+
 # most find-based methods reference *ids* which will be guids in new-world data
 # to search on name, try find_fuzzy()
 class Regions(dict):
     def __init__(self, *args, **kwargs):
+        self._index = None
         if 'data' in kwargs and isinstance(kwargs['data'], dict):
             self.update(kwargs['data'])
             del kwargs['data']
         else:
-            from app.modules.site_settings.models import SiteSetting
-
-            data = SiteSetting.get_value('site.custom.regions')
-            if data:
-                self.update(data)
+            self._index = RegionIndex.current()
+            if self._index is not None:
+                self.update(self._index.tree)
         if not len(self):
             raise ValueError('no region data available')
         super().__init__(*args, **kwargs)
 
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = RegionIndex(self)
+        return self._index
+
     def full_path(self, loc, id_only=True):
-        return self._find_path(self, loc, [], id_only)
+        return self.index.full_path(loc, id_only)
 
     @classmethod
     def is_region_guid_valid(cls, guid, allow_placeholders=False):
@@ -826,6 +1085,26 @@ class Regions(dict):
             return False
         return True if region_data else False
 
+    @classmethod
+    def valid_region_guids(cls, guids, allow_placeholders=False):
+        """
+        The guids (of those given) that is_region_guid_valid() accepts, all checked
+        against one copy of the regions
+        """
+        try:
+            regions = Regions()
+        except ValueError:
+            return set()
+        valid = set()
+        for guid in set(guids):
+            matches = regions.index.by_id.get(guid)
+            if not matches:
+                continue
+            _, region_data = min(matches, key=lambda match: match[0])
+            if allow_placeholders or not region_data.get('placeholderOnly', False):
+                valid.add(guid)
+        return valid
+
     @classmethod
     def get_region_name(cls, guid):
         region_name = None
@@ -880,12 +1159,13 @@ class Regions(dict):
     def with_children(self, loc_list):
         if not loc_list or not isinstance(loc_list, list):
             return set()
-        found = self.find(loc_list, id_only=False, full_tree=True)
+        descendants = self.index.descendants
+        found = [loc for loc in loc_list if loc in descendants]
         if not found:
             return set()
         children = set(loc_list)
-        for match in found:
-            children = set.union(children, self.node_children(match))
+        for loc in found:
+            children.update(descendants[loc])
         return children
 
     @classmethod
@@ -909,7 +1189,7 @@ class Regions(dict):
         return children
 
     def find(self, locs=None, id_only=True, full_tree=False):
-        found = self._find(self, locs, id_only, full_tree)
+        found = self.index.find(locs, id_only, full_tree)
         return set(found) if id_only else found
 
     @classmethod
@@ -937,7 +1217,7 @@ class Regions(dict):
 
     def traverse(self, node=None):
         if not node:
-            return self.traverse(self)
+            return list(self.index.nodes)
         nodes = []
         if 'id' in node:
             nodes.append(node)
@@ -950,19 +1230,15 @@ class Regions(dict):
     def transfer_find(self, val):
         if not val:
             return None
-        nodes = self.traverse()
-        for reg in nodes:
-            if reg.get('_prev_id') == val or reg.get('id') == val:
-                return reg
-        return None
+        return self.index.transfer.get(val)
 
     def find_fuzzy(self, match):
         from app.utils import fuzzy_match
 
-        candidates = {}
-        nodes = self.traverse()
-        for reg in nodes:
-            candidates[reg['id']] = reg.get('name', reg['id'])
+        # names sharing no trigram with match could never reach the cutoff
+        candidates = self.index.fuzzy_candidates(match)
+        if not candidates:
+            return None
         fzm = fuzzy_match(match, candidates)
         # cutoff may need some tweakage here based on experience
         if not fzm or fzm[0]['score'] < 150:
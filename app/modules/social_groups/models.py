@@ -85,62 +85,242 @@ class SocialGroup(db.Model, HoustonModel):
         return DetailedSocialGroupSchema
 
     @classmethod
-    def get_role_data(cls, role_guid):
+    def get_permitted_roles(cls):
+        """
+        The social_group_roles site setting as a dict of role guid to role data
+        """
         from app.modules.site_settings.models import SiteSetting
 
-        permitted_role_data = SiteSetting.get_value('social_group_roles')
-        permitted_role_guids = [role['guid'] for role in permitted_role_data]
-        if role_guid not in permitted_role_guids:
-            return None
-        role_data = [
-            rol_dat for rol_dat in permitted_role_data if rol_dat['guid'] == role_guid
-        ]
-        assert len(role_data) == 1
-        return role_data[0]
+        permitted_role_data = SiteSetting.get_value('social_group_roles') or []
+        return {role['guid']: role for role in permitted_role_data}
 
     @classmethod
-    def site_settings_updated(cls):
-        from app.modules.site_settings.models import SiteSetting
+    def get_role_data(cls, role_guid):
+        return cls.get_permitted_roles().get(role_guid)
 
-        permitted_role_data = SiteSetting.get_value('social_group_roles')
-        all_groups = SocialGroup.query.all()
-        for group in all_groups:
-            current_roles_singular = {}
-            for member in group.members:
-                if not member.roles:
-                    continue
-                if not permitted_role_data:
-                    member.roles = None
-                    with db.session.begin(subtransactions=True):
-                        db.session.merge(member)
-                    continue
-
-                for role in member.roles:
-                    role_data = cls.get_role_data(role)
-                    if not role_data:
-                        # That role not supported anymore
-                        msg = f"member {member.individual_guid} lost role {role} as it's no longer supported"
-                        AuditLog.audit_log_object(log, group, msg)
-                        member.roles.remove(role)
-
-                        # Ensure it's written to the DB
-                        member.roles = member.roles
-                        with db.session.begin(subtransactions=True):
-                            db.session.merge(member)
-                        continue
-
-                    # if a role is now only singular in the group and we have multiple, all we can do is audit it
-                    if role_data['multipleInGroup']:
-                        if current_roles_singular.get(role):
-                            current_roles_singular[role] = False
-                        else:
-                            current_roles_singular[role] = True
-
-                for role in current_roles_singular:
-                    if not current_roles_singular[role]:
-                        msg = f"WARNING: multiple members with {role}. Can't guess which to remove"
+    @classmethod
+    def site_settings_updated(cls, foreground=None):
+        from flask import current_app
+
+        if foreground is None:
+            foreground = current_app.testing
+
+        if foreground:
+            cls.revalidate_roles()
+        else:
+            from .tasks import social_group_revalidate_roles
+
+            social_group_revalidate_roles.delay()
+
+    @classmethod
+    def revalidate_roles(cls):
+        """
+        Drop the member roles that are no longer in the social_group_roles site
+        setting, and audit the groups that now have too many members in a role that
+        is singular
+
+        On PostgreSQL the roles are filtered and counted in the database, elsewhere
+        only the membership (group, individual, roles) columns are read and the
+        changed rows are written with one executemany update.  The audit entries
+        are written with one insert.  Returns the number of memberships changed.
+        """
+        import datetime
+
+        permitted_roles = cls.get_permitted_roles()
+        with db.session.begin(subtransactions=True):
+            if db.engine.dialect.name == 'postgresql':
+                changed, messages = cls._revalidate_member_roles_sql(permitted_roles)
+            else:
+                changed, messages = cls._revalidate_member_roles(permitted_roles)
+            if changed:
+                # The groups' indexed member roles are now out of date
+                group_guids = list({group_guid for group_guid, _ in changed})
+                db.session.execute(
+                    cls.__table__.update()
+                    .where(cls.guid.in_(group_guids))
+                    .values(updated=datetime.datetime.utcnow())
+                )
+
+        # Any memberships already loaded in this session hold the old roles
+        for group_guid, individual_guid in changed:
+            key = db.session.identity_key(
+                SocialGroupIndividualMembership, (group_guid, individual_guid)
+            )
+            member = db.session.identity_map.get(key)
+            if member is not None:
+                db.session.expire(member, ['roles'])
+
+        if messages:
+            groups = cls.query.filter(cls.guid.in_(list(messages))).all()
+            with AuditLog.buffered():
+                for group in groups:
+                    for msg in messages[group.guid]:
                         AuditLog.audit_log_object(log, group, msg)
 
+        return len(changed)
+
+    @classmethod
+    def _revalidate_member_roles(cls, permitted_roles):
+        import collections
+
+        membership_table = SocialGroupIndividualMembership.__table__
+
+        rows = (
+            db.session.query(
+                SocialGroupIndividualMembership.group_guid,
+                SocialGroupIndividualMembership.individual_guid,
+                SocialGroupIndividualMembership.roles,
+            )
+            .filter(SocialGroupIndividualMembership.roles.isnot(None))
+            .order_by(
+                SocialGroupIndividualMembership.group_guid,
+                SocialGroupIndividualMembership.individual_guid,
+            )
+            .all()
+        )
+
+        changes = []
+        messages = collections.defaultdict(list)
+        role_counts = collections.defaultdict(collections.Counter)
+        for group_guid, individual_guid, roles in rows:
+            if not roles:
+                continue
+            if not permitted_roles:
+                changes.append((group_guid, individual_guid, None))
+                continue
+            kept_roles = [role for role in roles if role in permitted_roles]
+            for role in roles:
+                if role not in permitted_roles:
+                    messages[group_guid].append(
+                        f'member {individual_guid} lost role {role} '
+                        "as it's no longer supported"
+                    )
+            if len(kept_roles) != len(roles):
+                changes.append((group_guid, individual_guid, kept_roles))
+            role_counts[group_guid].update(set(kept_roles))
+
+        # if a role is now only singular in the group and we have multiple, all we
+        # can do is audit it
+        for group_guid, counts in role_counts.items():
+            for role, count in counts.items():
+                if count > 1 and not permitted_roles[role]['multipleInGroup']:
+                    messages[group_guid].append(
+                        f'WARNING: multiple members with {role}. '
+                        "Can't guess which to remove"
+                    )
+
+        if changes:
+            db.session.execute(
+                membership_table.update()
+                .where(membership_table.c.group_guid == db.bindparam('_group_guid'))
+                .where(
+                    membership_table.c.individual_guid == db.bindparam('_individual_guid')
+                )
+                .values(roles=db.bindparam('_roles')),
+                [
+                    {
+                        '_group_guid': group_guid,
+                        '_individual_guid': individual_guid,
+                        '_roles': roles,
+                    }
+                    for group_guid, individual_guid, roles in changes
+                ],
+            )
+
+        changed = [change[:2] for change in changes]
+        return changed, messages
+
+    @classmethod
+    def _revalidate_member_roles_sql(cls, permitted_roles):
+        import collections
+
+        table = SocialGroupIndividualMembership.__table__.name
+        # roles hold the JSON encoded list (as a JSON string), #>> '{}' unwraps it
+        member_roles = "(roles #>> '{}')::jsonb"
+        role_list = (
+            f"CASE WHEN jsonb_typeof({member_roles}) = 'array' "
+            f"THEN {member_roles} ELSE '[]'::jsonb END"
+        )
+
+        # the old roles are returned, the audit lists the ones that were dropped
+        rows = db.session.execute(
+            db.text(
+                f"""
+                UPDATE {table} AS member
+                SET roles = CASE
+                    WHEN :clear THEN NULL
+                    WHEN json_typeof(member.roles) = 'string'
+                        THEN to_json(kept.roles::text)
+                    ELSE kept.roles::json
+                END
+                FROM (
+                    SELECT group_guid, individual_guid, {role_list} AS old_roles,
+                        COALESCE(
+                            (
+                                SELECT jsonb_agg(role ORDER BY position)
+                                FROM jsonb_array_elements_text({role_list})
+                                    WITH ORDINALITY AS role_list (role, position)
+                                WHERE role = ANY(:permitted)
+                            ),
+                            '[]'::jsonb
+                        ) AS roles
+                    FROM {table}
+                    WHERE roles IS NOT NULL
+                ) AS kept
+                WHERE member.group_guid = kept.group_guid
+                    AND member.individual_guid = kept.individual_guid
+                    AND jsonb_array_length(kept.roles)
+                        < jsonb_array_length(kept.old_roles)
+                RETURNING member.group_guid, member.individual_guid, kept.old_roles
+                """
+            )
+            .bindparams(clear=not permitted_roles, permitted=list(permitted_roles))
+            .columns(group_guid=db.GUID, individual_guid=db.GUID)
+        ).fetchall()
+        rows.sort(key=lambda row: (row.group_guid, row.individual_guid))
+
+        changed = []
+        messages = collections.defaultdict(list)
+        for group_guid, individual_guid, old_roles in rows:
+            changed.append((group_guid, individual_guid))
+            if not permitted_roles:
+                continue
+            for role in old_roles:
+                if role not in permitted_roles:
+                    messages[group_guid].append(
+                        f'member {individual_guid} lost role {role} '
+                        "as it's no longer supported"
+                    )
+
+        # if a role is now only singular in the group and we have multiple, all we
+        # can do is audit it
+        singular_roles = [
+            guid for guid, role in permitted_roles.items() if not role['multipleInGroup']
+        ]
+        if singular_roles:
+            duplicates = db.session.execute(
+                db.text(
+                    f"""
+                    SELECT group_guid, role
+                    FROM {table},
+                        jsonb_array_elements_text({role_list}) AS role_list (role)
+                    WHERE roles IS NOT NULL AND role = ANY(:singular)
+                    GROUP BY group_guid, role
+                    HAVING COUNT(DISTINCT individual_guid) > 1
+                    ORDER BY group_guid, role
+                    """
+                )
+                .bindparams(singular=singular_roles)
+                .columns(group_guid=db.GUID)
+            )
+            for group_guid, role in duplicates:
+                messages[group_guid].append(
+                    f'WARNING: multiple members with {role}. '
+                    "Can't guess which to remove"
+                )
+
+        return changed, messages
+
     # This is for validating te site settings social group roles format, not the roles of an individual social group
     @classmethod
     def validate_roles(cls, roles_input):
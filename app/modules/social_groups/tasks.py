@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from app.extensions.celery import celery
+
+log = logging.getLogger(__name__)
+
+
+@celery.task
+def social_group_revalidate_roles():
+    from .models import SocialGroup
+
+    changed = SocialGroup.revalidate_roles()
+    log.info(f'Revalidated social group roles, {changed} memberships changed')
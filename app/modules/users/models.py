@@ -392,6 +392,36 @@ class User(db.Model, HoustonModel):
 
         return None
 
+    @classmethod
+    def find_by_emails(cls, emails):
+        """
+        Look up many users by email (like find() without a password) in one query,
+        returns a dict of email to User for the emails that were found
+        """
+        from sqlalchemy import func
+
+        emails = set(emails)
+        candidates = {
+            candidate.lower()
+            for email in emails
+            for candidate in (email, '{}@localhost'.format(email))
+        }
+        if not candidates:
+            return {}
+        users = {
+            user.email.lower(): user
+            for user in cls.query.filter(func.lower(User.email).in_(list(candidates)))
+        }
+
+        found = {}
+        for email in emails:
+            for candidate in (email, '{}@localhost'.format(email)):
+                user = users.get(candidate.lower())
+                if user is not None:
+                    found[email] = user
+                    break
+        return found
+
     @classmethod
     def query_search_term_hook(cls, term):
         from sqlalchemy import String
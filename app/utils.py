@@ -292,3 +292,69 @@ def sizeof(num, suffix='B'):
             return f'{num:3.1f}{unit}{suffix}'
         num /= 1024.0
     return f'{num:.1f}Yi {suffix}'
+
+
+# how long browsers may keep a file that never changes under the same ETag
+IMMUTABLE_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def set_cache_control(response, immutable=False):
+    # files are served behind a login, so only the browser (not shared caches) may keep them
+    if immutable:
+        response.headers[
+            'Cache-Control'
+        ] = f'private, max-age={IMMUTABLE_CACHE_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def not_modified_response(etag, immutable=False):
+    """
+    A 304 response if the request's If-None-Match already has ``etag``, else None
+
+    Checked before touching the file, so revalidation costs no disk access.
+    """
+    from flask import current_app, request
+
+    if not request.if_none_match.contains(etag):
+        return None
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    return set_cache_control(response, immutable)
+
+
+def _accel_redirect_uri(filepath):
+    import os
+
+    from flask import current_app
+
+    location = current_app.config.get('X_ACCEL_REDIRECT_LOCATION')
+    root = current_app.config.get('X_ACCEL_REDIRECT_ROOT')
+    if not location or not root:
+        return None
+    root = os.path.realpath(root)
+    filepath = os.path.realpath(filepath)
+    if os.path.commonpath([root, filepath]) != root:
+        return None
+    return '/'.join([location.rstrip('/'), os.path.relpath(filepath, root)])
+
+
+def send_cached_file(filepath, mimetype, etag, immutable=False):
+    """
+    send_file() with a caller supplied (content-addressed) ETag and Cache-Control
+
+    Range and If-Modified-Since requests are handled by send_file(). If
+    X_ACCEL_REDIRECT_LOCATION is configured the bytes are left for nginx to
+    serve, USE_X_SENDFILE does the same for X-Sendfile capable servers.
+    """
+    from flask import current_app, send_file
+
+    accel_uri = _accel_redirect_uri(filepath)
+    if accel_uri:
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = accel_uri
+    else:
+        response = send_file(filepath, mimetype, add_etags=False, conditional=True)
+    response.set_etag(etag)
+    return set_cache_control(response, immutable)
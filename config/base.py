@@ -135,6 +135,24 @@ class BaseConfig(FlaskConfigOverrides, RedisConfig):
 
     FILEUPLOAD_BASE_PATH = str(DATA_ROOT / 'fileuploads')
 
+    # background export artifacts, shared between the web and celery workers
+    EXPORT_DATABASE_PATH = str(DATA_ROOT / 'exports')
+
+    # let the web server send files (asset renditions, heatmaps) instead of the app:
+    # X-Sendfile via Flask's USE_X_SENDFILE, or nginx X-Accel-Redirect with an internal
+    # location that maps onto X_ACCEL_REDIRECT_ROOT
+    USE_X_SENDFILE = bool(int(_getenv('USE_X_SENDFILE', 0)))
+    X_ACCEL_REDIRECT_LOCATION = _getenv('X_ACCEL_REDIRECT_LOCATION', None)
+    X_ACCEL_REDIRECT_ROOT = str(DATA_ROOT)
+
+    # opt-in per request/task SQL and external call profiling (Prometheus histograms),
+    # with the full trace logged for anything slower than PROFILING_SLOW_SECONDS
+    PROFILING_ENABLED = bool(int(_getenv('PROFILING_ENABLED', 0)))
+    PROFILING_SLOW_SECONDS = float(_getenv('PROFILING_SLOW_SECONDS', 5))
+
+    # audit log entries older than this are pruned periodically, unset keeps them forever
+    AUDIT_LOG_RETENTION_DAYS = _getenv('AUDIT_LOG_RETENTION_DAYS', None)
+
     @property
     def SQLALCHEMY_DATABASE_URI(self):
         try:
@@ -233,6 +251,10 @@ class EmailConfig(object):
     DEFAULT_EMAIL_SERVICE = _getenv('DEFAULT_EMAIL_SERVICE')
     DEFAULT_EMAIL_SERVICE_USERNAME = _getenv('DEFAULT_EMAIL_SERVICE_USERNAME')
     DEFAULT_EMAIL_SERVICE_PASSWORD = _getenv('DEFAULT_EMAIL_SERVICE_PASSWORD')
+    # reconnect to the SMTP server after this many messages on one connection
+    MAIL_MAX_EMAILS = int(_getenv('MAIL_MAX_EMAILS', 100))
+    # digest users get at most one notification email per this many seconds
+    NOTIFICATION_DIGEST_WINDOW = int(_getenv('NOTIFICATION_DIGEST_WINDOW', 24 * 60 * 60))
 
     @property
     def MAIL_DEFAULT_SENDER(self):
@@ -342,6 +364,11 @@ class AssetGroupConfig(object):
     GITLAB_REMOTE_LOGIN_PAT = _getenv('GITLAB_REMOTE_LOGIN_PAT')
     # FIXME: Note, if you change the SSH key, you should also delete the ssh_id file (see GIT_SSH_KEY_FILEPATH)
     GIT_SSH_KEY = _getenv('GIT_SSH_KEY')
+    # seconds a local clone is trusted before it is pulled again, the remotes are
+    # also checked for new commits periodically (git_store_check_remotes)
+    GIT_STORE_SYNC_TTL = int(_getenv('GIT_STORE_SYNC_TTL', 60 * 60))
+    # seconds queued commits and pushes to a store wait to be coalesced
+    GIT_STORE_COMMIT_WINDOW = int(_getenv('GIT_STORE_COMMIT_WINDOW', 30))
 
     #: using lowercase so Flask won't pick it up as a legit setting
     default_git_ssh_key_filepath = DATA_ROOT / 'id_ssh_key'
@@ -497,13 +497,16 @@ class SetOperationsJSONParameters(Parameters):
         """
         Performs all necessary operations by calling class methods with
         corresponding names.
+
+        The sets can hold objects or just their keys (e.g. GUIDs), whichever
+        ``resolve()`` returns, as long as they are instances of ``obj_cls``.
         """
         working_set = set()
 
         if starting_set is not None:
             for starting_obj in starting_set:
                 assert isinstance(starting_obj, obj_cls)
-                working_set.add(starting_obj)
+            working_set = set(starting_set)
 
         identity_state = {}
         for operation in operations:
@@ -539,7 +542,9 @@ class SetOperationsJSONParameters(Parameters):
         if field_operaion in cls.OP_IDENTITY:
             return cls.identity(working_set, identity_state, field_name, field_value)
 
-        resolved_set = set(cls.resolve(field_name, field_value, obj=obj))
+        resolved_set = cls.resolve(field_name, field_value, obj=obj)
+        if not isinstance(resolved_set, (set, frozenset)):
+            resolved_set = set(resolved_set)
 
         for resolved_obj in resolved_set:
             assert isinstance(resolved_obj, obj_cls)
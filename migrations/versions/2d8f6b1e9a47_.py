@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""empty message
+
+Revision ID: 2d8f6b1e9a47
+Revises: 9c3e5a7d2b14
+Create Date: 2024-03-11 09:47:22.604318
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '2d8f6b1e9a47'
+down_revision = '9c3e5a7d2b14'
+
+
+def _guid_columns(bind, length):
+    # GUID is the only CHAR(32) (or BINARY(16)) column type
+    inspector = sa.inspect(bind)
+    guid_columns = {}
+    for table in inspector.get_table_names():
+        if table == 'alembic_version':
+            continue
+        columns = [
+            column['name']
+            for column in inspector.get_columns(table)
+            if isinstance(column['type'], (sa.CHAR, sa.BINARY))
+            and getattr(column['type'], 'length', None) == length
+        ]
+        if columns:
+            guid_columns[table] = columns
+    return guid_columns
+
+
+def _convert_sqlite(bind, guid_columns, type_, existing_type, convert):
+    for table, columns in guid_columns.items():
+        # sqlite copies the values over as they are (columns are untyped)
+        with op.batch_alter_table(table, recreate='always') as batch_op:
+            for column in columns:
+                batch_op.alter_column(column, existing_type=existing_type, type_=type_)
+        for column in columns:
+            table_ = sa.table(table, sa.column(column))
+            values = bind.execute(sa.select([table_.c[column]]).distinct()).fetchall()
+            for (value,) in values:
+                converted = convert(value)
+                if converted is not None:
+                    bind.execute(
+                        table_.update()
+                        .where(table_.c[column] == value)
+                        .values({column: converted})
+                    )
+
+
+def _convert_mysql(bind, guid_columns, type_, length, convert):
+    # Altering CHAR(32) straight to BINARY(16) would truncate the hex strings, so
+    # each column goes through VARBINARY(32) (the bytes are kept as they are), has
+    # its values converted in place with UNHEX() / HEX() and is then narrowed to
+    # its final type.  The columns keep their keys and indexes; foreign key checks
+    # are off while the two sides of each key briefly disagree.
+    bind.execute('SET FOREIGN_KEY_CHECKS = 0')
+    try:
+        for table, columns in guid_columns.items():
+            for column in columns:
+                nullable = _is_nullable(bind, table, column)
+                op.alter_column(
+                    table,
+                    column,
+                    type_=sa.VARBINARY(32),
+                    existing_nullable=nullable,
+                )
+                converted = convert.format(f'`{column}`')
+                op.execute(
+                    f'UPDATE `{table}` SET `{column}` = {converted} '
+                    f'WHERE LENGTH(`{column}`) = {length}'
+                )
+                op.alter_column(
+                    table,
+                    column,
+                    type_=type_,
+                    existing_type=sa.VARBINARY(32),
+                    existing_nullable=nullable,
+                )
+    finally:
+        bind.execute('SET FOREIGN_KEY_CHECKS = 1')
+
+
+def _is_nullable(bind, table, column):
+    for column_ in sa.inspect(bind).get_columns(table):
+        if column_['name'] == column:
+            return column_['nullable']
+    return True
+
+
+def upgrade():
+    """
+    Upgrade Semantic Description:
+        Store GUIDs as BINARY(16) instead of CHAR(32) hex strings outside PostgreSQL
+
+    PostgreSQL already uses its native UUID type and is left as it is, as is any
+    backend other than MySQL or SQLite.
+    """
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        # native UUID, nothing to do
+        return
+
+    def to_bytes(value):
+        if isinstance(value, str) and len(value) == 32:
+            return bytes.fromhex(value)
+        return None
+
+    guid_columns = _guid_columns(bind, 32)
+    if bind.dialect.name == 'mysql':
+        _convert_mysql(bind, guid_columns, sa.BINARY(16), 32, 'UNHEX({})')
+    elif bind.dialect.name == 'sqlite':
+        _convert_sqlite(bind, guid_columns, sa.BINARY(16), sa.CHAR(32), to_bytes)
+
+
+def downgrade():
+    """
+    Downgrade Semantic Description:
+        Store GUIDs as CHAR(32) hex strings again outside PostgreSQL
+    """
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        return
+
+    def to_hex(value):
+        if isinstance(value, bytes) and len(value) == 16:
+            return value.hex()
+        return None
+
+    guid_columns = _guid_columns(bind, 16)
+    if bind.dialect.name == 'mysql':
+        _convert_mysql(bind, guid_columns, sa.CHAR(32), 16, 'LOWER(HEX({}))')
+    elif bind.dialect.name == 'sqlite':
+        _convert_sqlite(bind, guid_columns, sa.CHAR(32), sa.BINARY(16), to_hex)
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""empty message
+
+Revision ID: 5e1a8c4f7b20
+Revises: 2d8f6b1e9a47
+Create Date: 2024-03-18 11:05:39.214870
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '5e1a8c4f7b20'
+down_revision = '2d8f6b1e9a47'
+
+
+def upgrade():
+    """
+    Upgrade Semantic Description:
+        Index names by (context, value) for looking up individuals by name
+    """
+    with op.batch_alter_table('name', schema=None) as batch_op:
+        batch_op.create_index('ix_name_context_value', ['context', 'value'], unique=False)
+
+
+def downgrade():
+    """
+    Downgrade Semantic Description:
+        Remove the (context, value) names index
+    """
+    with op.batch_alter_table('name', schema=None) as batch_op:
+        batch_op.drop_index('ix_name_context_value')
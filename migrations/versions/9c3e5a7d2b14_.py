@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""empty message
+
+Revision ID: 9c3e5a7d2b14
+Revises: 4b7e2f9c1a3d
+Create Date: 2024-03-04 14:12:41.530871
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '9c3e5a7d2b14'
+down_revision = '4b7e2f9c1a3d'
+
+
+TABLES = ['encounter', 'sighting', 'individual']
+
+
+def upgrade():
+    """
+    Upgrade Semantic Description:
+        Store custom_fields as JSONB (they were JSON encoded strings) with a GIN index
+    """
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(
+                'custom_fields',
+                existing_type=sa.JSON(),
+                type_=postgresql.JSONB(astext_type=sa.Text()),
+                existing_nullable=True,
+                postgresql_using="(custom_fields #>> '{}')::jsonb",
+            )
+            batch_op.create_index(
+                f'ix_{table}_custom_fields',
+                ['custom_fields'],
+                unique=False,
+                postgresql_using='gin',
+            )
+
+
+def downgrade():
+    """
+    Downgrade Semantic Description:
+        Store custom_fields as JSON encoded strings again
+    """
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(f'ix_{table}_custom_fields')
+            batch_op.alter_column(
+                'custom_fields',
+                existing_type=postgresql.JSONB(astext_type=sa.Text()),
+                type_=sa.JSON(),
+                existing_nullable=True,
+                postgresql_using='to_json(custom_fields::text)',
+            )
@@ -56,26 +56,28 @@ def results(context):
 @app_context_task(
     help={
         'model': 'The name of the model to index',
+        'resume': 'Pick up after the last batch of an interrupted run',
     }
 )
-def sync(context, model=None):
+def sync(context, model=None, resume=False):
     """
     Sync (push to Sage) the records for a given model, if specified, otherwise all models
     """
-    _sync_worker(model=model)
+    _sync_worker(model=model, resume=resume)
     status(context)
 
 
 @app_context_task(
     help={
         'model': 'The name of the model to index',
+        'resume': 'Pick up after the last batch of an interrupted run',
     }
 )
-def ensure(context, model=None):
+def ensure(context, model=None, resume=False):
     """
     Check the records for a given model, if specified, otherwise all models
     """
-    _sync_worker(model=model, ensure=True)
+    _sync_worker(model=model, ensure=True, resume=resume)
     status(context)
 
 
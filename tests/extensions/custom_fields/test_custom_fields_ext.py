@@ -586,3 +586,43 @@ def test_definition_manipulation(flask_app, flask_app_client, admin_user):
     )
     defn = SiteSettingCustomFields.get_definition('Sighting', cfd_id)
     assert not defn
+
+
+@pytest.mark.skipif(module_unavailable('sightings'), reason='Sightings module disabled')
+def test_query_custom_fields(
+    flask_app, flask_app_client, admin_user, researcher_1, test_root, request, db
+):
+    from app.modules.site_settings.helpers import SiteSettingCustomFields
+    from app.modules.sightings.models import Sighting
+
+    uuids = sighting_utils.create_sighting(
+        flask_app_client,
+        researcher_1,
+        request,
+        test_root,
+    )
+    sight = Sighting.query.get(uuids['sighting'])
+
+    cfd_id = setting_utils.custom_field_create(
+        flask_app_client,
+        admin_user,
+        'test_query_cfd',
+    )
+    multiple_cfd_id = setting_utils.custom_field_create(
+        flask_app_client,
+        admin_user,
+        'test_query_multiple_cfd',
+        displayType='integer',
+        multiple=True,
+    )
+    assert Sighting.query_custom_fields({cfd_id: None}).count() == 0
+    assert not SiteSettingCustomFields._find_data(cfd_id, 'Sighting')
+
+    sight.set_custom_field_values({cfd_id: 'needle', multiple_cfd_id: [1, 2]})
+    assert Sighting.query_custom_fields({cfd_id: None}).all() == [sight]
+    assert Sighting.query_custom_fields({cfd_id: 'needle'}).all() == [sight]
+    assert Sighting.query_custom_fields({cfd_id: 'haystack'}).count() == 0
+    assert Sighting.query_custom_fields({multiple_cfd_id: 2}).all() == [sight]
+    both = {cfd_id: 'needle', multiple_cfd_id: 3}
+    assert Sighting.query_custom_fields(both).count() == 0
+    assert SiteSettingCustomFields._find_data(cfd_id, 'Sighting') == [sight]
@@ -59,6 +59,67 @@ def test_export_api(
     export_utils.clear_files()
 
 
+@pytest.mark.skipif(
+    extension_unavailable('export') or module_unavailable('sightings'),
+    reason='Export extension disabled, or Sighting module is disabled',
+)
+def test_export_background(
+    flask_app,
+    flask_app_client,
+    researcher_1,
+    researcher_2,
+    test_root,
+    request,
+    db,
+):
+    import shutil
+
+    from app.extensions.export.models import Export
+    from app.modules.progress.models import Progress
+    from app.modules.sightings.models import Sighting
+
+    uuids = sighting_utils.create_sighting(
+        flask_app_client,
+        researcher_1,
+        request,
+        test_root,
+    )
+    sighting_guid = uuids['sighting']
+    Sighting.query.get(sighting_guid).index()
+    wait_for_elasticsearch_status(flask_app_client, researcher_1)
+
+    query = {'term': {'guid': sighting_guid}}
+    resp = export_utils.export_background(flask_app_client, researcher_1, query)
+    progress_guid = resp.json['progress_guid']
+    request.addfinalizer(lambda: Progress.query.get(progress_guid).delete())
+    request.addfinalizer(
+        lambda: shutil.rmtree(Export.background_directory(progress_guid), True)
+    )
+    assert Progress.query.get(progress_guid).complete
+
+    # only the user who started the export can fetch the artifact
+    resp = export_utils.export_download(flask_app_client, researcher_1, progress_guid)
+    assert resp.content_type == 'application/vnd.ms-excel'
+    assert resp.content_length > 1000
+    export_utils.export_download(flask_app_client, researcher_2, progress_guid, 404)
+
+    # nothing researcher_2 can export, so the job fails and there is nothing to fetch
+    resp = export_utils.export_background(flask_app_client, researcher_2, query)
+    failed_guid = resp.json['progress_guid']
+    request.addfinalizer(lambda: Progress.query.get(failed_guid).delete())
+    request.addfinalizer(
+        lambda: shutil.rmtree(Export.background_directory(failed_guid), True)
+    )
+    failed = Progress.query.get(failed_guid)
+    assert failed.failed
+    resp = export_utils.export_download(flask_app_client, researcher_2, failed_guid, 404)
+    assert resp.json['message'] == failed.message
+
+    # the failure message is only shown to the user who started the export
+    resp = export_utils.export_download(flask_app_client, researcher_1, failed_guid, 404)
+    assert resp.json['message'] == 'Export not found'
+
+
 @pytest.mark.skipif(
     extension_unavailable('export') or module_unavailable('sightings'),
     reason='Export extension disabled, or Sighting module is disabled',
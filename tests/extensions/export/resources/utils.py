@@ -28,6 +28,36 @@ def export_search(
     return resp
 
 
+def export_background(
+    flask_app_client,
+    user,
+    data,
+    class_name='sightings',
+    expected_status_code=200,
+):
+    resp = test_utils.post_via_flask(
+        flask_app_client,
+        user,
+        f'{class_name}:read',
+        f'/api/v1/{class_name}/export/background',
+        data,
+        expected_status_code,
+        {'progress_guid'},
+    )
+    return resp
+
+
+def export_download(flask_app_client, user, progress_guid, expected_status_code=200):
+    return test_utils.get_dict_via_flask(
+        flask_app_client,
+        user,
+        [],
+        f'/api/v1/export/{progress_guid}',
+        expected_status_code,
+        None,
+    )
+
+
 def clear_files():
     import glob
     import os
@@ -136,3 +136,26 @@ def test_export_misc(
     assert saved_name == fname
     assert os.path.exists(export.filepath)
     os.remove(export.filepath)
+
+
+@pytest.mark.skipif(
+    extension_unavailable('export'),
+    reason='Export extension disabled',
+)
+def test_exportable_search(flask_app, researcher_1):
+    from app.extensions.export.models import Export
+
+    exporters = {'match': {'exporters': str(researcher_1.guid)}}
+    assert Export.exportable_search({}, researcher_1) == {
+        'bool': {'filter': [exporters]}
+    }
+    query = {'term': {'guid': 'abc'}}
+    assert Export.exportable_search(query, researcher_1) == {
+        'bool': {'filter': [query, exporters]}
+    }
+
+    # user=None falls back to current_user, outside of a request there is none so
+    # nothing is exportable
+    export = Export(user=None)
+    assert not export.user
+    assert export.exportable_guids(None, query) == []
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from app.extensions.prometheus import profiling
+
+
+def test_profile_slow_trace(monkeypatch, caplog):
+    monkeypatch.setattr(profiling, '_enabled', True)
+    monkeypatch.setattr(profiling, '_slow_seconds', 0)
+
+    @profiling.profiled('test.lookup')
+    def lookup():
+        profile = profiling.current_profile.get()
+        for _ in range(3):
+            profile.add_query('SELECT * FROM sighting WHERE guid = ?', 0.001)
+        with profiling.external_call('SAGE', 'GET /api/engine/job/'):
+            pass
+
+    token = profiling.start_profile('request', 'GET /api/v1/sightings/<uuid:sighting_guid>')
+    lookup()
+    with caplog.at_level(logging.WARNING, logger=profiling.log.name):
+        profile = profiling.finish_profile(token)
+
+    assert profiling.current_profile.get() is None
+    assert profile.queries == 3
+    assert profile.external['SAGE'][0] == 1
+    assert len(profile.trace) == 4
+
+    assert 'Slow request GET /api/v1/sightings/<uuid:sighting_guid>' in caplog.text
+    assert 'repeated 3x: SELECT * FROM sighting WHERE guid = ?' in caplog.text
+    assert 'SAGE: GET /api/engine/job/' in caplog.text
+
+
+def test_profile_disabled(monkeypatch):
+    monkeypatch.setattr(profiling, '_enabled', False)
+
+    assert profiling.start_profile('task', 'app.tasks.example') is None
+    assert profiling.finish_profile(None) is None
+    with profiling.external_call('EDM'):
+        pass
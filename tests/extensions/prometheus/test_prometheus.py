@@ -238,7 +238,6 @@ def test_init(request):
     patches = []
     functions = {}
     for path in (
-        'app.extensions.prometheus._attach_flask_callbacks',
         'app.extensions.prometheus._attach_sqlalchemy_listeners',
         'app.extensions.prometheus._update_info',
         'app.extensions.prometheus._update_models',
@@ -252,8 +251,6 @@ def test_init(request):
     app = mock.Mock()
     init(app, 'a', b='c')
 
-    assert functions['_attach_flask_callbacks'].call_count == 1
-    assert functions['_attach_flask_callbacks'].call_args == mock.call(app)
     assert functions['_attach_sqlalchemy_listeners'].call_count == 1
     assert functions['_attach_sqlalchemy_listeners'].call_args == mock.call(app)
     assert functions['_update_info'].call_count == 1
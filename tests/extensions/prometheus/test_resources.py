@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-import json
+import uuid
 
 import pytest
 
@@ -9,19 +9,9 @@ from tests.utils import module_unavailable
 
 @pytest.mark.skipif(module_unavailable('encounters'), reason='Encounters module disabled')
 def test(flask_app, flask_app_client):
-    from app.modules.users.models import User
-
     client = flask_app.test_client()
 
-    user = User.query.filter(
-        User.email == flask_app.config['OAUTH_USER']['email']
-    ).first()
-    with flask_app_client.login(
-        user, auth_scopes=('prometheus:read', 'prometheus:write')
-    ):
-        data = json.dumps(update())
-        response = flask_app_client.post('/api/v1/prometheus/', json=data)
-        assert response.status_code == 200
+    update()
 
     response = client.get('/metrics')
     lines = response.data.decode('utf-8').splitlines()
@@ -29,3 +19,27 @@ def test(flask_app, flask_app_client):
     assert models_line
     logins_lines = [line for line in lines if line.startswith('logins')]
     assert logins_lines
+
+
+def test_request_metrics_by_route(flask_app):
+    client = flask_app.test_client()
+
+    # different guids, same route
+    guids = [str(uuid.uuid4()) for _ in range(2)]
+    for guid in guids:
+        client.get(f'/api/v1/assets/{guid}').close()
+
+    response = client.get('/metrics')
+    metrics = response.data.decode('utf-8')
+    assert not any(guid in metrics for guid in guids)
+
+    lines = metrics.splitlines()
+    route = 'route="/api/v1/assets/<uuid:asset_guid>"'
+    route_lines = [line for line in lines if route in line]
+    assert [line for line in route_lines if line.startswith('requests_total')]
+    assert [
+        line
+        for line in route_lines
+        if line.startswith('request_duration_seconds_bucket')
+    ]
+    assert [line for line in lines if line.startswith('requests_in_flight')]
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-docstring
+import uuid
+from unittest import mock
+
+import pytest
+
+from tests import utils
+from tests.utils import extension_unavailable, module_unavailable
+
+
+@pytest.mark.skipif(extension_unavailable('sage'), reason='Sage extension disabled')
+@pytest.mark.skipif(module_unavailable('assets'), reason='Assets module disabled')
+def test_sync_all_with_sage(flask_app, db, test_empty_asset_group_uuid, request):
+    import concurrent.futures
+
+    from app.extensions.sage import SageModel
+    from app.modules.assets.models import Asset
+
+    asset_group_guid = test_empty_asset_group_uuid
+    assets = [utils.generate_asset_instance(asset_group_guid) for _ in range(5)]
+    with db.session.begin():
+        for asset in assets:
+            db.session.add(asset)
+
+    def cleanup():
+        with db.session.begin():
+            for asset in assets:
+                db.session.delete(asset)
+
+    request.addfinalizer(cleanup)
+    assets.sort(key=lambda asset: asset.guid)
+    guids = {asset.guid for asset in assets}
+
+    uploaded = []
+    failing = {assets[2].guid}
+
+    def prepare_sage_sync(asset, **kwargs):
+        if asset.guid not in guids or asset.content_guid is not None:
+            return None
+        guid = asset.guid
+
+        def upload():
+            if guid in failing:
+                raise RuntimeError('Sage upload failed')
+            uploaded.append(guid)
+            return uuid.uuid4()
+
+        return upload
+
+    checkpoints = {}
+
+    def set_persisted_value(key, value):
+        checkpoints[key] = value
+
+    with mock.patch.object(
+        flask_app.sage, 'request_passthrough_result', return_value=[]
+    ), mock.patch.object(
+        Asset, 'prepare_sage_sync', autospec=True, side_effect=prepare_sage_sync
+    ), mock.patch.object(
+        Asset, 'sage_sync_failed', SageModel.sage_sync_failed
+    ), mock.patch(
+        'app.utils.get_persisted_value', side_effect=checkpoints.get
+    ), mock.patch(
+        'app.utils.set_persisted_value', side_effect=set_persisted_value
+    ):
+        # the rest of the batch is saved before the failure is raised
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            with pytest.raises(RuntimeError, match='Sage upload failed'):
+                Asset.sync_batch_with_sage(assets, executor)
+        for asset in assets:
+            db.session.refresh(asset)
+        assert assets[2].content_guid is None
+        assert {asset.guid for asset in assets if asset.content_guid} == guids - failing
+        assert sorted(uploaded) == sorted(guids - failing)
+
+        with db.session.begin():
+            for asset in assets:
+                asset.content_guid = None
+        uploaded.clear()
+
+        # a sync interrupted part way through keeps the last batch that finished
+        failing.clear()
+        failing.add(assets[3].guid)
+        with pytest.raises(RuntimeError, match='Sage upload failed'):
+            Asset.sync_all_with_sage(batch_size=2, workers=2)
+        checkpoint = Asset.get_sage_sync_checkpoint()
+        assert checkpoint is None or checkpoint < assets[3].guid
+
+        # resuming sends only what Sage does not have yet
+        failing.clear()
+        Asset.sync_all_with_sage(resume=True, batch_size=2, workers=2)
+        for asset in assets:
+            db.session.refresh(asset)
+        assert all(asset.content_guid for asset in assets)
+        assert sorted(uploaded) == sorted(guids)
+        assert Asset.get_sage_sync_checkpoint() is None
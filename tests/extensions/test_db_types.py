@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import copy
 import datetime
 import uuid
 
@@ -35,3 +36,61 @@ def test_json(db):
         'test_datetime': test_datetime,
         'plain': 'text',
     }
+
+
+def test_json_change_detection(db):
+    class ExampleJsonChanges(db.Model):
+        guid = db.Column(db.GUID, default=uuid.uuid4, primary_key=True)
+        value = db.Column(db.JSON, nullable=True)
+
+    db.create_all()
+    example = ExampleJsonChanges(value={'jobs': {'job': {'active': True}}})
+    with db.session.begin():
+        db.session.add(example)
+
+    # merging (or assigning an equal value) does not make the column dirty
+    example = ExampleJsonChanges.query.get(example.guid)
+    db.session.merge(example)
+    assert not db.session.is_modified(example)
+    example.value = {'jobs': {'job': {'active': True}}}
+    assert not db.session.is_modified(example)
+
+    # but editing it in place, however deeply, does
+    example.value['jobs']['job']['active'] = False
+    db.session.merge(example)
+    assert db.session.is_modified(example)
+    with db.session.begin():
+        db.session.merge(example)
+    db.session.refresh(example)
+    assert example.value == {'jobs': {'job': {'active': False}}}
+
+    # copies can be edited freely
+    copied = copy.deepcopy(example.value)
+    copied['jobs'] = {}
+    assert example.value['jobs']
+    db.session.delete(example)
+
+
+def test_guid_conversions():
+    from types import SimpleNamespace
+
+    from app.extensions import GUID
+
+    guid = uuid.uuid4()
+    postgresql = SimpleNamespace(name='postgresql')
+    sqlite = SimpleNamespace(name='sqlite')
+    guid_type = GUID()
+
+    # uuid.UUID objects go to and from the postgresql driver as they are
+    assert guid_type.process_bind_param(guid, postgresql) is guid
+    assert guid_type.process_bind_param(str(guid), postgresql) == str(guid)
+    assert guid_type.process_result_value(guid, postgresql) is guid
+
+    # everywhere else they are 16 bytes
+    assert guid_type.process_bind_param(guid, sqlite) == guid.bytes
+    assert guid_type.process_bind_param(str(guid), sqlite) == guid.bytes
+    assert guid_type.process_bind_param(guid.hex, sqlite) == guid.bytes
+    assert guid_type.process_result_value(guid.bytes, sqlite) == guid
+    # as read from databases still storing CHAR(32)
+    assert guid_type.process_result_value(guid.hex, sqlite) == guid
+    assert guid_type.process_bind_param(None, sqlite) is None
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import pathlib
 import uuid
 
 import pytest
@@ -240,3 +241,222 @@ def test_asset_group_sighting_config_field_getter(researcher_1, request):
     assert config_field_getter('name', default='value')(ags) == 'value'
     assert config_field_getter('name', default=1, cast=int)(ags) == 1
     assert config_field_getter('name', cast=int)(ags) is None
+
+
+@pytest.mark.skipif(
+    module_unavailable('asset_groups'), reason='AssetGroups module disabled'
+)
+def test_asset_group_sync_ttl(flask_app, admin_user, request, tmp_path):
+    import shutil
+    import time
+    from unittest import mock
+
+    import git
+
+    from app.modules.asset_groups.models import AssetGroup
+
+    # The remote is a bare repository next to a clone acting as another houston
+    remote_path = tmp_path / 'remote.git'
+    git.Repo.init(remote_path, bare=True, initial_branch='master')
+    other = git.Repo.clone_from(str(remote_path), tmp_path / 'other')
+    (tmp_path / 'other' / 'metadata.json').write_text('{}')
+    other.index.add(['metadata.json'])
+    other.index.commit('first')
+    other.git.push('origin', 'HEAD:master')
+
+    asset_group = AssetGroup(guid=uuid.uuid4(), owner_guid=admin_user.guid)
+    local_path = asset_group.get_absolute_path()
+    request.addfinalizer(lambda: shutil.rmtree(local_path, ignore_errors=True))
+    git.Repo.clone_from(str(remote_path), local_path)
+
+    assert asset_group.get_sync_state() == {}
+    assert asset_group.is_stale()
+    asset_group.ensure_repository()
+    assert not asset_group.is_stale()
+    remote = asset_group.get_sync_state()['remote']
+    assert remote == other.head.commit.hexsha
+    assert asset_group.get_remote_head() == remote
+
+    # Fresh clones are not pulled again, even on write paths
+    with mock.patch.object(AssetGroup, 'git_pull') as git_pull:
+        asset_group.ensure_repository()
+        assert git_pull.call_count == 0
+
+    # Once stale, read paths queue the pull instead of waiting for it
+    asset_group.set_sync_state(synced=time.time() - 2 * 60 * 60)
+    with mock.patch.object(AssetGroup, 'git_pull_delay') as git_pull_delay:
+        asset_group.ensure_repository(sync=False)
+        assert git_pull_delay.call_count == 1
+
+    # New commits on the remote show up through ls-remote and are pulled
+    (tmp_path / 'other' / 'metadata.json').write_text('{"second": true}')
+    other.index.add(['metadata.json'])
+    other.index.commit('second')
+    other.git.push('origin', 'HEAD:master')
+    assert asset_group.get_remote_head() == other.head.commit.hexsha
+    asset_group.ensure_repository()
+    assert asset_group.get_sync_state()['remote'] == other.head.commit.hexsha
+    assert (pathlib.Path(local_path) / 'metadata.json').read_text() == '{"second": true}'
+
+
+@pytest.mark.skipif(
+    module_unavailable('asset_groups'), reason='AssetGroups module disabled'
+)
+def test_asset_group_commit_changes(flask_app, admin_user, request):
+    import shutil
+
+    from app.modules.asset_groups.models import AssetGroup
+
+    asset_group = AssetGroup(guid=uuid.uuid4(), owner_guid=admin_user.guid)
+    local_path = pathlib.Path(asset_group.get_absolute_path())
+    request.addfinalizer(lambda: shutil.rmtree(local_path, ignore_errors=True))
+    repo = asset_group.ensure_repository()
+
+    with asset_group.git_lock():
+        first = asset_group.git_commit_changes('first', repo)
+    assert first is not None
+    assert asset_group.commit == first.hexsha
+
+    # Nothing changed, nothing committed
+    with asset_group.git_lock():
+        assert asset_group.git_commit_changes('empty', repo) is None
+
+    # Only the changed file is staged, files outside the tracked paths are ignored
+    (local_path / '_uploads' / 'new.txt').write_text('new')
+    (local_path / 'scratch.txt').write_text('not tracked')
+    with asset_group.git_lock():
+        second = asset_group.git_commit_changes('second', repo)
+    assert set(second.stats.files) == {'_uploads/new.txt'}
+    assert repo.head.commit == second
+
+
+@pytest.mark.skipif(
+    module_unavailable('asset_groups', 'individuals'),
+    reason='AssetGroups/Individuals module disabled',
+)
+def test_asset_group_metadata_bulk_validation(
+    db, researcher_1, empty_individual, request
+):
+    import time
+
+    from sqlalchemy import event
+
+    from app.modules.asset_groups.metadata import (
+        AssetGroupMetadata,
+        AssetGroupMetadataError,
+    )
+
+    request.addfinalizer(empty_individual.delete)
+    with db.session.begin(subtransactions=True):
+        db.session.add(empty_individual)
+
+    encounters = [
+        {
+            'ownerEmail': researcher_1.email,
+            'individualUuid': str(empty_individual.guid),
+            'decimalLatitude': '10.5',
+            'decimalLongitude': 20,
+            'time': '2022-01-01T12:00:00+00:00',
+            'timeSpecificity': 'time',
+            'sex': 'female',
+        }
+        for _ in range(5000)
+    ]
+
+    statements = []
+
+    def count_statements(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count_statements)
+    try:
+        start = time.time()
+        owner_assignment = AssetGroupMetadata.validate_encounters(
+            encounters, 'Encounter 1.'
+        )
+        elapsed = time.time() - start
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count_statements)
+
+    assert owner_assignment
+    assert encounters[0]['decimalLatitude'] == 10.5
+    # owners and individuals are each looked up once, not per encounter
+    assert len(statements) <= 4
+    assert elapsed < 10
+
+    # unknown references are still reported against their encounter
+    encounters[-1]['individualUuid'] = str(uuid.uuid4())
+    with pytest.raises(AssetGroupMetadataError) as error:
+        AssetGroupMetadata.validate_encounters(encounters, 'Encounter 1.')
+    assert 'Encounter 1.5000 individual' in str(error.value.message)
+    assert 'not found' in str(error.value.message)
+
+    encounters[-1]['individualUuid'] = str(empty_individual.guid)
+    encounters[0]['ownerEmail'] = 'nobody@example.org'
+    with pytest.raises(AssetGroupMetadataError) as error:
+        AssetGroupMetadata.validate_encounters(encounters, 'Encounter 1.')
+    assert 'Encounter 1.1 owner nobody@example.org not found' in str(error.value.message)
+
+
+@pytest.mark.skipif(
+    module_unavailable('asset_groups', 'sightings', 'encounters'),
+    reason='AssetGroups/Sightings/Encounters module disabled',
+)
+def test_asset_group_sighting_commit_rollback(db, researcher_1, request):
+    import datetime
+
+    from app.modules.asset_groups.models import (
+        AssetGroup,
+        AssetGroupSighting,
+        AssetGroupSightingStage,
+    )
+    from app.modules.audit_logs.models import AuditLog
+    from app.modules.encounters.models import Encounter
+    from app.modules.sightings.models import Sighting
+
+    asset_group = AssetGroup(owner=researcher_1)
+    request.addfinalizer(asset_group.delete)
+    sighting_config = test_utils.dummy_sighting_info()
+    # The second encounter fails, after the first has been created
+    bad_encounter = test_utils.dummy_encounter_data()
+    bad_encounter['time'] = 'not a time'
+    sighting_config['encounters'].append(bad_encounter)
+    ags = AssetGroupSighting(
+        asset_group=asset_group,
+        sighting_config=sighting_config,
+        detection_configs=test_utils.dummy_detection_info(),
+    )
+    ags.setup()
+    request.addfinalizer(ags.delete)
+    ensure_encounter_guids(db, ags)
+    with db.session.begin(subtransactions=True):
+        ags.stage = AssetGroupSightingStage.curation
+        db.session.merge(ags)
+    encounter_guids = [enc['guid'] for enc in ags.sighting_config['encounters']]
+    num_sightings = Sighting.query.count()
+    start = datetime.datetime.utcnow()
+
+    with pytest.raises(HoustonException) as exc:
+        ags.commit()
+    assert 'Problem with creating encounter [1]' in str(exc.value)
+
+    # Nothing of the sighting is left behind and the AGS can be committed again
+    db.session.refresh(ags)
+    assert ags.stage == AssetGroupSightingStage.curation
+    assert ags.get_sighting_guid() is None
+    assert (
+        Encounter.query.filter(
+            Encounter.asset_group_sighting_encounter_guid.in_(encounter_guids)
+        ).count()
+        == 0
+    )
+    assert Sighting.query.count() == num_sightings
+    # and the audit entries for the rolled back encounters were never written
+    assert (
+        AuditLog.query.filter(
+            AuditLog.module_name == 'Encounter',
+            AuditLog.message.contains(f'for owner {researcher_1.guid}'),
+            AuditLog.created >= start,
+        ).count()
+        == 0
+    )
@@ -201,6 +201,59 @@ def test_find_raw_asset(
             raw_src_response.close()
 
 
+@pytest.mark.skipif(
+    module_unavailable('asset_groups'), reason='AssetGroups module disabled'
+)
+def test_asset_src_caching(flask_app_client, researcher_1, db, request, test_root):
+    from app.modules.assets.models import Asset
+
+    uuids = asset_group_utils.create_simple_asset_group_uuids(
+        flask_app_client, researcher_1, request, test_root
+    )
+    asset_guid = uuids['assets'][0]
+
+    src_response = asset_utils.read_src_asset(
+        flask_app_client, researcher_1, asset_guid
+    )
+    src_response.close()
+    etag = src_response.headers['ETag']
+    assert etag
+    # renditions are remade under the same URL, so they are always revalidated
+    assert 'no-cache' in src_response.headers['Cache-Control']
+    assert 'immutable' not in src_response.headers['Cache-Control']
+    assert 'private' in src_response.headers['Cache-Control']
+
+    # revalidating with the ETag needs no body
+    with flask_app_client.login(researcher_1, auth_scopes=('assets:read',)):
+        response = flask_app_client.get(
+            f'{asset_utils.SRC_PATH}{asset_guid}', headers={'If-None-Match': etag}
+        )
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert not response.data
+
+    # other formats have their own ETag
+    with flask_app_client.login(researcher_1, auth_scopes=('assets:read',)):
+        response = flask_app_client.get(
+            f'/api/v1/assets/src/thumb/{asset_guid}', headers={'If-None-Match': etag}
+        )
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    response.close()
+
+    # remade renditions (e.g. after a rotation) are picked up on the next revalidation
+    asset = Asset.query.get(asset_guid)
+    with db.session.begin():
+        asset.reset_derived_images()
+    with flask_app_client.login(researcher_1, auth_scopes=('assets:read',)):
+        response = flask_app_client.get(
+            f'{asset_utils.SRC_PATH}{asset_guid}', headers={'If-None-Match': etag}
+        )
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    response.close()
+
+
 @pytest.mark.skipif(
     module_unavailable('asset_groups'), reason='AssetGroups module disabled'
 )
@@ -205,3 +205,29 @@ def test_derived_images_and_rotation(test_asset_group_uuid, request):
     # The original should be still the same
     with Image.open(zebra.get_original_path()) as im:
         assert im.size == (1000, 664)
+
+
+def test_generate_renditions(tmp_path):
+    from app.modules.assets.models import Asset, generate_renditions_locked
+
+    source_path = tmp_path / 'large.jpg'
+    Image.new('RGB', (6000, 3000), (10, 200, 30)).save(source_path)
+
+    targets = {
+        format: (tmp_path / f'large.{format}.jpg', Asset.FORMATS[format])
+        for format in ('master', 'mid', 'thumb')
+    }
+    assert generate_renditions_locked(source_path, tmp_path / '.large.lock', targets)
+
+    sizes = {}
+    for format, (target_path, _) in targets.items():
+        with Image.open(target_path) as im:
+            sizes[format] = im.size
+            assert im.mode == 'RGB'
+    assert sizes == {
+        'master': (4096, 2048),
+        'mid': (1024, 512),
+        'thumb': (256, 128),
+    }
+    # no temporary files left behind
+    assert not list(tmp_path.glob('.*.tmp'))
@@ -43,3 +43,123 @@ def test_raising_faults():
     )
     backend_faults.reverse()
     assert backend_fault_msg in backend_faults[0].message
+
+
+def test_buffered_audit_logs(flask_app, db):
+    import uuid
+
+    import app.extensions.logging as AuditLogExtension  # NOQA
+    from app.modules.audit_logs.models import AuditLog
+
+    msg = f'buffered fault {uuid.uuid4()}'
+    with flask_app.app_context():
+        with AuditLogExtension.buffered():
+            for index in range(3):
+                AuditLogExtension.houston_fault(None, f'{msg} {index}')
+            # Nothing is written until the buffer is closed
+            assert AuditLog.query.filter(AuditLog.message.contains(msg)).count() == 0
+        entries = AuditLog.query.filter(AuditLog.message.contains(msg)).all()
+        assert len(entries) == 3
+        assert {entry.audit_type for entry in entries} == {
+            AuditLogExtension.AuditType.HoustonFault
+        }
+
+        # Outside of a buffer entries are written straight away
+        AuditLogExtension.houston_fault(None, f'{msg} direct')
+        assert AuditLog.query.filter(AuditLog.message.contains(msg)).count() == 4
+
+        with db.session.begin():
+            for entry in AuditLog.query.filter(AuditLog.message.contains(msg)):
+                db.session.delete(entry)
+
+
+def test_buffered_audit_logs_defaults(flask_app, db):
+    import uuid
+    from unittest import mock
+
+    import app.extensions.logging as AuditLogExtension  # NOQA
+    from app.modules.audit_logs.models import AuditLog
+
+    msg = f'buffered defaults {uuid.uuid4()}'
+    with flask_app.app_context():
+        with mock.patch.object(AuditLog, 'index') as index:
+            with AuditLogExtension.buffered():
+                AuditLogExtension.houston_fault(None, f'{msg} 0')
+                AuditLogExtension.houston_fault(None, f'{msg} 1')
+            assert index.call_count == 2
+
+        # Read back from the database rather than the (transient) buffered objects
+        db.session.expire_all()
+        entries = AuditLog.query.filter(AuditLog.message.contains(msg)).all()
+        assert len(entries) == 2
+        assert len({entry.guid for entry in entries}) == 2
+        for entry in entries:
+            assert entry.guid is not None
+            assert entry.created is not None
+            assert entry.updated is not None
+
+        with db.session.begin():
+            for entry in entries:
+                db.session.delete(entry)
+
+
+def test_bulk_create_rolled_back(flask_app, db):
+    import uuid
+    from unittest import mock
+
+    from app.modules.audit_logs.models import AuditLog
+
+    msg = f'rolled back {uuid.uuid4()}'
+
+    def entries():
+        return [AuditLog(user_email='anonymous', message=msg, audit_type='Other')]
+
+    with flask_app.app_context():
+        with mock.patch.object(AuditLog, 'index') as index:
+            try:
+                with db.session.begin():
+                    AuditLog.bulk_create(entries())
+                    raise ValueError(msg)
+            except ValueError:
+                pass
+            # Nothing was written, so nothing is indexed
+            assert index.call_count == 0
+
+            with db.session.begin():
+                AuditLog.bulk_create(entries())
+                assert index.call_count == 0
+            assert index.call_count == 1
+
+        written = AuditLog.query.filter(AuditLog.message == msg).all()
+        assert len(written) == 1
+        with db.session.begin():
+            db.session.delete(written[0])
+
+
+def test_buffered_audit_logs_rolled_back(flask_app, db):
+    import uuid
+
+    import app.extensions.logging as AuditLogExtension  # NOQA
+    from app.modules.audit_logs.models import AuditLog
+
+    msg = f'buffered rolled back {uuid.uuid4()}'
+    with flask_app.app_context():
+        with AuditLogExtension.buffered():
+            AuditLogExtension.houston_fault(None, f'{msg} kept')
+            try:
+                with db.session.begin():
+                    AuditLogExtension.houston_fault(None, f'{msg} dropped')
+                    raise ValueError(msg)
+            except ValueError:
+                pass
+
+        messages = [
+            entry.message
+            for entry in AuditLog.query.filter(AuditLog.message.contains(msg))
+        ]
+        assert len(messages) == 1
+        assert f'{msg} kept' in messages[0]
+
+        with db.session.begin():
+            for entry in AuditLog.query.filter(AuditLog.message.contains(msg)):
+                db.session.delete(entry)
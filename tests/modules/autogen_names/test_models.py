@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=invalid-name,missing-docstring
+import uuid
+
+import pytest
+
+from tests.utils import module_unavailable
+
+
+@pytest.mark.skipif(
+    module_unavailable('autogenerated_names', 'names', 'individuals'),
+    reason='Autogenerated names/Names/Individuals module disabled',
+)
+def test_populate_all_individuals(db, researcher_1, request):
+    from app.modules.autogenerated_names.models import (
+        AutogeneratedName,
+        AutogeneratedNameType,
+    )
+    from app.modules.individuals.models import Individual
+
+    taxonomy_guid = uuid.uuid4()
+    other_taxonomy_guid = uuid.uuid4()
+    with db.session.begin(subtransactions=True):
+        agn = AutogeneratedName(
+            type=AutogeneratedNameType.auto_species,
+            prefix='tstA',
+            reference_guid=taxonomy_guid,
+            next_value=2,
+        )
+        other_agn = AutogeneratedName(
+            type=AutogeneratedNameType.auto_species,
+            prefix='tstB',
+            reference_guid=other_taxonomy_guid,
+        )
+        db.session.add(agn)
+        db.session.add(other_agn)
+        individuals = [Individual(taxonomy_guid=taxonomy_guid) for _ in range(4)]
+        for individual in individuals:
+            db.session.add(individual)
+        # not of this taxonomy, so left alone
+        stranger = Individual(taxonomy_guid=other_taxonomy_guid)
+        db.session.add(stranger)
+
+    def cleanup():
+        for individual in individuals + [stranger]:
+            individual.delete()
+        with db.session.begin(subtransactions=True):
+            db.session.delete(agn)
+            db.session.delete(other_agn)
+        AutogeneratedName.invalidate_cache()
+
+    request.addfinalizer(cleanup)
+
+    individuals[0].add_name(agn.context, '001', researcher_1)
+    individuals[1].add_name(other_agn.context, '001', researcher_1)
+    stranger.add_name(other_agn.context, '002', researcher_1)
+
+    assert agn.populate_all_individuals(researcher_1) == 3
+
+    # the existing name is kept, everyone else gets a contiguous block of values
+    values = [
+        individual.get_name_for_context(agn.context).value for individual in individuals
+    ]
+    assert values[0] == '001'
+    assert sorted(values[1:]) == ['002', '003', '004']
+    db.session.refresh(agn)
+    assert agn.next_value == 5
+
+    # the name from the other taxonomy is gone, but only on this taxonomy's individuals
+    assert individuals[1].get_name_for_context(other_agn.context) is None
+    assert stranger.get_name_for_context(other_agn.context).value == '002'
+    assert stranger.get_name_for_context(agn.context) is None
+
+    # nothing left to do
+    assert agn.populate_all_individuals(researcher_1) == 0
+
+    assert agn.reserve_values(10) == 5
+    assert agn.get_next() == '015'
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-docstring
+from app.modules.keywords.models import Keyword, KeywordSource
+from tests import utils as test_utils
+
+
+def test_ensure_keywords(db):
+    orig_ct = test_utils.row_count(db, Keyword)
+    existing = Keyword.ensure_keyword('test_bulk_keyword_0')
+    assert test_utils.row_count(db, Keyword) == orig_ct + 1
+
+    values = ['test_bulk_keyword_0', 'test_bulk_keyword_1', 'test_bulk_keyword_2']
+    keywords = Keyword.ensure_keywords(values + ['test_bulk_keyword_1'])
+    assert sorted(keywords) == values
+    assert keywords['test_bulk_keyword_0'] == existing
+    assert keywords['test_bulk_keyword_2'].source == KeywordSource.user
+    assert test_utils.row_count(db, Keyword) == orig_ct + 3
+
+    # Lookups by GUID and without creating
+    found = Keyword.ensure_keywords([str(existing.guid), 'missing'], create=False)
+    assert found == {str(existing.guid): existing}
+    assert Keyword.ensure_keyword('missing', create=False) is None
+
+    assert not keywords['test_bulk_keyword_1'].is_referenced()
+    assert keywords['test_bulk_keyword_1'].number_referenced_dependencies() == 0
+    assert Keyword.delete_unreferenced(list(keywords.values())) == 3
+    assert test_utils.row_count(db, Keyword) == orig_ct
+
+
+def test_ensure_patch_keywords(db):
+    orig_ct = test_utils.row_count(db, Keyword)
+    existing = Keyword.ensure_keyword('test_patch_keyword_0')
+
+    operations = [
+        {'op': 'test', 'field_name': 'keywords', 'value': 'test_patch_keyword_1'},
+        {'op': 'add', 'field_name': 'keywords', 'value': '[0]'},
+        {'op': 'add', 'field_name': 'keywords', 'value': 'test_patch_keyword_0'},
+        {'op': 'remove', 'field_name': 'keywords', 'value': 'test_patch_missing'},
+        {'op': 'replace', 'field_name': 'ia_class', 'value': 'test_patch_other'},
+    ]
+    resolved = Keyword.ensure_patch_keywords(operations, 'keywords')
+    # Only test operations create, and array references are left alone
+    assert set(resolved) == {
+        'test_patch_keyword_0',
+        'test_patch_keyword_1',
+        'test_patch_missing',
+    }
+    assert resolved['test_patch_keyword_0'] == existing
+    assert resolved['test_patch_keyword_1'].value == 'test_patch_keyword_1'
+    assert resolved['test_patch_missing'] is None
+    assert test_utils.row_count(db, Keyword) == orig_ct + 2
+
+    assert Keyword.delete_unreferenced([existing, resolved['test_patch_keyword_1']]) == 2
@@ -6,7 +6,7 @@ import logging
 import pytest
 import sqlalchemy
 
-from tests.utils import module_unavailable
+from tests.utils import extension_unavailable, module_unavailable
 
 
 @pytest.mark.skipif(module_unavailable('missions'), reason='Missions module disabled')
@@ -140,3 +140,43 @@ def test_mission_task_add_members(
         db.session.delete(temp_assignment)
         db.session.delete(temp_mission_task)
         db.session.delete(temp_mission)
+
+
+@pytest.mark.skipif(
+    module_unavailable('missions') or extension_unavailable('elasticsearch'),
+    reason='Missions module or Elasticsearch extension disabled',
+)
+def test_mission_asset_search_pagination(flask_app):
+    import uuid
+    from unittest import mock
+
+    from app.extensions import elasticsearch as es
+    from app.modules.missions.models import Mission
+
+    mission = Mission(guid=uuid.uuid4(), title='Search Mission')
+    guids = sorted(uuid.uuid4() for _ in range(3))
+    hits = [{'_id': str(guid)} for guid in guids]
+    search = {'match': {'filename': 'zebra'}}
+
+    with mock.patch.object(es, 'es_index_name', return_value='asset'):
+        with mock.patch.object(es, 'es_search_page', return_value=(42, hits)) as page:
+            total, results = mission.asset_search(search, load=False, limit=3, offset=6)
+            assert total == 42
+            assert results == guids
+
+            # The mission filter, sort and page are all handed to Elasticsearch
+            index, body = page.call_args[0]
+            assert index == 'asset'
+            assert page.call_args[1] == {'offset': 6, 'limit': 3}
+            mission_filter = {'term': {'mission_guid': str(mission.guid)}}
+            assert body['query'] == {'bool': {'filter': [search, mission_filter]}}
+            assert body['sort'] == [{'guid': {'order': 'asc'}}]
+
+            # reverse_after flips the page once it is fetched, as it does elsewhere
+            total, results = mission.asset_search(
+                {}, load=False, limit=3, reverse=True, reverse_after=True
+            )
+            assert results == guids[::-1]
+            index, body = page.call_args[0]
+            assert body['query'] == {'bool': {'filter': [mission_filter]}}
+            assert body['sort'] == [{'guid': {'order': 'desc'}}]
@@ -68,6 +68,9 @@ def test_names_crud(db, researcher_1, researcher_2, empty_individual, request):
     assert test.context == context
     test = empty_individual.get_name_for_context('no such context')
     assert not test
+    test = Individual.get_by_names([test_name, 'no such value'], context)
+    assert test == {test_name: empty_individual}
+    assert Individual.get_by_name(test_name, another_context) == empty_individual
 
     # now removal
     test = empty_individual.remove_name_for_context('no such context')
@@ -2,6 +2,7 @@
 # pylint: disable=invalid-name,missing-docstring
 
 import logging
+from unittest import mock
 
 import pytest
 
@@ -155,6 +156,107 @@ def test_notification_message_subtype(db, researcher_1, researcher_2, flask_app,
             db.session.delete(notification)
 
 
+def test_notification_digest(db, researcher_1, researcher_2, flask_app, request):
+    builder = NotificationBuilder(researcher_1)
+    builder.set_individual_merge([], [], {})
+
+    # digest users get nothing when the notification is created
+    researcher_2.notification_preferences = []
+    notification_preferences = UserNotificationPreferences(user=researcher_2)
+    notification_preferences.digest = True
+    notification_preferences.preferences = {
+        NotificationType.individual_merge_complete.value: {
+            'email': True,
+            'restAPI': True,
+        },
+        NotificationType.all.value: {'email': True},
+    }
+    with db.session.begin():
+        db.session.add(notification_preferences)
+    request.addfinalizer(lambda: db.session.delete(notification_preferences))
+
+    Notification.query.delete()
+    notifications = [
+        Notification.create(
+            NotificationType.individual_merge_complete, researcher_2, builder
+        )
+        for _ in range(2)
+    ]
+    for notification in notifications:
+        request.addfinalizer(lambda n=notification: db.session.delete(n))
+        assert notification.email_pending
+        assert notification._channels_sent == {}
+
+    assert Notification.pending_emails(digest=False).count() == 0
+    assert Notification.pending_emails(digest=True).count() == 2
+
+    # still inside the digest window
+    assert Notification.send_digests(window=60 * 60) == 0
+    assert Notification.pending_emails(digest=True).count() == 2
+
+    email = Notification.build_digest_email(researcher_2, notifications)
+    assert email.subject == 'You have 2 new notifications'
+    assert researcher_2.email in email.recipients
+    assert email.html.count('have been merged') == 2
+
+    assert Notification.send_digests(window=0) == 1
+    assert Notification.pending_emails(digest=True).count() == 0
+
+
+def test_notification_outbox_concurrent_drains(
+    db, researcher_1, researcher_2, flask_app, request
+):
+    from app.extensions.email import Email
+
+    builder = NotificationBuilder(researcher_1)
+    builder.set_individual_merge([], [], {})
+
+    # created as a digest user so that they stay in the outbox
+    researcher_2.notification_preferences = []
+    notification_preferences = UserNotificationPreferences(user=researcher_2)
+    notification_preferences.digest = True
+    notification_preferences.preferences = {
+        NotificationType.individual_merge_complete.value: {
+            'email': True,
+            'restAPI': True,
+        },
+        NotificationType.all.value: {'email': True},
+    }
+    with db.session.begin():
+        db.session.add(notification_preferences)
+    request.addfinalizer(lambda: db.session.delete(notification_preferences))
+
+    Notification.query.delete()
+    notifications = [
+        Notification.create(
+            NotificationType.individual_merge_complete, researcher_2, builder
+        )
+        for _ in range(3)
+    ]
+    for notification in notifications:
+        request.addfinalizer(lambda n=notification: db.session.delete(n))
+    with db.session.begin():
+        notification_preferences.digest = False
+    assert Notification.pending_emails(digest=False).count() == 3
+
+    # a second drain starts while the first one is sending its first email
+    sent = []
+
+    def send_message(email, *args, **kwargs):
+        sent.append(email)
+        if len(sent) == 1:
+            Notification.send_outbox(batch_size=1)
+
+    with mock.patch.object(Email, 'send_message', autospec=True) as send:
+        send.side_effect = send_message
+        Notification.send_outbox(batch_size=1)
+        # the notification was claimed by the first drain
+        assert Notification.send_emails(notifications) == 0
+
+    assert len(sent) == 3
+    assert Notification.pending_emails(digest=False).count() == 0
+
+
 def test_validate_preferences():
     from app.modules.notifications.models import (
         NotificationChannel,
@@ -6,7 +6,7 @@ import pytest
 
 from app.modules.fileuploads.models import FileUpload
 from app.modules.site_settings.models import SiteSetting
-from tests.utils import extension_unavailable
+from tests.utils import extension_unavailable, redis_unavailable
 
 
 def test_create_header_image(db, flask_app, test_root):
@@ -80,3 +80,31 @@ def test_get_value(db, flask_app):
     guid_setting = SiteSetting.query.get('system_guid')
     assert guid_setting is not None
     db.session.delete(guid_setting)
+
+
+@pytest.mark.skipif(redis_unavailable(), reason='Redis unavailable')
+def test_get_value_cached(db, flask_app):
+    from app.modules.site_settings import models
+
+    key = 'email_title_greeting'
+    SiteSetting.set_key_value(key, 'Hello')
+    try:
+        assert SiteSetting.get_value(key) == 'Hello'
+        assert models._value_cache[key] == 'Hello'
+
+        # writes through the model invalidate the cache
+        SiteSetting.set_key_value(key, 'Hi')
+        assert key not in models._value_cache
+        assert SiteSetting.get_value(key) == 'Hi'
+
+        # every write bumps the version other processes check
+        version = models._cache_version
+        models.invalidate_site_settings_cache()
+        assert models._read_cache_version() != version
+
+        # so do direct deletes
+        SiteSetting.get_value(key)
+        SiteSetting.query.filter_by(key=key).delete()
+        assert SiteSetting.get_value(key) == SiteSetting._get_default_value(key)
+    finally:
+        SiteSetting.forget_key_value(key)
@@ -72,3 +72,36 @@ def test_regions():
     found = regions.find_fuzzy_list(['BE-3', 'pots', 'foo'])
     assert found
     assert found[0].get('id') == parent3
+
+
+def test_region_index():
+    from app.modules.site_settings.models import RegionIndex, Regions
+
+    regions = Regions(
+        data={
+            'locationID': [
+                {
+                    'id': 'a',
+                    'name': 'Africa',
+                    'locationID': [
+                        {'id': 'k', 'name': 'Kenya', '_prev_id': 'old-k'},
+                        {'id': 't', 'name': 'Tanzania', 'locationID': []},
+                    ],
+                },
+                {'id': 'k', 'name': 'Kenya again'},
+            ],
+        }
+    )
+    assert isinstance(regions.index, RegionIndex)
+    assert regions.index.descendants['a'] == {'k', 't'}
+    assert regions.with_children(['a', 'missing']) == {'a', 'k', 't', 'missing'}
+    assert regions.with_ancestors(['t']) == {'a', 't'}
+    assert regions.full_path('k', id_only=False) == [
+        {'id': 'a', 'name': 'Africa'},
+        {'id': 'k', 'name': 'Kenya', '_prev_id': 'old-k'},
+    ]
+    assert regions.find('k', id_only=False)[1] == {'id': 'k', 'name': 'Kenya again'}
+    assert regions.transfer_find('old-k')['name'] == 'Kenya'
+    assert set(regions.index.fuzzy_candidates('tanzan')) == {'t'}
+    assert regions.find_fuzzy('tanzania')['id'] == 't'
+    assert regions.find_fuzzy('zzz') is None
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=invalid-name,missing-docstring
+import uuid
+from unittest import mock
+
+import pytest
+
+from tests.utils import module_unavailable
+
+
+@pytest.mark.skipif(
+    module_unavailable('social_groups', 'individuals'),
+    reason='Social Groups/Individuals module disabled',
+)
+def test_revalidate_roles(db, request):
+    from app.modules.audit_logs.models import AuditLog
+    from app.modules.individuals.models import Individual
+    from app.modules.social_groups.models import SocialGroup
+
+    matriarch = str(uuid.uuid4())
+    dropped = str(uuid.uuid4())
+    permitted_roles = {
+        matriarch: {'guid': matriarch, 'label': 'Matriarch', 'multipleInGroup': False},
+    }
+
+    individuals = [Individual(), Individual()]
+    with db.session.begin():
+        for individual in individuals:
+            db.session.add(individual)
+    request.addfinalizer(lambda: [individual.delete() for individual in individuals])
+
+    members = {
+        str(individuals[0].guid): {'role_guids': [matriarch, dropped]},
+        str(individuals[1].guid): {'role_guids': [matriarch]},
+    }
+    group = SocialGroup(members, 'Revalidated')
+    with db.session.begin(subtransactions=True):
+        db.session.add(group)
+    request.addfinalizer(group.delete)
+
+    with mock.patch.object(
+        SocialGroup, 'get_permitted_roles', return_value=permitted_roles
+    ):
+        assert SocialGroup.revalidate_roles() == 1
+
+    # Only the unsupported role is dropped, from the one member that had it
+    db.session.refresh(group)
+    roles = {str(member.individual_guid): member.roles for member in group.members}
+    assert roles == {
+        str(individuals[0].guid): [matriarch],
+        str(individuals[1].guid): [matriarch],
+    }
+
+    messages = [
+        entry.message
+        for entry in AuditLog.query.filter(AuditLog.item_guid == group.guid)
+    ]
+    lost = f'member {individuals[0].guid} lost role {dropped}'
+    assert len([message for message in messages if lost in message]) == 1
+    # Matriarch is singular, but two members now have it
+    warning = f'WARNING: multiple members with {matriarch}'
+    assert len([message for message in messages if warning in message]) == 1
+
+    # Nothing else to change
+    with mock.patch.object(
+        SocialGroup, 'get_permitted_roles', return_value=permitted_roles
+    ):
+        assert SocialGroup.revalidate_roles() == 0
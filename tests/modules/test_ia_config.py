@@ -932,3 +932,32 @@ def test_get_seal_identifiers(flask_app_client):
         for ia_class in ia_classes:
             identifiers = ia_config_reader.get_identifiers_dict(species, ia_class)
             assert identifiers == desired_identifier_config
+
+
+def test_ia_config_shared_until_changed(tmp_path, monkeypatch):
+    import json
+    import os
+
+    config = {
+        '_detectors': {'det': {'name': 'Detector', 'config_dict': {'a': 1}}},
+        'Genus': {'species': {'_detectors': ['@_detectors.det']}},
+    }
+    conf_fpath = tmp_path / 'IA.test.json'
+    conf_fpath.write_text(json.dumps(config))
+    monkeypatch.setattr(IaConfig, 'CONFIG_PATH', str(tmp_path))
+    monkeypatch.setattr(IaConfig, '_instance', None)
+
+    ia_config_reader = IaConfig()
+    assert IaConfig() is ia_config_reader
+    assert ia_config_reader.get_configured_species() == ['Genus species']
+    assert ia_config_reader.get_named_detector_config('det') == {'a': 1}
+
+    config['_detectors']['det']['config_dict'] = {'a': 2}
+    conf_fpath.write_text(json.dumps(config))
+    stat = conf_fpath.stat()
+    os.utime(conf_fpath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    reloaded = IaConfig()
+    assert reloaded is not ia_config_reader
+    assert reloaded.get_detectors_list('Genus species') == [
+        {'name': 'Detector', 'config_dict': {'a': 2}}
+    ]